@@ -2,7 +2,22 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from model_api import query_model  # Import your model function
-from prompt_builder import build_prompt  # Import your prompt builder
+from prompt_builder import build_prompt, build_day_prompt  # Import your prompt builder
+import re
+
+DAY_HEADING = r'^[ \t#*]*day[ \t]*{n}\b.*$'
+
+def replace_day(plan, day_number, new_day):
+    """Splice a regenerated day into the plan, keeping every other day unchanged"""
+    if new_day.startswith("Error:"):
+        return None
+    start = re.search(DAY_HEADING.format(n=day_number), plan, re.IGNORECASE | re.MULTILINE)
+    heading = re.search(DAY_HEADING.format(n=day_number), new_day, re.IGNORECASE | re.MULTILINE)
+    if not start or not heading:
+        return None
+    end = re.search(DAY_HEADING.format(n=r'\d+'), plan[start.end():], re.IGNORECASE | re.MULTILINE)
+    stop = start.end() + end.start() if end else len(plan)
+    return plan[:start.start()] + new_day[heading.start():].strip() + "\n\n" + plan[stop:]
 
 # Page configuration
 st.set_page_config(
@@ -448,6 +463,27 @@ WORKOUT PLAN:
                 )
                 st.session_state.workout_plan = query_model(prompt)
                 st.rerun()
+    
+    # Regenerate a single day instead of the whole plan
+    if st.session_state.workout_plan:
+        col12, col13 = st.columns([1, 2])
+        with col12:
+            day_number = st.selectbox("Day to regenerate", [1, 2, 3, 4, 5])
+        with col13:
+            st.write("")
+            if st.button(f"🔁 Regenerate Day {day_number} Only", use_container_width=True):
+                with st.spinner(f"🤖 Regenerating Day {day_number}..."):
+                    day_prompt = build_day_prompt(
+                        st.session_state.workout_plan, day_number,
+                        data['fitness_goal'], data['fitness_level'], data['equipment']
+                    )
+                    new_day = query_model(day_prompt)
+                    updated = replace_day(st.session_state.workout_plan, day_number, new_day)
+                    if updated:
+                        st.session_state.workout_plan = updated
+                        st.rerun()
+                    else:
+                        st.error("❌ Could not regenerate that day. Please try again.")
 
 # Sidebar
 with st.sidebar:
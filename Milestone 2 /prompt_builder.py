@@ -32,3 +32,21 @@ def build_prompt(name, age, gender, height_cm, weight, fitness_goal, fitness_lev
     """
     
     return prompt, bmi, bmi_status
+
+
+def build_day_prompt(plan, day_number, fitness_goal, fitness_level, equipment):
+    # Only the requested day is regenerated; the rest of the plan is context
+    prompt = f"""
+    Here is an existing 5-day workout plan:
+
+    {plan}
+
+    Rewrite ONLY Day {day_number} with different exercises that keep the same focus.
+    - Fitness Goal: {fitness_goal}
+    - Fitness Level: {fitness_level}
+    - Available Equipment: {', '.join(equipment)}
+
+    Reply with only the new Day {day_number} section, starting with its "Day {day_number}" heading.
+    """
+    
+    return prompt
@@ -0,0 +1,204 @@
+"""
+Admission control for LLM-backed plan generation
+
+At most GENERATION_CONCURRENCY generations run at once per worker process.
+Up to GENERATION_QUEUE further requests wait in a short FIFO queue. A request
+is turned away up front when the queue is full or the recent average
+generation time says it cannot get a slot within GENERATION_QUEUE_TIMEOUT
+seconds, and a queued request is dropped once that deadline passes.
+Requests that are not admitted are served from the local template engine
+immediately instead of tying up a worker thread on a slow provider.
+
+The limit is per process, so it pays off with threaded workers, e.g.
+
+    gunicorn --worker-class gthread --workers 2 --threads 8 app:app
+
+where the threads not busy generating keep serving cheap routes. In the
+ASGI mode (asgi.py) a waiting generation is a suspended coroutine rather
+than a thread, and ASYNC_GENERATION_CONCURRENCY applies instead.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from metrics import Counter, Histogram
+
+GENERATION_CONCURRENCY = int(os.getenv('GENERATION_CONCURRENCY', 2))
+GENERATION_QUEUE = int(os.getenv('GENERATION_QUEUE', 4))
+GENERATION_QUEUE_TIMEOUT = float(os.getenv('GENERATION_QUEUE_TIMEOUT', 3))
+ASYNC_GENERATION_CONCURRENCY = int(os.getenv('ASYNC_GENERATION_CONCURRENCY', 200))
+
+ADMISSIONS = Counter(
+    'fitplan_generation_admission_total', 'Admission decisions for plan generation', ('decision',))
+QUEUE_WAIT = Histogram(
+    'fitplan_generation_queue_seconds', 'Time spent queued before generation',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0))
+
+
+class AdmissionController:
+    """Bounded concurrency with a deadline-aware waiting queue"""
+
+    def __init__(self, limit=GENERATION_CONCURRENCY, queue_size=GENERATION_QUEUE,
+                 queue_timeout=GENERATION_QUEUE_TIMEOUT):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters = deque()
+        self._running = {}  # ticket -> start time of each in-flight generation
+        self._cond = threading.Condition()
+        self._avg_service = None  # EWMA of generation time in seconds
+
+    # ---------- decisions (shared by the sync and async controllers; lock held) ----------
+
+    def _expected_wait(self, position, now):
+        """
+        Rough time until the waiter at `position` (0 = head) gets a slot: the
+        in-flight generations finish after their remaining average time, in
+        order, and each later round of slots takes one average generation.
+        """
+        if self._avg_service is None or not self._running:
+            return 0.0
+        remaining = sorted(max(self._avg_service - (now - started), 0.0) for started in self._running.values())
+        rounds, index = divmod(position, len(remaining))
+        return remaining[index] + rounds * self._avg_service
+
+    def _admit(self, ticket, now):
+        self.active += 1
+        self._running[ticket] = now
+
+    def _enter(self, ticket, start, deadline):
+        """'admitted' or 'full' for a new request, or None once it has been queued"""
+        if self.active < self.limit and not self._waiters:
+            self._admit(ticket, start)
+            ADMISSIONS.inc('admitted')
+            return 'admitted'
+        if len(self._waiters) >= self.queue_size or \
+                start + self._expected_wait(len(self._waiters), start) > deadline:
+            ADMISSIONS.inc('full')
+            return 'full'
+        self._waiters.append(ticket)
+        return None
+
+    def _poll(self, ticket, start, deadline):
+        """'admitted' or 'timeout' for a queued request, else the seconds to wait before asking again"""
+        now = time.monotonic()
+        if self._waiters[0] is ticket and self.active < self.limit:
+            self._admit(ticket, now)
+            QUEUE_WAIT.observe(now - start)
+            ADMISSIONS.inc('queued')
+            return 'admitted'
+        if now >= deadline:
+            QUEUE_WAIT.observe(now - start)
+            ADMISSIONS.inc('timeout')
+            return 'timeout'
+        return deadline - now
+
+    def _done(self, ticket):
+        elapsed = time.monotonic() - self._running.pop(ticket)
+        self.active -= 1
+        self._avg_service = elapsed if self._avg_service is None \
+            else 0.8 * self._avg_service + 0.2 * elapsed
+
+    # ---------- threads ----------
+
+    def acquire(self):
+        """
+        Try to get a generation slot.
+        Returns (decision, ticket): 'admitted', or 'full' / 'timeout' when the caller should degrade.
+        """
+        ticket = object()
+        start = time.monotonic()
+        deadline = start + self.queue_timeout
+        with self._cond:
+            decision = self._enter(ticket, start, deadline)
+            if decision is not None:
+                return decision, ticket
+            try:
+                while True:
+                    step = self._poll(ticket, start, deadline)
+                    if isinstance(step, str):
+                        return step, ticket
+                    self._cond.wait(step)
+            finally:
+                self._waiters.remove(ticket)
+                self._cond.notify_all()
+
+    def release(self, ticket):
+        with self._cond:
+            self._done(ticket)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """with controller.slot() as admitted: ... (admitted is False when shed)"""
+        decision, ticket = self.acquire()
+        if decision != 'admitted':
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            self.release(ticket)
+
+    def depth(self):
+        with self._cond:
+            return self.active, len(self._waiters)
+
+
+class AsyncAdmissionController(AdmissionController):
+    """The same policy for coroutines on one event loop (asgi.py)"""
+
+    def __init__(self, limit=ASYNC_GENERATION_CONCURRENCY, **kwargs):
+        super().__init__(limit, **kwargs)
+        self._cond = None  # asyncio.Condition, created on the serving loop
+
+    async def acquire(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        ticket = object()
+        start = time.monotonic()
+        deadline = start + self.queue_timeout
+        async with self._cond:
+            decision = self._enter(ticket, start, deadline)
+            if decision is not None:
+                return decision, ticket
+            try:
+                while True:
+                    step = self._poll(ticket, start, deadline)
+                    if isinstance(step, str):
+                        return step, ticket
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), step)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiters.remove(ticket)
+                self._cond.notify_all()
+
+    async def release(self, ticket):
+        async with self._cond:
+            self._done(ticket)
+            self._cond.notify_all()
+
+    @asynccontextmanager
+    async def slot(self):
+        """async with controller.slot() as admitted: ..."""
+        decision, ticket = await self.acquire()
+        if decision != 'admitted':
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            await self.release(ticket)
+
+    def depth(self):
+        return self.active, len(self._waiters)
+
+
+admission = AdmissionController()
+async_admission = AsyncAdmissionController()
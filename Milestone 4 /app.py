@@ -3,7 +3,7 @@ FitPlan-AI - Milestone 4: Application Finalization & Deployment
 File: app.py (Relevant Sections Only)
 """
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_mail import Mail, Message
 from flask_limiter import Limiter
@@ -15,6 +15,9 @@ from datetime import datetime, timedelta
 import os
 import re
 from dotenv import load_dotenv
+from metrics import init_metrics, render_metrics, OTP_EVENTS
+from profiler import init_profiler
+from http_cache import conditional, init_http_cache
 
 load_dotenv()
 
@@ -24,6 +27,19 @@ app.secret_key = os.getenv('SECRET_KEY', 'dev-secret-key')
 # Rate limiting for OTP endpoints
 limiter = Limiter(app=app, key_func=get_remote_address)
 
+# Request timing and per-request DB query metrics
+init_metrics(app)
+
+# Opt-in request profiling (no hooks registered unless configured)
+init_profiler(app)
+
+# ETag/304 pages, gzip for large bodies, immutable fingerprinted static assets
+init_http_cache(app)
+
+# Cached dashboard widget HTML, invalidated by workout/meal log writes
+from fragments import init_fragments
+init_fragments(app)
+
 # Database configuration
 database_url = os.environ.get('DATABASE_URL', 'sqlite:///fitness.db')
 if database_url and database_url.startswith('postgres://'):
@@ -33,6 +49,12 @@ app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
 
+# Per-user LLM token accounting, flushed in batches (usage.py)
+from usage import init_usage
+init_usage(app, db)
+from reminders import init_reminders
+init_reminders(app, db)
+
 # Mail configuration
 app.config['MAIL_SERVER'] = 'smtp.gmail.com'
 app.config['MAIL_PORT'] = 587
@@ -106,6 +128,49 @@ def is_otp_expired(timestamp, expiry_minutes=10):
     """Check if OTP is expired (10 minute expiry)"""
     return datetime.now() - timestamp > timedelta(minutes=expiry_minutes)
 
+def issue_otp(email):
+    """Store a fresh OTP for email (replacing any earlier one) and return it"""
+    otp = str(random.randint(100000, 999999))
+    otp_storage[email] = {
+        'otp': otp,
+        'timestamp': datetime.now()
+    }
+    return otp
+
+# The send/resend views are split around the email call so asgi.py can await it
+OTP_MESSAGES = {'send': ('OTP sent', 'Failed to send OTP'), 'resend': ('OTP resent', 'Failed to resend OTP')}
+
+def prepare_send_otp():
+    """(email, otp, None) for a valid address, else (None, None, error response)"""
+    email = request.json.get('email')
+    
+    valid, error = validate_email(email)
+    if not valid:
+        OTP_EVENTS.inc('send', 'invalid_email')
+        return None, None, jsonify({'success': False, 'message': error})
+    
+    return email, issue_otp(email), None
+
+def prepare_resend_otp():
+    """(email, otp, None) when an OTP was sent before, else (None, None, error response)"""
+    email = request.json.get('email')
+    
+    if email not in otp_storage:
+        OTP_EVENTS.inc('resend', 'missing')
+        return None, None, jsonify({'success': False, 'message': 'No OTP found'})
+    
+    return email, issue_otp(email), None
+
+def otp_delivery_response(event, success):
+    """Answer for an OTP email that was (or could not be) handed to the mail provider"""
+    sent, failed = OTP_MESSAGES[event]
+    if success:
+        OTP_EVENTS.inc(event, 'sent')
+        return jsonify({'success': True, 'message': sent})
+    else:
+        OTP_EVENTS.inc(event, 'failed')
+        return jsonify({'success': False, 'message': failed})
+
 # ======================================================
 # TASK 3: AUTHENTICATION FLOW WITH VALIDATION
 # ======================================================
@@ -129,28 +194,16 @@ def check_email():
 def send_otp():
     """Send OTP with rate limiting and expiry"""
     try:
-        email = request.json.get('email')
-        
-        valid, error = validate_email(email)
-        if not valid:
-            return jsonify({'success': False, 'message': error})
-        
-        otp = str(random.randint(100000, 999999))
-        otp_storage[email] = {
-            'otp': otp,
-            'timestamp': datetime.now()
-        }
+        email, otp, rejected = prepare_send_otp()
+        if rejected is not None:
+            return rejected
         
         # Send via email (implementation in email_utils.py)
         from email_utils import send_otp_email
-        success = send_otp_email(email, otp)
-        
-        if success:
-            return jsonify({'success': True, 'message': 'OTP sent'})
-        else:
-            return jsonify({'success': False, 'message': 'Failed to send OTP'})
+        return otp_delivery_response('send', send_otp_email(email, otp))
         
     except Exception as e:
+        OTP_EVENTS.inc('send', 'error')
         return jsonify({'success': False, 'message': str(e)})
 
 @app.route('/verify-otp', methods=['POST'])
@@ -161,15 +214,18 @@ def verify_otp():
     otp = data.get('otp')
     
     if email not in otp_storage:
+        OTP_EVENTS.inc('verify', 'missing')
         return jsonify({'success': False, 'message': 'No OTP found'})
     
     stored = otp_storage[email]
     
     if is_otp_expired(stored['timestamp']):
         del otp_storage[email]
+        OTP_EVENTS.inc('verify', 'expired')
         return jsonify({'success': False, 'message': 'OTP expired'})
     
     if stored['otp'] == otp:
+        OTP_EVENTS.inc('verify', 'success')
         session['email'] = email
         from models import User
         user = User.query.filter_by(email=email).first()
@@ -179,30 +235,19 @@ def verify_otp():
         else:
             return jsonify({'success': True, 'new_user': True})
     
+    OTP_EVENTS.inc('verify', 'invalid')
     return jsonify({'success': False, 'message': 'Invalid OTP'})
 
 @app.route('/resend-otp', methods=['POST'])
 @limiter.limit("3 per minute")
 def resend_otp():
     """Resend OTP with rate limiting"""
-    email = request.json.get('email')
-    
-    if email not in otp_storage:
-        return jsonify({'success': False, 'message': 'No OTP found'})
-    
-    otp = str(random.randint(100000, 999999))
-    otp_storage[email] = {
-        'otp': otp,
-        'timestamp': datetime.now()
-    }
+    email, otp, rejected = prepare_resend_otp()
+    if rejected is not None:
+        return rejected
     
     from email_utils import send_otp_email
-    success = send_otp_email(email, otp)
-    
-    if success:
-        return jsonify({'success': True, 'message': 'OTP resent'})
-    else:
-        return jsonify({'success': False, 'message': 'Failed to resend OTP'})
+    return otp_delivery_response('resend', send_otp_email(email, otp))
 
 @app.route('/direct-signup', methods=['POST'])
 def direct_signup():
@@ -260,41 +305,196 @@ def direct_signup():
 # TASK 4: AI WORKOUT GENERATION WITH ERROR HANDLING
 # ======================================================
 
+# Pack concurrent generation requests into shared LLM calls (batch_generator.py)
+BATCH_GENERATION = os.getenv('BATCH_GENERATION', 'false').lower() == 'true'
+
+# Reuse validated plans of near-identical profiles (profile_index.py)
+PLAN_REUSE = os.getenv('PLAN_REUSE', 'false').lower() == 'true'
+
+# Serve pre-generated plans per profile bucket (plan_cache.py, warm_cache.py)
+PLAN_CACHE = os.getenv('PLAN_CACHE', 'false').lower() == 'true'
+
+TEMPLATE_NOTICES = {
+    'quota_exceeded': 'Daily AI generation limit reached; served a template plan instead',
+    'busy': 'AI generator is busy; served a template plan instead',
+}
+
+# generate_schedule runs in three steps so asgi.py can await the model call
+# in between: start_generation -> (model call) -> finish_generation
+
+def serve_template(job, reason):
+    """Answer a generation job from the local template engine, noting why"""
+    from model_api import generate_fallback_template
+    job['schedule'] = generate_fallback_template(job['user'], job['goal'], job['level'], job['equipment'])
+    job['source'] = 'template'
+    job['notice'] = {reason: True, 'message': TEMPLATE_NOTICES[reason]}
+
+def start_generation():
+    """
+    Parse the request and try every plan source that needs no model call.
+    Returns a job dict: 'error' holds a response to return as is; otherwise
+    'schedule' is still None when the model must be called with 'prompt'.
+    """
+    data = request.json
+    from user_cache import user_cache
+    user = user_cache.get(session['user_id'])
+    
+    if not user:
+        return {'error': jsonify({'success': False, 'error': 'User not found'})}
+    
+    job = {
+        'user': user,
+        'goal': data.get('goal', 'strength'),
+        'level': data.get('level', 'beginner'),
+        'equipment': data.get('equipment', 'bodyweight'),
+        'schedule': None,
+        'source': None,
+        'notice': {},
+        'prompt': None
+    }
+    args = (user, job['goal'], job['level'], job['equipment'])
+    
+    if PLAN_CACHE:
+        # Pre-generated plan for the user's profile bucket (plan_cache.py)
+        from plan_cache import plan_cache
+        job['schedule'] = plan_cache.get(*args)
+        job['source'] = 'cache' if job['schedule'] is not None else None
+    
+    if job['schedule'] is None and PLAN_REUSE:
+        # Personalized copy of a near-identical profile's validated plan
+        from profile_index import profile_index
+        job['schedule'] = profile_index.find(*args)
+        job['source'] = 'neighbour' if job['schedule'] is not None else None
+    
+    if job['schedule'] is None:
+        # Build prompt (from prompt_builder.py)
+        from prompt_builder import build_workout_prompt
+        job['prompt'] = build_workout_prompt(*args)
+        
+        # Daily token quota; otherwise the caller makes the model call
+        from usage import usage_ledger
+        if not usage_ledger.allow(user.id):
+            serve_template(job, 'quota_exceeded')
+    
+    return job
+
+def finish_generation(job):
+    """Save the job's plan, feed plan reuse/caching and build the JSON answer"""
+    user, goal, level, equipment = job['user'], job['goal'], job['level'], job['equipment']
+    schedule, source = job['schedule'], job['source']
+    
+    # Save schedule (body stored once in the content-addressed blob table)
+    from models import WorkoutSchedule
+    from blob_store import set_schedule_text
+    workout_schedule = WorkoutSchedule(
+        user_id=user.id,
+        goal=goal,
+        level=level,
+        equipment=equipment
+    )
+    set_schedule_text(db, workout_schedule, schedule, user.name)
+    db.session.add(workout_schedule)
+    db.session.flush()
+    from search import index_schedule
+    index_schedule(db, workout_schedule, schedule)
+    
+    # Training-day reminders for the new plan (replacing the previous plan's)
+    import reminders
+    new_reminders = reminders.schedule_reminders(db, workout_schedule) if reminders.REMINDERS_ENABLED else []
+    db.session.commit()
+    if new_reminders and reminders.reminder_scheduler is not None:
+        reminders.reminder_scheduler.publish(new_reminders)
+    
+    if source == 'ai' and (PLAN_REUSE or PLAN_CACHE):
+        from plan_validator import validate_plan
+        verdict = validate_plan(schedule, equipment)
+        if verdict['valid'] and PLAN_REUSE:
+            from profile_index import profile_index
+            profile_index.add(user, goal, level, equipment, workout_schedule.id)
+        if verdict['valid'] and PLAN_CACHE:
+            from plan_cache import bucket_key, plan_cache
+            key = bucket_key(user.age, user.weight, user.height, goal, level, equipment)
+            plan_cache.put(db, key, schedule, user.name, verdict['score'])
+    
+    return jsonify({'success': True, 'schedule': schedule, 'source': source, **job['notice']})
+
 @app.route('/generate-schedule', methods=['POST'])
 def generate_schedule():
     """Generate AI workout with fallback error handling"""
     try:
+        job = start_generation()
+        if 'error' in job:
+            return job['error']
+        
+        if job['schedule'] is None:
+            # Bounded LLM concurrency; otherwise serve the template
+            from admission import admission
+            from usage import attribute_to
+            args = (job['prompt'], job['user'], job['goal'], job['level'], job['equipment'])
+            with admission.slot() as admitted, attribute_to(job['user'].id):
+                if not admitted:
+                    serve_template(job, 'busy')
+                elif BATCH_GENERATION:
+                    # Generate with fallback (from model_api.py), micro-batched
+                    from batch_generator import get_batcher
+                    job['schedule'], job['source'] = get_batcher().generate(*args)
+                else:
+                    # Generate with fallback (from model_api.py)
+                    from model_api import generate_workout_with_source
+                    job['schedule'], job['source'] = generate_workout_with_source(*args)
+        
+        return finish_generation(job)
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/regenerate-day', methods=['POST'])
+def regenerate_schedule_day():
+    """Regenerate one day (or one exercise) of a saved schedule in place"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'success': False, 'error': 'Not logged in'})
+        
         data = request.json
-        from models import User
+        from models import User, WorkoutSchedule
         user = User.query.get(session['user_id'])
         
-        if not user:
-            return jsonify({'success': False, 'error': 'User not found'})
+        query = WorkoutSchedule.query.filter_by(user_id=session['user_id'])
+        if data.get('schedule_id'):
+            workout_schedule = query.filter_by(id=data['schedule_id']).first()
+        else:
+            workout_schedule = query.order_by(WorkoutSchedule.created_at.desc()).first()
         
-        goal = data.get('goal', 'strength')
-        level = data.get('level', 'beginner')
-        equipment = data.get('equipment', 'bodyweight')
+        if not user or not workout_schedule:
+            return jsonify({'success': False, 'error': 'Schedule not found'})
         
-        # Build prompt (from prompt_builder.py)
-        from prompt_builder import build_workout_prompt
-        prompt = build_workout_prompt(user, goal, level, equipment)
+        day = int(data.get('day', 0))
+        if day < 1 or day > 5:
+            return jsonify({'success': False, 'error': 'Day must be between 1 and 5'})
+        exercise = data.get('exercise')
         
-        # Generate with fallback (from model_api.py)
-        from model_api import generate_workout_with_ai
-        schedule = generate_workout_with_ai(prompt, user, goal, level, equipment)
+        from regenerate import regenerate_day
+        from usage import attribute_to, usage_ledger
+        with attribute_to(user.id):
+            schedule = regenerate_day(
+                workout_schedule.plan_text, day, user,
+                workout_schedule.goal or data.get('goal', 'strength'),
+                workout_schedule.level or data.get('level', 'beginner'),
+                workout_schedule.equipment or data.get('equipment', 'bodyweight'),
+                exercise_number=int(exercise) if exercise else None,
+                use_model=usage_ledger.allow(user.id)
+            )
         
-        # Save schedule
-        from models import WorkoutSchedule
-        workout_schedule = WorkoutSchedule(
-            user_id=user.id,
-            schedule_data=schedule
-        )
-        db.session.add(workout_schedule)
+        from blob_store import set_schedule_text
+        from search import index_schedule
+        set_schedule_text(db, workout_schedule, schedule, user.name)
+        index_schedule(db, workout_schedule, schedule)
         db.session.commit()
         
-        return jsonify({'success': True, 'schedule': schedule})
+        return jsonify({'success': True, 'schedule': schedule, 'schedule_id': workout_schedule.id})
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)})
 
 # ======================================================
@@ -302,33 +502,278 @@ def generate_schedule():
 # ======================================================
 
 @app.route('/dashboard')
+@conditional
 def dashboard():
     """Dashboard page with smooth navigation"""
     if 'user_id' not in session:
         return redirect(url_for('index'))
     
-    from models import User
-    user = User.query.get(session['user_id'])
-    return render_template('dashboard.html', user=user)
+    from fragments import dashboard_fragments
+    from user_cache import user_cache
+    user = user_cache.get(session['user_id'])
+    return render_template('dashboard.html', user=user, **dashboard_fragments(session['user_id']))
 
 @app.route('/schedule')
+@conditional
 def schedule():
     """Schedule page with improved UI"""
     if 'user_id' not in session:
         return redirect(url_for('index'))
     
-    from models import User
-    user = User.query.get(session['user_id'])
+    from user_cache import user_cache
+    user = user_cache.get(session['user_id'])
     return render_template('schedule.html', user=user)
 
+@app.route('/progress-data')
+@conditional
+def progress_data():
+    """Personal records, weekly volume and muscle-group load from exercise_sets"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not logged in'})
+    
+    try:
+        from exercise_sets import muscle_load, personal_records, weekly_volume
+        user_id = session['user_id']
+        return jsonify({
+            'success': True,
+            'records': personal_records(db, user_id),
+            'weekly_volume': weekly_volume(db, user_id, request.args.get('weeks', 12, type=int)),
+            'muscle_load': muscle_load(db, user_id)
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/log-workout', methods=['POST'])
+def log_workout():
+    """Log a completed workout; its sets, search document and leaderboard totals are written with it"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not logged in'})
+    
+    try:
+        data = request.json
+        from models import WorkoutLog
+        from exercise_sets import record_logs
+        exercises = data.get('exercises')
+        if isinstance(exercises, (list, dict)):
+            exercises = json.dumps(exercises)
+        
+        date = datetime.strptime(data['date'], '%Y-%m-%d').date() if data.get('date') else datetime.utcnow().date()
+        log = WorkoutLog(
+            user_id=session['user_id'],
+            date=date,
+            workout_name=(data.get('workout_name') or 'Workout')[:200],
+            duration=int(data['duration']) if data.get('duration') else None,
+            calories_burned=int(data['calories_burned']) if data.get('calories_burned') else None,
+            exercises=exercises,
+            mood=data.get('mood')
+        )
+        sets = record_logs(db, [log])
+        return jsonify({'success': True, 'log_id': log.id, 'sets': sets})
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/workout-logs/<int:log_id>/series', methods=['POST'])
+def upload_workout_series(log_id):
+    """Attach wearable heart-rate or step samples to a workout log"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not logged in'})
+    
+    try:
+        data = request.json
+        from models import WorkoutLog
+        from timeseries import attach_series
+        from user_cache import user_cache
+        log = WorkoutLog.query.filter_by(id=log_id, user_id=session['user_id']).first()
+        if not log:
+            return jsonify({'success': False, 'error': 'Workout log not found'})
+        
+        values = data.get('values') or []
+        timestamps = data.get('timestamps')
+        if timestamps is None:
+            # Regular sampling: start (epoch ms) + interval_ms
+            start = int(data.get('start', 0))
+            interval = int(data.get('interval_ms', 1000))
+            timestamps = [start + i * interval for i in range(len(values))]
+        
+        user = user_cache.get(session['user_id'])
+        summary = attach_series(db, log, data.get('kind', 'heart_rate'), timestamps, values,
+                                age=user.age if user else None)
+        db.session.commit()
+        return jsonify({'success': True, 'summary': summary})
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/foods/autocomplete')
+def foods_autocomplete():
+    """Food suggestions for the meal logger (prefix matches, then typo-tolerant ones)"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': True, 'foods': []})
+    
+    try:
+        from food_index import get_food_index
+        limit = min(request.args.get('limit', 8, type=int), 20)
+        return jsonify({'success': True, 'foods': get_food_index().search(query, limit)})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/log-meal', methods=['POST'])
+def log_meal():
+    """Log a meal from the food table; macros are per serving times the servings eaten"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not logged in'})
+    
+    try:
+        data = request.json
+        from models import MealLog
+        from food_index import get_food_index
+        index = get_food_index()
+        food_id = int(data.get('food_id', -1))
+        servings = float(data.get('servings', 1))
+        if not 0 <= food_id < len(index) or servings <= 0:
+            return jsonify({'success': False, 'error': 'Invalid food or servings'})
+        
+        food = index.food(food_id)
+        date = datetime.strptime(data['date'], '%Y-%m-%d').date() if data.get('date') else datetime.utcnow().date()
+        meal = MealLog(
+            user_id=session['user_id'],
+            date=date,
+            meal_type=data.get('meal_type', 'snack'),
+            food_name=food['name'] if servings == 1 else f"{food['name']} x{servings:g}",
+            calories=int(round(food['calories'] * servings)),
+            protein=round(food['protein'] * servings, 1),
+            carbs=round(food['carbs'] * servings, 1),
+            fats=round(food['fats'] * servings, 1)
+        )
+        db.session.add(meal)
+        db.session.commit()
+        return jsonify({'success': True, 'meal_id': meal.id, 'food': food, 'servings': servings})
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/search')
+def search_history():
+    """Ranked, paginated full-text search over the user's saved plans and workout logs"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not logged in'})
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': True, 'results': [], 'total': 0})
+    
+    try:
+        from search import search
+        page = search(db, session['user_id'], query,
+                      page=request.args.get('page', 1, type=int),
+                      per_page=request.args.get('per_page', 20, type=int))
+        return jsonify({'success': True, **page})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/leaderboard')
+def leaderboard():
+    """Weekly top athletes by minutes, calories or streak, plus the user's own rank"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not logged in'})
+    
+    try:
+        from leaderboard import leaderboards
+        board = leaderboards.standings(db, request.args.get('metric', 'minutes'), session['user_id'],
+                                       previous=request.args.get('period') == 'previous')
+        return jsonify({'success': True, **board})
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/export/<kind>.<fmt>')
+def export_history(kind, fmt):
+    """Download schedules, workouts or meals as CSV or NDJSON (streamed)"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not logged in'})
+    
+    from export import FORMATS, export_stream
+    from user_cache import user_cache
+    user = user_cache.get(session['user_id'])
+    try:
+        chunks = export_stream(user, kind, fmt)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    
+    filename = f"fitplan-{kind}-{datetime.utcnow().strftime('%Y%m%d')}.{fmt}"
+    return app.response_class(stream_with_context(chunks), mimetype=FORMATS[fmt],
+                              headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@app.route('/export/calendar-url')
+def calendar_url():
+    """Private iCalendar subscription URL for the user's planned workout days"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not logged in'})
+    
+    from export import calendar_token
+    token = calendar_token(app.secret_key, session['user_id'])
+    return jsonify({'success': True, 'url': url_for('calendar_feed', token=token, _external=True)})
+
+@app.route('/calendar/<token>.ics')
+def calendar_feed(token):
+    """iCalendar feed polled by calendar clients; unchanged feeds answer 304 from the ETag alone"""
+    from export import calendar_etag, calendar_stream, calendar_user_id
+    from user_cache import user_cache
+    user = user_cache.get(calendar_user_id(app.secret_key, token))
+    if not user:
+        return jsonify({'error': 'Unknown calendar'}), 404
+    
+    etag = calendar_etag(user.id)
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(stream_with_context(calendar_stream(user)),
+                                      mimetype='text/calendar')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# ======================================================
+# METRICS ENDPOINT
+# ======================================================
+
+@app.route('/metrics')
+def metrics():
+    """Expose process metrics in Prometheus text format"""
+    token = os.getenv('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    return app.response_class(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 # ======================================================
 # TASK 6: DATABASE INITIALIZATION
 # ======================================================
 
 def init_db():
     """Initialize database tables"""
+    from timeseries import ensure_schema
     with app.app_context():
         db.create_all()
+        ensure_schema(db)  # create_all does not add columns to existing tables
         print("✅ Database tables created/verified!")
 
 if __name__ == '__main__':
@@ -0,0 +1,279 @@
+"""
+ASGI entry point: asyncio execution for the I/O-bound routes
+
+    uvicorn asgi:application --workers 2
+    gunicorn --worker-class uvicorn.workers.UvicornWorker --workers 2 asgi:application
+
+POST /generate-schedule, /send-otp and /resend-otp run as coroutines. The
+Groq stream and the SendGrid call are awaited on a pooled httpx client
+(async_http.py), so a request waiting on a provider holds no thread and one
+process keeps up to ASYNC_GENERATION_CONCURRENCY generations in flight.
+Their database and session work - the same functions the sync views in
+app.py call - runs on a small thread pool (ASYNC_DB_THREADS, sized like the
+SQLAlchemy connection pool).
+
+Every other route is the unchanged Flask view, run on that pool with its
+body iterated there too, so streamed exports work. Each request's Flask
+context lives in its own contextvars.Context that only pool threads enter,
+one step at a time: before/after_request hooks, rate limits, sessions and
+teardown behave as under gunicorn. `gunicorn app:app` is unaffected.
+"""
+
+import asyncio
+import contextvars
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from flask import jsonify, request_started
+from app import (app, limiter, BATCH_GENERATION, finish_generation, otp_delivery_response,
+                 prepare_resend_otp, prepare_send_otp, serve_template, start_generation)
+from admission import async_admission
+from async_http import close_async_client
+from metrics import OTP_EVENTS
+from usage import attribute_to
+
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', 16))
+
+_pool = ThreadPoolExecutor(max_workers=ASYNC_DB_THREADS, thread_name_prefix='asgi-sync')
+
+
+# ======================================================
+# REQUEST PLUMBING
+# ======================================================
+
+class _Exchange:
+    """One request's contextvars, entered only from the thread pool"""
+
+    def __init__(self, scope, body):
+        self.environ = _environ(scope, body)
+        self.context = contextvars.Context()
+
+    def run(self, func, *args):
+        """Await func(*args) on the pool, inside this request's context"""
+        return asyncio.get_running_loop().run_in_executor(_pool, partial(self.context.run, func, *args))
+
+
+def _environ(scope, body):
+    """WSGI environ for an ASGI http scope (PEP 3333 / ASGI spec mapping)"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope.get('headers', []):
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _start(send, status, headers):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    })
+
+
+# ---------- async views (Flask steps mirrored from Flask.full_dispatch_request) ----------
+
+def _begin(flask_ctx):
+    """Push the request context, run before_request hooks (metrics, ...) and the
+    view's @limiter.limit, which Flask-Limiter otherwise checks inside the sync view"""
+    flask_ctx.push()
+    request_started.send(app)
+    try:
+        rv = app.preprocess_request()
+        if rv is None:
+            limiter.check()
+    except Exception as e:
+        return _error(e)
+    return None if rv is None else _finish(rv)
+
+
+def _finish(rv):
+    """(status, headers, body) after after_request hooks and saving the session"""
+    try:
+        response = app.finalize_request(rv)
+    except Exception as e:
+        response = app.handle_exception(e)
+    return response.status_code, response.headers.to_wsgi_list(), response.get_data()
+
+
+def _error(e):
+    try:
+        rv = app.handle_user_exception(e)
+    except Exception as e:
+        return _finish(app.handle_exception(e))
+    return _finish(rv)
+
+
+async def _dispatch(view, exchange, send):
+    flask_ctx = app.request_context(exchange.environ)
+    try:
+        result = await exchange.run(_begin, flask_ctx)
+        if result is None:
+            try:
+                result = await exchange.run(_finish, await view(exchange))
+            except Exception as e:
+                result = await exchange.run(_error, e)
+    finally:
+        await exchange.run(flask_ctx.pop, None)
+    status, headers, body = result
+    await _start(send, status, headers)
+    await send({'type': 'http.response.body', 'body': body})
+
+
+# ---------- every other route: the WSGI app on the pool ----------
+
+async def _wsgi(exchange, send):
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(' ', 1)[0]), headers]
+
+    body = await exchange.run(app.wsgi_app, exchange.environ, start_response)
+    try:
+        chunks = iter(body)
+        await _start(send, *started)
+        while True:
+            chunk = await exchange.run(next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(body, 'close'):
+            await exchange.run(body.close)
+
+
+# ======================================================
+# ASYNC VIEWS
+# ======================================================
+
+async def send_otp(exchange):
+    try:
+        email, otp, rejected = await exchange.run(prepare_send_otp)
+        if rejected is not None:
+            return rejected
+
+        from email_utils import send_otp_email_async
+        success = await send_otp_email_async(email, otp)
+        return await exchange.run(otp_delivery_response, 'send', success)
+
+    except Exception as e:
+        OTP_EVENTS.inc('send', 'error')
+        return await exchange.run(jsonify, {'success': False, 'message': str(e)})
+
+
+async def resend_otp(exchange):
+    email, otp, rejected = await exchange.run(prepare_resend_otp)
+    if rejected is not None:
+        return rejected
+
+    from email_utils import send_otp_email_async
+    success = await send_otp_email_async(email, otp)
+    return await exchange.run(otp_delivery_response, 'resend', success)
+
+
+async def generate_schedule(exchange):
+    try:
+        job = await exchange.run(start_generation)
+        if 'error' in job:
+            return job['error']
+
+        if job['schedule'] is None:
+            args = (job['prompt'], job['user'], job['goal'], job['level'], job['equipment'])
+            async with async_admission.slot() as admitted:
+                with attribute_to(job['user'].id):
+                    if not admitted:
+                        await exchange.run(serve_template, job, 'busy')
+                    elif BATCH_GENERATION:
+                        from batch_generator import BATCH_TIMEOUT, get_batcher
+                        batcher = get_batcher()
+                        # asyncio.wait, unlike wait_for, leaves the batcher's future uncancelled on timeout
+                        future = asyncio.wrap_future(batcher.submit(*args))
+                        done, _ = await asyncio.wait({future}, timeout=BATCH_TIMEOUT)
+                        job['schedule'], job['source'] = future.result() if done else \
+                            batcher.timed_out(*args[1:])
+                    else:
+                        from model_api import generate_workout_with_source_async
+                        job['schedule'], job['source'] = await generate_workout_with_source_async(*args)
+
+        return await exchange.run(finish_generation, job)
+
+    except Exception as e:
+        return await exchange.run(jsonify, {'success': False, 'error': str(e)})
+
+
+ASYNC_VIEWS = {
+    ('POST', '/generate-schedule'): generate_schedule,
+    ('POST', '/send-otp'): send_otp,
+    ('POST', '/resend-otp'): resend_otp,
+}
+
+
+# ======================================================
+# APPLICATION
+# ======================================================
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_async_client()
+            _pool.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    body = await _read_body(receive)
+    if body is None:
+        return  # client went away before sending the whole body
+    exchange = _Exchange(scope, body)
+    view = ASYNC_VIEWS.get((scope['method'], scope['path']))
+    if view is None:
+        await _wsgi(exchange, send)
+    else:
+        await _dispatch(view, exchange, send)
@@ -0,0 +1,35 @@
+"""
+Pooled async HTTP client for the ASGI mode (asgi.py)
+
+One httpx.AsyncClient per process keeps connections to Groq and SendGrid
+alive across requests, so concurrent generations share a bounded pool of
+ASYNC_HTTP_CONNECTIONS instead of each opening its own TLS connection.
+httpx is only imported when the ASGI mode first uses it.
+"""
+
+import os
+
+ASYNC_HTTP_CONNECTIONS = int(os.getenv('ASYNC_HTTP_CONNECTIONS', 100))
+ASYNC_HTTP_KEEPALIVE = int(os.getenv('ASYNC_HTTP_KEEPALIVE', 20))
+
+_client = None
+
+
+def async_client():
+    """The process-wide client (created on first use, on the serving event loop)"""
+    global _client
+    if _client is None:
+        import httpx
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=ASYNC_HTTP_CONNECTIONS,
+                                max_keepalive_connections=ASYNC_HTTP_KEEPALIVE),
+            timeout=httpx.Timeout(15.0)
+        )
+    return _client
+
+
+async def close_async_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
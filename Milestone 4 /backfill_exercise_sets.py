@@ -0,0 +1,51 @@
+"""
+One-off backfill: explode existing workout_logs.exercises text into exercise_sets
+
+    python backfill_exercise_sets.py --batch-size 2000
+
+Creates the exercise_sets table if needed, then streams workout logs in
+primary-key batches, parses each log's exercises text and bulk-inserts the set
+rows, committing once per batch. Logs that already have set rows are skipped,
+so the tool can be interrupted and re-run.
+"""
+
+import argparse
+from sqlalchemy import exists
+
+
+def backfill(db, batch_size):
+    from models import ExerciseSet, WorkoutLog
+    from exercise_sets import write_sets
+
+    last_id = 0
+    logs_done = sets_done = 0
+    while True:
+        batch = WorkoutLog.query\
+            .filter(WorkoutLog.id > last_id, WorkoutLog.exercises.isnot(None),
+                    ~exists().where(ExerciseSet.log_id == WorkoutLog.id))\
+            .order_by(WorkoutLog.id)\
+            .with_entities(WorkoutLog.id, WorkoutLog.user_id, WorkoutLog.date, WorkoutLog.exercises)\
+            .limit(batch_size).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        written = write_sets(db, batch)
+        db.session.commit()
+
+        logs_done += len(batch)
+        sets_done += written
+        print(f"  {logs_done} logs -> {sets_done} sets")
+
+    print(f"Done: {logs_done} logs, {sets_done} set rows written")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill exercise_sets from workout log text')
+    parser.add_argument('--batch-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    from app import app, db
+    with app.app_context():
+        db.create_all()
+        backfill(db, args.batch_size)
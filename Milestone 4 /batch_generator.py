@@ -0,0 +1,198 @@
+"""
+Micro-batched plan generation: several users per LLM round-trip
+
+Requests arriving within BATCH_WINDOW_MS of each other (up to BATCH_MAX_SIZE)
+are packed into one multi-plan completion. The response is split on the plan
+delimiters and validated per user; users whose section fails validation are
+retried individually through the normal fallback chain.
+
+Batches are sent from a pool of BATCH_CONCURRENCY threads, so a burst of
+sign-ups keeps several batch calls in flight instead of queueing them.
+A request that gets no answer within BATCH_TIMEOUT is served a template.
+
+Batching only helps when one process handles concurrent requests (gunicorn
+gthread/gevent workers or the async mode); with sync workers every batch
+has size one and the request goes straight to generate_workout_with_source.
+"""
+
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from metrics import LLM_LATENCY, Counter, Histogram
+from plan_validator import PlanValidator
+from prompt_builder import build_batch_prompt
+from usage import attribute_to
+
+BATCH_WINDOW_MS = int(os.getenv('BATCH_WINDOW_MS', 200))
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 4))
+BATCH_MAX_TOKENS = int(os.getenv('BATCH_MAX_TOKENS', 8000))
+BATCH_TIMEOUT = int(os.getenv('BATCH_TIMEOUT', 60))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 4))
+
+PLAN_HEADER_PATTERN = re.compile(r'^[\s#*]*=+\s*PLAN\s+(\d+)\s*=+[\s*]*$', re.IGNORECASE | re.MULTILINE)
+
+BATCH_SIZES = Histogram(
+    'fitplan_generation_batch_size', 'Users packed into one LLM request',
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16))
+BATCH_RESULTS = Counter(
+    'fitplan_batch_plans_total', 'Per-user outcome of batched generation', ('outcome',))
+
+
+class _Pending:
+    __slots__ = ('prompt', 'user', 'goal', 'level', 'equipment', 'future')
+
+    def __init__(self, prompt, user, goal, level, equipment):
+        self.prompt = prompt
+        self.user = user
+        self.goal = goal
+        self.level = level
+        self.equipment = equipment
+        self.future = Future()
+
+
+def split_batch_response(text, count):
+    """Split a multi-plan completion into {index: plan text}"""
+    matches = list(PLAN_HEADER_PATTERN.finditer(text))
+    sections = {}
+    for i, match in enumerate(matches):
+        index = int(match.group(1))
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        if 1 <= index <= count and index not in sections:
+            sections[index] = text[match.end():end].strip()
+    return sections
+
+
+class PlanBatcher:
+    """Collect generation requests for a short window and send them together"""
+
+    def __init__(self, window_ms=BATCH_WINDOW_MS, max_size=BATCH_MAX_SIZE):
+        self.window = window_ms / 1000.0
+        self.max_size = max_size
+        self._pending = []
+        self._cond = threading.Condition()
+        self._batch_pool = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='plan-batch')
+        self._retry_pool = ThreadPoolExecutor(max_workers=max_size, thread_name_prefix='plan-retry')
+        self._thread = threading.Thread(target=self._run, name='plan-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt, user, goal, level, equipment):
+        """Queue one user's request; returns a Future resolving to (plan text, source)"""
+        item = _Pending(prompt, user, goal, level, equipment)
+        with self._cond:
+            self._pending.append(item)
+            self._cond.notify()
+        return item.future
+
+    def generate(self, prompt, user, goal, level, equipment, timeout=BATCH_TIMEOUT):
+        """Blocking convenience wrapper around submit(); a template plan after the timeout"""
+        try:
+            return self.submit(prompt, user, goal, level, equipment).result(timeout=timeout)
+        except FutureTimeout:
+            return self.timed_out(user, goal, level, equipment)
+
+    def timed_out(self, user, goal, level, equipment):
+        """(template plan, 'template') for a request whose batch did not answer in time"""
+        from model_api import generate_fallback_template
+        from metrics import TEMPLATE_FALLBACKS
+        BATCH_RESULTS.inc('timeout')
+        TEMPLATE_FALLBACKS.inc()
+        return generate_fallback_template(user, goal, level, equipment), 'template'
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_size]
+            del self._pending[:self.max_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            BATCH_SIZES.observe(len(batch))
+            self._batch_pool.submit(self._send, batch)
+
+    def _send(self, batch):
+        try:
+            self._dispatch(batch)
+        except Exception as e:
+            print(f"Batch generation failed: {str(e)}")
+            for item in batch:
+                if not item.future.done():
+                    self._retry_individually(item)
+
+    def _dispatch(self, batch):
+        if len(batch) == 1:
+            self._retry_individually(batch[0], outcome='single')
+            return
+
+        from model_api import MODELS, gate_plan, request_completion
+        started = time.perf_counter()
+        try:
+            # The shared completion is charged evenly to every user in the batch
+            with attribute_to(*[item.user.id for item in batch]):
+                text = request_completion(
+                    MODELS[0],
+                    build_batch_prompt([item.prompt for item in batch]),
+                    os.getenv('GROQ_API_KEY'),
+                    max_tokens=min(1500 * len(batch), BATCH_MAX_TOKENS),
+                    timeout=BATCH_TIMEOUT
+                )
+        except Exception:
+            LLM_LATENCY.observe(time.perf_counter() - started, MODELS[0], 'error')
+            raise
+        elapsed = time.perf_counter() - started
+        sections = split_batch_response(text, len(batch))
+
+        accepted = 0
+        for index, item in enumerate(batch, start=1):
+            plan = sections.get(index)
+            if plan:
+                # Same acceptance rule (valid and MIN_PLAN_SCORE) as a single-user generation
+                validator = PlanValidator(item.equipment)
+                validator.feed(plan)
+                plan = gate_plan(MODELS[0], validator, plan)
+                if plan is not None:
+                    accepted += 1
+                    BATCH_RESULTS.inc('batched')
+                    item.future.set_result((plan, 'ai'))
+                    continue
+            self._retry_individually(item)
+        # One upstream call, one latency observation
+        LLM_LATENCY.observe(elapsed, MODELS[0], 'ok' if accepted else 'invalid')
+
+    def _retry_individually(self, item, outcome='retried'):
+        from model_api import generate_workout_with_source
+        BATCH_RESULTS.inc(outcome)
+
+        def run():
+            try:
+                with attribute_to(item.user.id):
+                    item.future.set_result(generate_workout_with_source(
+                        item.prompt, item.user, item.goal, item.level, item.equipment))
+            except Exception as e:
+                item.future.set_exception(e)
+
+        self._retry_pool.submit(run)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    """Process-wide batcher, started lazily on first use"""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = PlanBatcher()
+    return _batcher
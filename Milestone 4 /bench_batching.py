@@ -0,0 +1,110 @@
+"""
+Check: micro-batched vs. per-user plan generation against the stub model server
+
+    python bench_batching.py --users 16 --latency 1.0
+    python bench_batching.py --users 16 --fail-rate 0.2
+
+Starts stub_model_server in-process and sends --users concurrent generations
+first one by one (generate_workout_with_source) and then through the
+PlanBatcher. With no injected failures every user must get a validated AI
+plan from both paths, and the batched run must need fewer model calls.
+Reports wall time, model calls and per-user batch outcomes. Needs no
+database or API key.
+"""
+
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+GOALS = ('strength', 'muscle_gain', 'weight_loss', 'endurance')
+EQUIPMENT = ('dumbbells', 'bodyweight', 'full_gym')
+
+
+class _User:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f'Athlete{user_id}'
+        self.age = 20 + user_id % 40
+        self.weight = 55 + user_id % 50
+        self.height = 155 + user_id % 40
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 256  # every user connects at once
+    daemon_threads = True
+
+
+def start_stub(latency, fail_rate, calls):
+    from stub_model_server import make_handler
+    handler = make_handler(latency, fail_rate)
+
+    class CountingHandler(handler):
+        def do_POST(self):
+            calls.append(time.monotonic())
+            super().do_POST()
+
+    server = _Server(('127.0.0.1', 0), CountingHandler)
+    threading.Thread(target=server.serve_forever, name='stub-model-server', daemon=True).start()
+    return server
+
+
+def run(generate, users):
+    from prompt_builder import build_workout_prompt
+    requests = [(user, GOALS[user.id % len(GOALS)], 'beginner', EQUIPMENT[user.id % len(EQUIPMENT)])
+                for user in users]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(users)) as pool:
+        results = list(pool.map(lambda r: generate(build_workout_prompt(*r), *r), requests))
+    return time.perf_counter() - started, [source for _, source in results]
+
+
+def main(users, latency, fail_rate):
+    calls = []
+    server = start_stub(latency, fail_rate, calls)
+    os.environ['GROQ_API_URL'] = f'http://127.0.0.1:{server.server_address[1]}/v1/chat/completions'
+    os.environ.setdefault('GROQ_API_KEY', 'stub')
+
+    # Imported after GROQ_API_URL points at the stub
+    from batch_generator import BATCH_RESULTS, PlanBatcher
+    from model_api import generate_workout_with_source
+
+    people = [_User(i) for i in range(1, users + 1)]
+    single_s, single_sources = run(generate_workout_with_source, people)
+    single_calls = len(calls)
+
+    calls.clear()
+    batcher = PlanBatcher()
+    batched_s, batched_sources = run(batcher.generate, people)
+    batched_calls = len(calls)
+    server.shutdown()
+
+    print(f"{users} concurrent users, {latency:.1f} s per completion, fail rate {fail_rate:.0%}")
+    print(f"  one by one  {single_s:6.2f} s  {single_calls:3d} model calls  sources {_count(single_sources)}")
+    print(f"  batched     {batched_s:6.2f} s  {batched_calls:3d} model calls  sources {_count(batched_sources)}")
+    print(f"  batch outcomes {_count_metric(BATCH_RESULTS)}")
+
+    if fail_rate == 0:
+        assert set(single_sources) == {'ai'}, single_sources
+        assert set(batched_sources) == {'ai'}, batched_sources
+        assert batched_calls < single_calls, (batched_calls, single_calls)
+        print("OK")
+
+
+def _count(sources):
+    return {source: sources.count(source) for source in sorted(set(sources))}
+
+
+def _count_metric(counter):
+    return {labels[0]: value for _, labels, value in counter.samples()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check batched plan generation against the stub model server')
+    parser.add_argument('--users', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=1.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    main(args.users, args.latency, args.fail_rate)
@@ -0,0 +1,77 @@
+"""
+Benchmark: a year of 1 Hz wearable data stored as delta-encoded blobs
+
+    python bench_timeseries.py --workouts 365 --minutes 60
+
+Synthesizes one heart-rate and one step series per workout and reports the
+storage size against per-sample rows and JSON arrays, plus encode, decode and
+summary throughput. Needs only NumPy (no database).
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+from timeseries import decode_series, encode_series, heart_rate_summary, steps_summary
+
+# Rough PostgreSQL cost of one (log_id int, ts bigint, value int) row:
+# 24 B tuple header + 4 B item pointer + 16 B data, plus ~16 B per btree entry
+ROW_BYTES = 24 + 4 + 16 + 16
+
+
+def synthetic_workout(rng, start_ms, seconds):
+    """Warm-up, intervals and cool-down heart rate with sensor noise; steps per second"""
+    t = np.arange(seconds)
+    base = 95 + 60 * np.clip(t / 600, 0, 1) - 50 * np.clip((t - (seconds - 300)) / 300, 0, 1)
+    intervals = 12 * np.sin(t / 90.0)
+    hr = base + intervals + rng.normal(0, 2, seconds)
+    steps = rng.poisson(2.4, seconds)
+    return start_ms + t * 1000, np.rint(hr).astype(np.int64), steps
+
+
+def main(workouts, minutes, seed):
+    rng = np.random.default_rng(seed)
+    seconds = minutes * 60
+    series = []
+    start = 1_700_000_000_000
+    for day in range(workouts):
+        times, hr, steps = synthetic_workout(rng, start + day * 86_400_000, seconds)
+        series.append((times, hr))
+        series.append((times, steps))
+    samples = sum(len(t) for t, _ in series)
+
+    started = time.perf_counter()
+    blobs = [encode_series(t, v) for t, v in series]
+    encode_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    decoded = [decode_series(b) for b in blobs]
+    decode_s = time.perf_counter() - started
+    assert all(np.array_equal(v, d[1]) and np.array_equal(t, d[0]) for (t, v), d in zip(series, decoded))
+
+    started = time.perf_counter()
+    for i, (times, values) in enumerate(decoded):
+        heart_rate_summary(times, values, 35) if i % 2 == 0 else steps_summary(times, values)
+    summary_s = time.perf_counter() - started
+
+    json_bytes = sum(len(json.dumps({'t': t.tolist(), 'v': v.tolist()})) for t, v in series[:20]) \
+        * len(series) / min(len(series), 20)
+    blob_bytes = sum(len(b) for b in blobs)
+    row_bytes = samples * ROW_BYTES
+
+    print(f"{workouts} workouts x {minutes} min x 2 series = {samples:,} samples")
+    print(f"  per-sample rows (est.) {row_bytes / 1e6:10.1f} MB")
+    print(f"  JSON arrays            {json_bytes / 1e6:10.1f} MB")
+    print(f"  delta blobs            {blob_bytes / 1e6:10.2f} MB  ({blob_bytes / samples:.2f} B/sample)")
+    print(f"  encode   {encode_s * 1000:8.1f} ms  ({samples / encode_s / 1e6:.1f} M samples/s)")
+    print(f"  decode   {decode_s * 1000:8.1f} ms  ({samples / decode_s / 1e6:.1f} M samples/s)")
+    print(f"  summary  {summary_s * 1000:8.1f} ms  ({samples / summary_s / 1e6:.1f} M samples/s)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark wearable time-series storage')
+    parser.add_argument('--workouts', type=int, default=365)
+    parser.add_argument('--minutes', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    main(args.workouts, args.minutes, args.seed)
@@ -0,0 +1,117 @@
+"""
+Content-addressed, compressed storage for schedule text
+
+Plan bodies are normalized (the owner's name in the plan header is replaced
+by a placeholder so template plans that differ only in the name line
+collapse to one blob),
+hashed with SHA-256, compressed with zstd when the zstandard package is
+installed (zlib otherwise) and stored once in schedule_blobs with a
+reference count.
+"""
+
+import hashlib
+import re
+import zlib
+from sqlalchemy.exc import IntegrityError
+from plan_validator import DAY_PATTERN
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+NAME_PLACEHOLDER = '{{name}}'
+ZLIB_LEVEL = 9
+ZSTD_LEVEL = 10
+
+
+def replace_name(text, old, new):
+    """
+    Swap the owner's name for another in the plan header only - the lines
+    before the first DAY heading ("For: Ben | Goal: ..."), as a whole word -
+    so exercise names such as "Bench Press" are never touched
+    """
+    if not old or old == new:
+        return text
+    pattern = re.compile(rf'(?<!\w){re.escape(old)}(?!\w)')
+    lines = text.split('\n')
+    for i, line in enumerate(lines):
+        if DAY_PATTERN.match(line):
+            break
+        lines[i] = pattern.sub(lambda match: new, line)
+    return '\n'.join(lines)
+
+
+def normalize(text, name):
+    return replace_name(text, name, NAME_PLACEHOLDER)
+
+
+def content_hash(normalized):
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def compress(raw):
+    """Return (codec, compressed bytes)"""
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return 'zlib', zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decompress(codec, data):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed schedules")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def blob_text(blob, name):
+    """Decompress a blob and restore the reader's name"""
+    text = decompress(blob.codec, blob.data).decode('utf-8')
+    return text.replace(NAME_PLACEHOLDER, name or '')
+
+
+def store_text(db, text, name, refs=1):
+    """
+    Store text (deduplicated) and add `refs` references to its blob.
+    Returns the blob hash; the caller commits.
+    """
+    from models import ScheduleBlob
+    normalized = normalize(text, name)
+    digest = content_hash(normalized)
+
+    updated = ScheduleBlob.query.filter_by(hash=digest)\
+        .update({ScheduleBlob.ref_count: ScheduleBlob.ref_count + refs}, synchronize_session=False)
+    if updated:
+        return digest
+
+    raw = normalized.encode('utf-8')
+    codec, data = compress(raw)
+    try:
+        with db.session.begin_nested():
+            db.session.add(ScheduleBlob(hash=digest, codec=codec, data=data, size=len(raw), ref_count=refs))
+    except IntegrityError:
+        # Another worker inserted the same content first
+        ScheduleBlob.query.filter_by(hash=digest)\
+            .update({ScheduleBlob.ref_count: ScheduleBlob.ref_count + refs}, synchronize_session=False)
+    return digest
+
+
+def release(db, digest):
+    """Drop one reference to a blob, deleting it when unused; the caller commits"""
+    if not digest:
+        return
+    from models import ScheduleBlob
+    ScheduleBlob.query.filter_by(hash=digest)\
+        .update({ScheduleBlob.ref_count: ScheduleBlob.ref_count - 1}, synchronize_session=False)
+    ScheduleBlob.query.filter(ScheduleBlob.hash == digest, ScheduleBlob.ref_count <= 0)\
+        .delete(synchronize_session=False)
+
+
+def set_schedule_text(db, workout_schedule, text, name):
+    """Point a schedule at the blob for `text`, releasing its previous blob"""
+    previous = workout_schedule.blob_hash
+    workout_schedule.blob_hash = store_text(db, text, name)
+    workout_schedule.schedule_data = None
+    # Same content again nets out: store_text added the reference released here
+    release(db, previous)
@@ -4,6 +4,7 @@ File: database.py - Database Models with Input Validation Support
 """
 
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -53,6 +54,22 @@ class OTPRecord(db.Model):
         return datetime.utcnow() - self.created_at > timedelta(minutes=expiry_minutes)
 
 
+# ======================================================
+# SCHEDULE BLOB MODEL (CONTENT-ADDRESSED PLAN STORAGE)
+# ======================================================
+
+class ScheduleBlob(db.Model):
+    """Compressed, deduplicated plan body shared by every schedule with the same content"""
+    __tablename__ = 'schedule_blobs'
+    
+    hash = db.Column(db.String(64), primary_key=True)  # SHA-256 of the normalized text
+    codec = db.Column(db.String(10), nullable=False)  # zstd or zlib
+    data = db.Column(db.LargeBinary, nullable=False)
+    size = db.Column(db.Integer)  # Uncompressed length in bytes
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 # ======================================================
 # WORKOUT SCHEDULE MODEL (FOR AI GENERATION)
 # ======================================================
@@ -63,14 +80,60 @@ class WorkoutSchedule(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    schedule_data = db.Column(db.Text)  # The generated workout plan
+    schedule_data = db.Column(db.Text)  # Legacy inline plan text (new rows use blob_hash)
+    blob_hash = db.Column(db.String(64), db.ForeignKey('schedule_blobs.hash'), index=True)
     goal = db.Column(db.String(50))  # Store the goal used for generation
     level = db.Column(db.String(20))  # Store the level used
     equipment = db.Column(db.String(100))  # Store equipment used
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Relationship
+    # Relationships
     user = db.relationship('User', backref='schedules')
+    blob = db.relationship('ScheduleBlob')
+    
+    @property
+    def plan_text(self):
+        """Plan text from the shared blob, or the legacy inline column"""
+        if self.blob_hash:
+            from blob_store import blob_text
+            return blob_text(self.blob, self.user.name)
+        return self.schedule_data
+
+
+# ======================================================
+# PLAN CACHE MODEL (FOR PRE-GENERATED PROFILE BUCKETS)
+# ======================================================
+
+class PlanCacheEntry(db.Model):
+    """Validated plan shared by every profile in a (goal, level, equipment, body stats) bucket"""
+    __tablename__ = 'plan_cache_entries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    bucket_key = db.Column(db.String(120), unique=True, nullable=False, index=True)
+    schedule_data = db.Column(db.Text, nullable=False)
+    owner_name = db.Column(db.String(100))  # Name used when generating, replaced on read
+    score = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ======================================================
+# TOKEN USAGE MODEL (PER-USER LLM ACCOUNTING)
+# ======================================================
+
+class TokenUsage(db.Model):
+    """Daily LLM token usage and cost per user and model, written in batches by usage.py"""
+    __tablename__ = 'token_usage'
+    __table_args__ = (db.UniqueConstraint('user_id', 'day', 'model', name='uq_token_usage_user_day_model'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)  # NULL: offline jobs
+    day = db.Column(db.Date, nullable=False, index=True)
+    model = db.Column(db.String(60), nullable=False)
+    requests = db.Column(db.Integer, default=0, nullable=False)
+    prompt_tokens = db.Column(db.Integer, default=0, nullable=False)
+    completion_tokens = db.Column(db.Integer, default=0, nullable=False)
+    latency_ms = db.Column(db.BigInteger, default=0, nullable=False)
+    cost = db.Column(db.Float, default=0.0, nullable=False)  # USD
 
 
 # ======================================================
@@ -207,10 +270,142 @@ class WorkoutLog(db.Model):
     workout_name = db.Column(db.String(200))
     duration = db.Column(db.Integer)
     calories_burned = db.Column(db.Integer)
+    # Wearable summaries, computed at ingest by timeseries.py
+    avg_heart_rate = db.Column(db.Integer)
+    max_heart_rate = db.Column(db.Integer)
+    hr_zones = db.Column(db.String(64))  # Seconds in zones 1-5, comma-separated
+    total_steps = db.Column(db.Integer)
     exercises = db.Column(db.Text)
     mood = db.Column(db.String(50))
 
 
+class WorkoutSeries(db.Model):
+    """Delta-encoded heart-rate or step samples for one workout (see timeseries.py)"""
+    __tablename__ = 'workout_series'
+    __table_args__ = (db.UniqueConstraint('log_id', 'kind', name='uq_workout_series_log_kind'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    log_id = db.Column(db.Integer, db.ForeignKey('workout_logs.id', ondelete='CASCADE'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # heart_rate / steps
+    samples = db.Column(db.Integer, nullable=False)
+    started_ms = db.Column(db.BigInteger)
+    ended_ms = db.Column(db.BigInteger)
+    data = db.Column(db.LargeBinary, nullable=False)
+
+
+class ExerciseSet(db.Model):
+    """One performed set from a WorkoutLog (normalized for progress analytics)"""
+    __tablename__ = 'exercise_sets'
+    __table_args__ = (
+        # Covering indexes for personal records and weekly volume per user
+        db.Index('ix_exercise_sets_user_exercise', 'user_id', 'exercise_name', 'load', 'reps', 'duration'),
+        db.Index('ix_exercise_sets_user_date', 'user_id', 'performed_on', 'exercise_id', 'reps', 'load'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    log_id = db.Column(db.Integer, db.ForeignKey('workout_logs.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # Copied from the log
+    performed_on = db.Column(db.Date)  # Copied from the log
+    exercise_id = db.Column(db.Integer)  # exercise_catalog index, NULL if not in the catalog
+    exercise_name = db.Column(db.String(100), nullable=False)  # Lower-cased
+    set_index = db.Column(db.SmallInteger, nullable=False)
+    reps = db.Column(db.Integer)
+    load = db.Column(db.Float)  # kg
+    duration = db.Column(db.Integer)  # seconds
+
+
+class LeaderboardTotal(db.Model):
+    """Running per-user total of one metric for one leaderboard period (see leaderboard.py)"""
+    __tablename__ = 'leaderboard_totals'
+    __table_args__ = (
+        db.UniqueConstraint('period_start', 'metric', 'user_id', name='uq_leaderboard_totals_user'),
+        # Top-K (backward scan) and rank (count of higher values) without touching workout_logs
+        db.Index('ix_leaderboard_totals_rank', 'period_start', 'metric', 'value', 'user_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    period_start = db.Column(db.Date, nullable=False)  # Monday of the week
+    metric = db.Column(db.String(20), nullable=False)  # minutes / calories / streak
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class LeaderboardPeriod(db.Model):
+    """A closed leaderboard week; streaks for the week are written when it closes"""
+    __tablename__ = 'leaderboard_periods'
+    
+    period_start = db.Column(db.Date, primary_key=True)
+    closed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    participants = db.Column(db.Integer, default=0)
+
+
+class Reminder(db.Model):
+    """Training-day reminder email for one day of a saved plan (see reminders.py)"""
+    __tablename__ = 'reminders'
+    __table_args__ = (db.Index('ix_reminders_status_due', 'status', 'due_at'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    schedule_id = db.Column(db.Integer, db.ForeignKey('workout_schedules.id', ondelete='CASCADE'), nullable=False)
+    day = db.Column(db.SmallInteger, nullable=False)  # Plan day 1-5
+    due_at = db.Column(db.DateTime, nullable=False)  # UTC
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending/sent/failed/skipped/cancelled
+    sent_at = db.Column(db.DateTime)
+
+
+class SchedulerLease(db.Model):
+    """Leader lease and persisted cursor of a background job shared by all workers"""
+    __tablename__ = 'scheduler_leases'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(100))
+    expires_at = db.Column(db.DateTime)
+    cursor = db.Column(db.DateTime)  # Every reminder due up to here has been dispatched
+
+
+class CacheVersion(db.Model):
+    """Per-user data version, bumped whenever the user's workout or meal logs change (see fragments.py)"""
+    __tablename__ = 'cache_versions'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SearchDocument(db.Model):
+    """Searchable text (title + exercise names) of one schedule or workout log (see search.py)"""
+    __tablename__ = 'search_documents'
+    __table_args__ = (db.UniqueConstraint('kind', 'ref_id', name='uq_search_documents_ref'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # schedule / log
+    ref_id = db.Column(db.Integer, nullable=False)  # workout_schedules.id or workout_logs.id
+    title = db.Column(db.String(200))
+    body = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Inverted index over search_documents.body, created with the table:
+# a GIN index on PostgreSQL, an FTS5 external-content table kept in sync by triggers on SQLite
+event.listen(SearchDocument.__table__, 'after_create', DDL(
+    "CREATE INDEX ix_search_documents_fts ON search_documents "
+    "USING gin (to_tsvector('english', body))"
+).execute_if(dialect='postgresql'))
+
+for _statement in (
+    "CREATE VIRTUAL TABLE search_fts USING fts5(body, content='search_documents', "
+    "content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER search_documents_ai AFTER INSERT ON search_documents BEGIN "
+    "INSERT INTO search_fts(rowid, body) VALUES (new.id, new.body); END",
+    "CREATE TRIGGER search_documents_ad AFTER DELETE ON search_documents BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, body) VALUES ('delete', old.id, old.body); END",
+    "CREATE TRIGGER search_documents_au AFTER UPDATE ON search_documents BEGIN "
+    "INSERT INTO search_fts(search_fts, rowid, body) VALUES ('delete', old.id, old.body); "
+    "INSERT INTO search_fts(rowid, body) VALUES (new.id, new.body); END",
+):
+    event.listen(SearchDocument.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+
+
 class MealLog(db.Model):
     """Record daily meals"""
     __tablename__ = 'meal_logs'
@@ -231,6 +426,8 @@ class MealLog(db.Model):
 
 def init_db():
     """Initialize database tables"""
+    from timeseries import ensure_schema
     db.create_all()
+    ensure_schema(db)  # create_all does not add columns to existing tables
     print("✅ Database initialized for Milestone 4")
     print("   Features: Input validation, OTP tracking, Error logging")
@@ -2,28 +2,103 @@
 Email utilities for sending OTP via SendGrid
 """
 
+import asyncio
 import os
+import time
 import sendgrid
 from sendgrid.helpers.mail import Mail
+from traffic import RECORDING, REPLAYING, mail_replay, record_mail
+
+SENDGRID_SEND_URL = 'https://api.sendgrid.com/v3/mail/send'
 
 def send_otp_email(recipient_email, otp):
-    """Send OTP via SendGrid"""
+    """Send OTP via SendGrid (or replay recorded outcomes, see traffic.py)"""
+    if REPLAYING:
+        return mail_replay.send()
+    
+    started = time.perf_counter()
+    success = _send_otp_email(recipient_email, otp)
+    if RECORDING:
+        record_mail(success, time.perf_counter() - started)
+    return success
+
+async def send_otp_email_async(recipient_email, otp):
+    """send_otp_email for the ASGI mode (asgi.py): SendGrid's API on the pooled async client"""
+    if REPLAYING:
+        return await asyncio.to_thread(mail_replay.send)
+    
+    started = time.perf_counter()
+    success = await _send_email_async(recipient_email, *_otp_message(recipient_email, otp))
+    if RECORDING:
+        record_mail(success, time.perf_counter() - started)
+    return success
+
+def send_reminder_email(recipient_email, name, day, goal):
+    """Send a training-day reminder (replayed like OTP mail, see traffic.py)"""
+    if REPLAYING:
+        return mail_replay.send()
+    
+    started = time.perf_counter()
+    success = _send_email(
+        recipient_email,
+        'FitPlan-AI - Training day reminder',
+        f'Hi {name},\n\nDay {day} of your {goal} plan is on for today. '
+        f'Open FitPlan-AI to see your exercises.\n\nHave a great workout!'
+    )
+    if RECORDING:
+        record_mail(success, time.perf_counter() - started)
+    return success
+
+def _otp_message(recipient_email, otp):
+    """(subject, text, console line) of an OTP email"""
+    return (
+        'FitPlan-AI - Your Verification Code',
+        f'Your verification code is: {otp}\n\nThis code expires in 10 minutes.',
+        f"📧 OTP for {recipient_email}: {otp}"
+    )
+
+def _send_otp_email(recipient_email, otp):
+    return _send_email(recipient_email, *_otp_message(recipient_email, otp))
+
+def _message(recipient_email, subject, text):
+    return Mail(
+        from_email=os.getenv('EMAIL_USER', 'noreply@fitplan-ai.com'),
+        to_emails=recipient_email,
+        subject=subject,
+        plain_text_content=text
+    )
+
+def _send_email(recipient_email, subject, text, console=None):
     try:
         sg_api_key = os.getenv('SENDGRID_API_KEY')
         
         if not sg_api_key:
-            print(f"📧 OTP for {recipient_email}: {otp}")
+            print(console or f"📧 {subject} -> {recipient_email}")
             return True
         
-        message = Mail(
-            from_email=os.getenv('EMAIL_USER', 'noreply@fitplan-ai.com'),
-            to_emails=recipient_email,
-            subject='FitPlan-AI - Your Verification Code',
-            plain_text_content=f'Your verification code is: {otp}\n\nThis code expires in 10 minutes.'
-        )
-        
         sg = sendgrid.SendGridAPIClient(api_key=sg_api_key)
-        response = sg.send(message)
+        response = sg.send(_message(recipient_email, subject, text))
+        
+        return response.status_code in [200, 202]
+        
+    except Exception as e:
+        print(f"Error sending email: {str(e)}")
+        return False
+
+async def _send_email_async(recipient_email, subject, text, console=None):
+    try:
+        sg_api_key = os.getenv('SENDGRID_API_KEY')
+        
+        if not sg_api_key:
+            print(console or f"📧 {subject} -> {recipient_email}")
+            return True
+        
+        from async_http import async_client
+        response = await async_client().post(
+            SENDGRID_SEND_URL,
+            headers={"Authorization": f"Bearer {sg_api_key}"},
+            json=_message(recipient_email, subject, text).get()
+        )
         
         return response.status_code in [200, 202]
         
@@ -0,0 +1,177 @@
+"""
+Exercise catalog with equipment/muscle/goal bitmasks
+
+The catalog is loaded once from data/exercises.csv. Each exercise's required
+equipment, target muscles and compatible goals are encoded as integer
+bitmasks, and a lookup table over every equipment subset maps to a bitset of
+the exercises that subset can perform, so "which exercises fit this user" is
+a handful of integer ANDs.
+"""
+
+import csv
+import os
+from collections import namedtuple
+
+Exercise = namedtuple('Exercise', [
+    'index', 'name', 'muscle', 'muscles', 'equipment', 'goals', 'difficulty', 'kind',
+    'equipment_mask', 'muscle_mask', 'goal_mask'
+])
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'exercises.csv')
+
+# Difficulty: 1 = beginner, 2 = intermediate, 3 = advanced
+LEVELS = {'beginner': 1, 'intermediate': 2, 'advanced': 3}
+
+# Canonical equipment names (matching the Streamlit multiselect options)
+EQUIPMENT = ('dumbbells', 'resistance_band', 'yoga_mat', 'kettlebells',
+             'barbell', 'treadmill', 'exercise_bike')
+
+EQUIPMENT_ALIASES = {
+    'dumbbell': 'dumbbells',
+    'db': 'dumbbells',
+    'band': 'resistance_band',
+    'bands': 'resistance_band',
+    'resistance_bands': 'resistance_band',
+    'mat': 'yoga_mat',
+    'kettlebell': 'kettlebells',
+    'kb': 'kettlebells',
+    'barbells': 'barbell',
+    'bike': 'exercise_bike',
+    'stationary_bike': 'exercise_bike',
+}
+
+# Values that mean "everything is available"
+FULL_GYM = {'gym', 'full_gym', 'all'}
+# Values that mean "nothing extra is available"
+NO_EQUIPMENT = {'bodyweight', 'body_weight', 'no_equipment', 'none', ''}
+
+MUSCLES = ('chest', 'back', 'shoulders', 'biceps', 'triceps', 'quads', 'hamstrings',
+           'glutes', 'calves', 'core', 'cardio', 'mobility')
+
+GOALS = ('strength', 'muscle_gain', 'weight_loss', 'endurance', 'toning', 'general')
+
+EQUIPMENT_BITS = {name: 1 << i for i, name in enumerate(EQUIPMENT)}
+MUSCLE_BITS = {name: 1 << i for i, name in enumerate(MUSCLES)}
+GOAL_BITS = {name: 1 << i for i, name in enumerate(GOALS)}
+ALL_EQUIPMENT = (1 << len(EQUIPMENT)) - 1
+
+# ======================================================
+# LOADING AND INDEXES (built once at import)
+# ======================================================
+
+def _mask(names, bits):
+    mask = 0
+    for name in names:
+        mask |= bits[name]
+    return mask
+
+
+def _split(field):
+    return tuple(part for part in field.split('|') if part)
+
+
+def load_catalog(path=DATA_FILE):
+    """Parse the bundled catalog file into Exercise records"""
+    catalog = []
+    with open(path, newline='') as f:
+        rows = csv.reader(line for line in f if not line.startswith('#'))
+        for name, muscles, equipment, goals, difficulty, kind in rows:
+            muscles, equipment, goals = _split(muscles), _split(equipment), _split(goals)
+            catalog.append(Exercise(
+                len(catalog), name, muscles[0], muscles, equipment, goals, int(difficulty), kind,
+                _mask(equipment, EQUIPMENT_BITS), _mask(muscles, MUSCLE_BITS), _mask(goals, GOAL_BITS)
+            ))
+    return catalog
+
+
+def _bitset(exercises):
+    bits = 0
+    for e in exercises:
+        bits |= 1 << e.index
+    return bits
+
+
+CATALOG = load_catalog()
+BY_NAME = {e.name.lower(): e for e in CATALOG}
+
+# Exercise bitsets per primary muscle, any target muscle, goal and level (cumulative)
+PRIMARY_INDEX = {m: _bitset(e for e in CATALOG if e.muscle == m) for m in MUSCLES}
+TARGET_INDEX = {m: _bitset(e for e in CATALOG if e.muscle_mask & MUSCLE_BITS[m]) for m in MUSCLES}
+GOAL_INDEX = {g: _bitset(e for e in CATALOG if e.goal_mask & GOAL_BITS[g]) for g in GOALS}
+LEVEL_INDEX = {lvl: _bitset(e for e in CATALOG if e.difficulty <= d) for lvl, d in LEVELS.items()}
+ALL_EXERCISES = (1 << len(CATALOG)) - 1
+
+# Lookup table: equipment subset mask -> bitset of exercises it can perform
+EQUIPMENT_TABLE = [
+    _bitset(e for e in CATALOG if e.equipment_mask & ~subset == 0)
+    for subset in range(ALL_EQUIPMENT + 1)
+]
+
+
+def parse_equipment(equipment):
+    """
+    Normalize a free-form equipment string or list into an equipment mask.
+    Returns (mask, unknown items).
+    """
+    if isinstance(equipment, str):
+        items = equipment.replace(';', ',').replace(' and ', ',').split(',')
+    else:
+        items = list(equipment or [])
+
+    mask = 0
+    unknown = []
+    for item in items:
+        key = item.strip().lower().replace('-', '_').replace(' ', '_')
+        key = EQUIPMENT_ALIASES.get(key, key)
+        if key in NO_EQUIPMENT:
+            continue
+        if key in FULL_GYM:
+            mask = ALL_EQUIPMENT
+        elif key in EQUIPMENT_BITS:
+            mask |= EQUIPMENT_BITS[key]
+        else:
+            unknown.append(item.strip())
+    return mask, unknown
+
+
+def equipment_names(mask):
+    """Canonical equipment names contained in a mask"""
+    return [name for name, bit in EQUIPMENT_BITS.items() if mask & bit]
+
+
+def _members(bits):
+    result = []
+    while bits:
+        low = bits & -bits
+        result.append(CATALOG[low.bit_length() - 1])
+        bits ^= low
+    return result
+
+
+def match_bits(available=ALL_EQUIPMENT, muscle=None, level='advanced', goal=None, primary=True):
+    """Bitset of exercises fitting the equipment mask, muscle, level and goal"""
+    bits = EQUIPMENT_TABLE[available & ALL_EQUIPMENT] & LEVEL_INDEX.get(level, ALL_EXERCISES)
+    if muscle is not None:
+        bits &= (PRIMARY_INDEX if primary else TARGET_INDEX).get(muscle, 0)
+    if goal is not None:
+        bits &= GOAL_INDEX.get(goal, ALL_EXERCISES)
+    return bits
+
+
+def find_exercises(muscle, available, level='advanced', goal=None):
+    """Exercises whose primary muscle matches and that fit equipment, level and goal"""
+    return _members(match_bits(available, muscle, level, goal))
+
+
+def fits_equipment(exercise, available):
+    """True when every piece of equipment the exercise needs is available"""
+    return exercise.equipment_mask & ~available == 0
+
+
+def substitutes(name, available, level='advanced'):
+    """Exercises with the same primary muscle that the user's equipment allows"""
+    exercise = BY_NAME.get(name.lower())
+    if exercise is None:
+        return []
+    bits = match_bits(available, exercise.muscle, level) & ~(1 << exercise.index)
+    return _members(bits)
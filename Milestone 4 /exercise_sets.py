@@ -0,0 +1,222 @@
+"""
+Set-level exercise log: parsing, bulk writes and SQL-side progress analytics
+
+WorkoutLog.exercises stays the user's free text; each log is also exploded
+into one exercise_sets row per performed set so personal records, weekly
+volume and muscle-group load are computed by the database from covering
+indexes instead of re-parsing every log in Python.
+
+Accepted log text, one exercise per line (plan lines work as-is):
+
+    Barbell Back Squat - 3 x 5 @ 100kg
+    Bench Press - 80kg 3x8
+    Push-up: 12, 10, 8
+    Plank - 3 x 45 sec
+
+or a JSON list of {"name": ..., "sets": [{"reps": .., "load": .., "duration": ..}]}
+(or {"name", "sets": 3, "reps": 10, "load": 20}).
+"""
+
+import json
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import func, literal
+from exercise_catalog import BY_NAME, CATALOG
+from plan_validator import EXERCISE_PATTERN, SETS_REPS_PATTERN
+
+LB_TO_KG = 0.45359237
+MAX_SETS_PER_EXERCISE = 20
+
+NAME_SPLIT = re.compile(r'\s+[-–]\s+|:\s*|\s*\(')
+REP_LIST = re.compile(r'^\s*\d+(?:\s*,\s*\d+)+')
+LOAD = re.compile(r'(?:(?:@|with|at)\s*)?(?<![\d.])(\d+(?:\.\d+)?)\s*(kg|kgs|lb|lbs)\b', re.IGNORECASE)
+DURATION = re.compile(r'(\d+)\s*(sec(?:onds?)?|s\b|min(?:utes?)?)', re.IGNORECASE)
+
+
+def exercise_id(name):
+    """Catalog index for an exercise name, or None for exercises outside the catalog"""
+    exercise = BY_NAME.get(name.strip().lower())
+    return exercise.index if exercise is not None else None
+
+
+def _seconds(amount, unit):
+    return int(amount) * (60 if unit.lower().startswith('min') else 1)
+
+
+def parse_line(line):
+    """(name, [(reps, load_kg, duration_s), ...]) for one text line, or None"""
+    match = EXERCISE_PATTERN.match(line)
+    body = (match.group(2) if match else line).strip()
+    body = re.sub(r'[*_`]', '', body)
+    if not body:
+        return None
+    parts = NAME_SPLIT.split(body, maxsplit=1)
+    name = parts[0].strip()
+    detail = parts[1] if len(parts) > 1 else ''
+    if not name or not detail:
+        return None
+
+    load = None
+    load_match = LOAD.search(detail)
+    if load_match:
+        load = float(load_match.group(1))
+        if load_match.group(2).lower().startswith('lb'):
+            load = round(load * LB_TO_KG, 2)
+        detail = detail[:load_match.start()] + detail[load_match.end():]
+
+    sets = []
+    # Same sets/reps grammar the plan validator scores ("3 x 8", "3 sets of 10", "3 x 8-12")
+    sets_match = SETS_REPS_PATTERN.search(detail)
+    if sets_match:
+        count = min(int(sets_match.group(1)), MAX_SETS_PER_EXERCISE)
+        amount, unit = re.match(r'\d+', sets_match.group(2)).group(0), sets_match.group(3)
+        if unit and not unit.lower().startswith('rep'):
+            sets = [(None, load, _seconds(amount, unit))] * count
+        else:
+            sets = [(int(amount), load, None)] * count
+    elif REP_LIST.match(detail):
+        sets = [(int(reps), load, None) for reps in REP_LIST.match(detail).group(0).split(',')]
+    else:
+        duration = DURATION.search(detail)
+        if duration:
+            sets = [(None, load, _seconds(duration.group(1), duration.group(2)))]
+    return (name, sets[:MAX_SETS_PER_EXERCISE]) if sets else None
+
+
+def _number(value, cast):
+    try:
+        return cast(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_json(entries):
+    parsed = []
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict) or not entry.get('name'):
+            continue
+        sets = entry.get('sets')
+        if isinstance(sets, list):
+            rows = [(_number(s.get('reps'), int), _number(s.get('load'), float), _number(s.get('duration'), int))
+                    for s in sets if isinstance(s, dict)]
+        else:
+            count = min(_number(sets, int) or 1, MAX_SETS_PER_EXERCISE)
+            rows = [(_number(entry.get('reps'), int), _number(entry.get('load'), float),
+                     _number(entry.get('duration'), int))] * count
+        if rows:
+            parsed.append((str(entry['name']).strip(), rows))
+    return parsed
+
+
+def parse_exercises(text):
+    """Parse a WorkoutLog.exercises value into [(name, [(reps, load, duration), ...])]"""
+    if not text:
+        return []
+    stripped = text.strip()
+    if stripped[:1] in '[{':
+        try:
+            data = json.loads(stripped)
+            return _parse_json(data if isinstance(data, list) else data.get('exercises'))
+        except (ValueError, AttributeError):
+            pass
+    return [parsed for parsed in map(parse_line, stripped.split('\n')) if parsed]
+
+
+def set_rows(log):
+    """exercise_sets row dicts for one WorkoutLog (or a row with id, user_id, date, exercises)"""
+    rows = []
+    for name, sets in parse_exercises(log.exercises):
+        ex_id = exercise_id(name)
+        for set_index, (reps, load, duration) in enumerate(sets, start=1):
+            rows.append({
+                'log_id': log.id, 'user_id': log.user_id, 'performed_on': log.date,
+                'exercise_id': ex_id, 'exercise_name': name.lower()[:100], 'set_index': set_index,
+                'reps': reps, 'load': load, 'duration': duration,
+            })
+    return rows
+
+
+def write_sets(db, logs):
+    """Bulk-insert set rows for logs that already have ids; the caller commits"""
+    from models import ExerciseSet
+    rows = [row for log in logs for row in set_rows(log)]
+    if rows:
+        db.session.execute(ExerciseSet.__table__.insert(), rows)
+    return len(rows)
+
+
+def record_logs(db, logs):
+    """Save new WorkoutLogs with their set rows, search documents and leaderboard totals
+    in one transaction"""
+    from leaderboard import leaderboards
+    from search import index_log
+    db.session.add_all(logs)
+    db.session.flush()
+    count = write_sets(db, logs)
+    for log in logs:
+        index_log(db, log)
+    updates = leaderboards.add_logs(db, logs)
+    db.session.commit()
+    leaderboards.publish(updates)
+    return count
+
+
+# ======================================================
+# SQL-SIDE ANALYTICS
+# ======================================================
+
+def _week_start(db, column):
+    if db.engine.dialect.name == 'postgresql':
+        return func.date_trunc('week', column)
+    # SQLite: Monday of the row's week
+    offset = literal('-').concat(func.strftime('%w', func.date(column, '-1 day'))).concat(' days')
+    return func.date(column, offset)
+
+
+def personal_records(db, user_id):
+    """Heaviest load, most reps and longest hold per exercise"""
+    from models import ExerciseSet
+    rows = db.session.query(
+        ExerciseSet.exercise_name,
+        func.max(ExerciseSet.load),
+        func.max(ExerciseSet.reps),
+        func.max(ExerciseSet.duration),
+        func.count()
+    ).filter(ExerciseSet.user_id == user_id)\
+        .group_by(ExerciseSet.exercise_name)\
+        .order_by(ExerciseSet.exercise_name).all()
+    return [{'exercise': name, 'max_load': max_load, 'max_reps': max_reps,
+             'max_duration': max_duration, 'sets': sets}
+            for name, max_load, max_reps, max_duration, sets in rows]
+
+
+def weekly_volume(db, user_id, weeks=12):
+    """Per-week sets, reps and tonnage (reps x load) for the last N weeks"""
+    from models import ExerciseSet
+    since = datetime.utcnow().date() - timedelta(weeks=weeks)
+    week = _week_start(db, ExerciseSet.performed_on).label('week')
+    rows = db.session.query(
+        week,
+        func.count(),
+        func.coalesce(func.sum(ExerciseSet.reps), 0),
+        func.coalesce(func.sum(ExerciseSet.reps * ExerciseSet.load), 0.0)
+    ).filter(ExerciseSet.user_id == user_id, ExerciseSet.performed_on >= since)\
+        .group_by(week).order_by(week).all()
+    return [{'week': str(w)[:10], 'sets': sets, 'reps': int(reps), 'volume': round(float(volume), 1)}
+            for w, sets, reps, volume in rows]
+
+
+def muscle_load(db, user_id, days=7):
+    """Sets per primary muscle group over the last N days (catalog exercises only)"""
+    from models import ExerciseSet
+    since = datetime.utcnow().date() - timedelta(days=days)
+    rows = db.session.query(ExerciseSet.exercise_id, func.count())\
+        .filter(ExerciseSet.user_id == user_id, ExerciseSet.performed_on >= since,
+                ExerciseSet.exercise_id.isnot(None))\
+        .group_by(ExerciseSet.exercise_id).all()
+    load = {}
+    for ex_id, sets in rows:
+        if 0 <= ex_id < len(CATALOG):
+            muscle = CATALOG[ex_id].muscle
+            load[muscle] = load.get(muscle, 0) + sets
+    return load
@@ -0,0 +1,233 @@
+"""
+Streaming exports of a user's plans and history, plus an iCalendar feed
+
+CSV and NDJSON exports of workout_schedules, workout_logs and meal_logs are
+generated row by row from a server-side cursor (yield_per, which uses a
+named cursor on PostgreSQL) and sent as a chunked response, so memory stays
+flat however long the history is.
+
+The calendar feed lists the planned days of the user's recent plans as
+all-day events. Calendar clients poll it without a session, so it is
+addressed by a signed per-user token. Its ETag is computed from one small
+indexed query over the plans in the window (ids and content hashes), so a
+poll that finds nothing new returns 304 without decompressing or rendering
+any plan.
+"""
+
+import csv
+import hashlib
+import json
+from datetime import datetime, timedelta
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import func
+
+EXPORT_BATCH = 500
+CHUNK_BYTES = 64 * 1024
+CALENDAR_WEEKS = 8
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}  # Flask appends charset=utf-8 to text/*
+
+
+# ======================================================
+# ROW SOURCES (server-side cursors)
+# ======================================================
+
+def _schedule_rows(user):
+    from models import ScheduleBlob, WorkoutSchedule
+    from blob_store import decompress, NAME_PLACEHOLDER
+    rows = WorkoutSchedule.query\
+        .outerjoin(ScheduleBlob, ScheduleBlob.hash == WorkoutSchedule.blob_hash)\
+        .filter(WorkoutSchedule.user_id == user.id)\
+        .order_by(WorkoutSchedule.id)\
+        .with_entities(WorkoutSchedule.id, WorkoutSchedule.created_at, WorkoutSchedule.goal,
+                       WorkoutSchedule.level, WorkoutSchedule.equipment, WorkoutSchedule.schedule_data,
+                       WorkoutSchedule.blob_hash, ScheduleBlob.codec, ScheduleBlob.data)\
+        .yield_per(EXPORT_BATCH)
+    last_hash = last_text = None
+    for row in rows:
+        if row.blob_hash and row.blob_hash != last_hash:
+            # Plans are deduplicated, so consecutive rows often share one blob
+            last_hash = row.blob_hash
+            last_text = decompress(row.codec, row.data).decode('utf-8').replace(NAME_PLACEHOLDER, user.name or '')
+        yield {
+            'id': row.id, 'created_at': row.created_at, 'goal': row.goal, 'level': row.level,
+            'equipment': row.equipment, 'plan': last_text if row.blob_hash else row.schedule_data,
+        }
+
+
+def _workout_rows(user):
+    from models import WorkoutLog
+    columns = (WorkoutLog.id, WorkoutLog.date, WorkoutLog.workout_name, WorkoutLog.duration,
+               WorkoutLog.calories_burned, WorkoutLog.avg_heart_rate, WorkoutLog.max_heart_rate,
+               WorkoutLog.total_steps, WorkoutLog.mood, WorkoutLog.exercises)
+    rows = WorkoutLog.query.filter_by(user_id=user.id).order_by(WorkoutLog.id)\
+        .with_entities(*columns).yield_per(EXPORT_BATCH)
+    for row in rows:
+        yield dict(row._mapping)
+
+
+def _meal_rows(user):
+    from models import MealLog
+    columns = (MealLog.id, MealLog.date, MealLog.meal_type, MealLog.food_name,
+               MealLog.calories, MealLog.protein, MealLog.carbs, MealLog.fats)
+    rows = MealLog.query.filter_by(user_id=user.id).order_by(MealLog.id)\
+        .with_entities(*columns).yield_per(EXPORT_BATCH)
+    for row in rows:
+        yield dict(row._mapping)
+
+
+SOURCES = {
+    'schedules': (_schedule_rows, ('id', 'created_at', 'goal', 'level', 'equipment', 'plan')),
+    'workouts': (_workout_rows, ('id', 'date', 'workout_name', 'duration', 'calories_burned', 'avg_heart_rate',
+                                 'max_heart_rate', 'total_steps', 'mood', 'exercises')),
+    'meals': (_meal_rows, ('id', 'date', 'meal_type', 'food_name', 'calories', 'protein', 'carbs', 'fats')),
+}
+
+
+# ======================================================
+# ENCODERS
+# ======================================================
+
+class _Echo:
+    """File-like object whose write() returns the line, so csv.writer yields strings"""
+
+    def write(self, value):
+        return value
+
+
+def _chunked(pieces):
+    """Group small strings into ~CHUNK_BYTES response chunks"""
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_BYTES:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%dT%H:%M:%S')
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def stream_csv(rows, columns):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(['' if row[c] is None else _value(row[c]) for c in columns])
+
+
+def stream_ndjson(rows, columns):
+    for row in rows:
+        yield json.dumps({c: _value(row[c]) for c in columns}, ensure_ascii=False) + '\n'
+
+
+def export_stream(user, kind, fmt):
+    """Chunk generator for one export; raises ValueError for an unknown kind or format"""
+    if kind not in SOURCES or fmt not in FORMATS:
+        raise ValueError(f"Export must be one of {', '.join(SOURCES)} as {' or '.join(FORMATS)}")
+    source, columns = SOURCES[kind]
+    encode = stream_csv if fmt == 'csv' else stream_ndjson
+    return _chunked(encode(source(user), columns))
+
+
+# ======================================================
+# ICALENDAR FEED
+# ======================================================
+
+def _serializer(secret_key):
+    return URLSafeSerializer(secret_key, salt='calendar-feed')
+
+
+def calendar_token(secret_key, user_id):
+    return _serializer(secret_key).dumps(user_id)
+
+
+def calendar_user_id(secret_key, token):
+    """User id from a feed token, or None if the signature does not match"""
+    try:
+        return _serializer(secret_key).loads(token)
+    except BadSignature:
+        return None
+
+
+def _window_start(now=None):
+    return (now or datetime.utcnow()) - timedelta(weeks=CALENDAR_WEEKS)
+
+
+def calendar_etag(user_id, now=None):
+    """Fingerprint of everything the feed renders, from one indexed query"""
+    from models import WorkoutSchedule
+    from reminders import REMINDER_HOUR
+    since = _window_start(now)
+    plans = WorkoutSchedule.query\
+        .filter(WorkoutSchedule.user_id == user_id, WorkoutSchedule.created_at >= since)\
+        .order_by(WorkoutSchedule.id)\
+        .with_entities(WorkoutSchedule.id, WorkoutSchedule.blob_hash, func.length(WorkoutSchedule.schedule_data))\
+        .all()
+    fingerprint = f"{since.date()}|{REMINDER_HOUR}|" + ';'.join(f"{i}:{h}:{n}" for i, h, n in plans)
+    return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+
+def _escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    """RFC 5545 line folding at 75 octets"""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line + '\r\n'
+    parts, start, limit = [], 0, 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        while end < len(data) and (data[end] & 0xC0) == 0x80:  # do not split a UTF-8 sequence
+            end -= 1
+        parts.append(data[start:end].decode('utf-8'))
+        start, limit = end, 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def calendar_stream(user, now=None):
+    """iCalendar lines for the planned days of the user's plans from the last CALENDAR_WEEKS;
+    days a newer plan replaced are left out"""
+    from models import WorkoutSchedule
+    from regenerate import split_days
+    from reminders import plan_day_times
+
+    yield _fold('BEGIN:VCALENDAR')
+    yield _fold('VERSION:2.0')
+    yield _fold('PRODID:-//FitPlan-AI//Workout plan//EN')
+    yield _fold('CALSCALE:GREGORIAN')
+    yield _fold('X-WR-CALNAME:FitPlan-AI workouts')
+
+    plans = WorkoutSchedule.query\
+        .filter(WorkoutSchedule.user_id == user.id, WorkoutSchedule.created_at >= _window_start(now))\
+        .order_by(WorkoutSchedule.created_at).all()
+    for plan, successor in zip(plans, plans[1:] + [None]):
+        _, days, _ = split_days(plan.plan_text or '')
+        stamp = plan.created_at.strftime('%Y%m%dT%H%M%SZ')
+        for day, when in enumerate(plan_day_times(plan.created_at), start=1):
+            if successor is not None and when >= successor.created_at:
+                break
+            block = days.get(day, '')
+            lines = block.split('\n')
+            title = lines[0].strip(' #*') if block else f'Day {day}'
+            yield _fold('BEGIN:VEVENT')
+            yield _fold(f'UID:schedule-{plan.id}-day-{day}@fitplan-ai')
+            yield _fold(f'DTSTAMP:{stamp}')
+            yield _fold(f"DTSTART;VALUE=DATE:{when.strftime('%Y%m%d')}")
+            yield _fold(f"DTEND;VALUE=DATE:{(when + timedelta(days=1)).strftime('%Y%m%d')}")
+            yield _fold(f'SUMMARY:{_escape("Workout - " + title)}')
+            description = '\n'.join(line for line in lines[1:] if line.strip())
+            if description:
+                yield _fold(f'DESCRIPTION:{_escape(description)}')
+            yield _fold('END:VEVENT')
+    yield _fold('END:VCALENDAR')
@@ -0,0 +1,281 @@
+"""
+Food autocomplete over the bundled nutrition table (data/foods.csv)
+
+The table is compiled once into a single binary index file that every worker
+memory-maps, so the OS page cache holds one shared copy:
+
+- a prefix trie over every word-start suffix of each food name, flattened into
+  node / edge arrays, with each node storing its top matches so a keystroke is
+  one walk down the trie and no subtree scan;
+- a trigram index (sorted trigram keys + posting lists) for typo-tolerant
+  matches when the prefix walk finds too few foods.
+
+All sections are read with np.frombuffer directly over the mmap. The file is
+rebuilt (atomically) whenever foods.csv is newer than it.
+
+    python food_index.py build          # force a rebuild
+    python food_index.py search "chikn"
+"""
+
+import csv
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import unicodedata
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+FOODS_FILE = os.path.join(DATA_DIR, 'foods.csv')
+INDEX_FILE = os.getenv('FOOD_INDEX_PATH', os.path.join(DATA_DIR, 'foods.idx'))
+
+MAGIC = b'FPFOOD01'
+SECTIONS = ('foods', 'strings', 'nodes', 'edges', 'tops', 'trigram_keys', 'trigram_offsets', 'postings')
+HEADER = struct.Struct('<8s' + 'QQ' * len(SECTIONS))  # magic, then (offset, count) per section
+
+FOOD_DTYPE = np.dtype([('calories', '<f4'), ('protein', '<f4'), ('carbs', '<f4'), ('fats', '<f4'),
+                       ('name_offset', '<u4'), ('name_length', '<u2'), ('serving_length', '<u2'),
+                       ('trigrams', '<u2'), ('_pad', '<u2')])
+NODE_DTYPE = np.dtype([('edge_start', '<u4'), ('top_start', '<u4'), ('edge_count', '<u2'), ('top_count', '<u2')])
+EDGE_DTYPE = np.dtype([('char', '<u4'), ('child', '<u4')])
+SECTION_DTYPES = {
+    'foods': FOOD_DTYPE, 'strings': np.dtype('u1'), 'nodes': NODE_DTYPE, 'edges': EDGE_DTYPE,
+    'tops': np.dtype('<u2'), 'trigram_keys': np.dtype('<u4'), 'trigram_offsets': np.dtype('<u4'),
+    'postings': np.dtype('<u2'),
+}
+
+TOP_K = 10
+MIN_SIMILARITY = 0.4
+
+
+def normalize(text):
+    """Lower-case ASCII words separated by single spaces"""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+    return ' '.join(re.findall(r'[a-z0-9%]+', text))
+
+
+def trigrams(text):
+    """pg_trgm style trigrams ("  w", " wo", "wor", ... "rd ") packed into ints"""
+    grams = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            a, b, c = padded[i:i + 3]
+            grams.add((ord(a) << 16) | (ord(b) << 8) | ord(c))
+    return grams
+
+
+def load_foods(path=FOODS_FILE):
+    """[(name, serving, calories, protein, carbs, fats)] from the bundled CSV"""
+    with open(path, newline='') as f:
+        rows = csv.reader(line for line in f if not line.startswith('#'))
+        return [(name, serving, float(kcal), float(p), float(c), float(fat))
+                for name, serving, kcal, p, c, fat in rows]
+
+
+# ======================================================
+# BUILD
+# ======================================================
+
+def _build_trie(foods):
+    """Nested-dict trie over word-start suffixes; each node keeps its best TOP_K foods"""
+    root = {'children': {}, 'ranked': []}
+    for food_id, food in enumerate(foods):
+        name = normalize(food[0])
+        starts = [0] + [m.end() for m in re.finditer(' ', name)]
+        for word_position, start in enumerate(starts):
+            node = root
+            # Whole-name prefix matches rank above mid-name ones, shorter names first
+            rank = (min(word_position, 1), len(name), food_id)
+            for char in name[start:]:
+                node = node['children'].setdefault(char, {'children': {}, 'ranked': []})
+                node['ranked'].append(rank)
+
+    nodes, edges, tops = [], [], []
+    queue = [root]
+    while queue:  # breadth-first so a node's children get consecutive ids
+        next_queue = []
+        for node in queue:
+            chosen = []
+            for _, _, food_id in sorted(set(node['ranked'])):
+                if food_id not in chosen:
+                    chosen.append(food_id)
+                if len(chosen) == TOP_K:
+                    break
+            children = sorted(node['children'].items())
+            nodes.append([len(edges), len(tops), len(children), len(chosen)])
+            tops.extend(chosen)
+            for char, child in children:
+                edges.append([ord(char), 0])
+                next_queue.append(child)
+        queue = next_queue
+
+    # Every non-root node is the target of exactly one edge, and both were
+    # emitted in the same breadth-first order: edge k leads to node k + 1
+    for child_id, edge in enumerate(edges, start=1):
+        edge[1] = child_id
+    return nodes, edges, tops
+
+
+def build_index(foods_path=FOODS_FILE, index_path=INDEX_FILE):
+    """Compile foods.csv into the binary index file (atomic replace)"""
+    foods = load_foods(foods_path)
+
+    strings = bytearray()
+    food_rows = []
+    food_trigrams = []
+    for name, serving, kcal, protein, carbs, fats in foods:
+        name_bytes, serving_bytes = name.encode('utf-8'), serving.encode('utf-8')
+        grams = trigrams(name)
+        food_trigrams.append(grams)
+        food_rows.append((kcal, protein, carbs, fats, len(strings), len(name_bytes),
+                          len(serving_bytes), len(grams), 0))
+        strings += name_bytes + serving_bytes
+
+    nodes, edges, tops = _build_trie(foods)
+
+    postings_by_gram = {}
+    for food_id, grams in enumerate(food_trigrams):
+        for gram in grams:
+            postings_by_gram.setdefault(gram, []).append(food_id)
+    keys = sorted(postings_by_gram)
+    offsets, postings = [0], []
+    for key in keys:
+        postings.extend(postings_by_gram[key])
+        offsets.append(len(postings))
+
+    arrays = {
+        'foods': np.array(food_rows, dtype=FOOD_DTYPE),
+        'strings': np.frombuffer(bytes(strings), dtype=np.uint8),
+        'nodes': np.array([tuple(n) for n in nodes], dtype=NODE_DTYPE),
+        'edges': np.array([tuple(e) for e in edges], dtype=EDGE_DTYPE),
+        'tops': np.array(tops, dtype='<u2'),
+        'trigram_keys': np.array(keys, dtype='<u4'),
+        'trigram_offsets': np.array(offsets, dtype='<u4'),
+        'postings': np.array(postings, dtype='<u2'),
+    }
+
+    layout, body, offset = [], [], HEADER.size
+    for section in SECTIONS:
+        offset += -offset % 8
+        body.append(offset)
+        data = arrays[section].tobytes()
+        layout.extend((offset, len(arrays[section])))
+        offset += len(data)
+
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, *layout))
+        for section, start in zip(SECTIONS, body):
+            f.write(b'\0' * (start - f.tell()))
+            f.write(arrays[section].tobytes())
+    os.replace(tmp_path, index_path)
+    print(f"Food index built: {len(foods)} foods, {len(nodes)} trie nodes, {len(keys)} trigrams")
+
+
+# ======================================================
+# QUERY
+# ======================================================
+
+class FoodIndex:
+    """Read-only view over the memory-mapped index file"""
+
+    def __init__(self, path=INDEX_FILE):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        fields = HEADER.unpack_from(self._mmap, 0)
+        if fields[0] != MAGIC:
+            raise ValueError(f'{path} is not a food index')
+        for i, section in enumerate(SECTIONS):
+            offset, count = fields[1 + 2 * i], fields[2 + 2 * i]
+            setattr(self, section, np.frombuffer(self._mmap, dtype=SECTION_DTYPES[section],
+                                                 count=count, offset=offset))
+
+    def __len__(self):
+        return len(self.foods)
+
+    def food(self, food_id):
+        """Food record as a dict (macros per serving)"""
+        row = self.foods[food_id]
+        start = int(row['name_offset'])
+        name_end = start + int(row['name_length'])
+        serving_end = name_end + int(row['serving_length'])
+        return {
+            'id': int(food_id),
+            'name': bytes(self.strings[start:name_end]).decode('utf-8'),
+            'serving': bytes(self.strings[name_end:serving_end]).decode('utf-8'),
+            'calories': round(float(row['calories']), 1),
+            'protein': round(float(row['protein']), 1),
+            'carbs': round(float(row['carbs']), 1),
+            'fats': round(float(row['fats']), 1),
+        }
+
+    def prefix(self, query, limit=TOP_K):
+        """Food ids whose name has a word starting with the query (trie walk)"""
+        node = 0
+        for char in normalize(query):
+            start, count = int(self.nodes[node]['edge_start']), int(self.nodes[node]['edge_count'])
+            chars = self.edges['char'][start:start + count]
+            i = int(np.searchsorted(chars, ord(char)))
+            if i == count or chars[i] != ord(char):
+                return []
+            node = int(self.edges['child'][start + i])
+        start, count = int(self.nodes[node]['top_start']), int(self.nodes[node]['top_count'])
+        return [int(food_id) for food_id in self.tops[start:start + min(count, limit)]]
+
+    def fuzzy(self, query, limit=TOP_K):
+        """Food ids ranked by trigram similarity to the query"""
+        grams = np.array(sorted(trigrams(query)), dtype='<u4')
+        if not len(grams):
+            return []
+        positions = np.searchsorted(self.trigram_keys, grams)
+        found = positions < len(self.trigram_keys)
+        found[found] = self.trigram_keys[positions[found]] == grams[found]
+        positions = positions[found]
+        if not len(positions):
+            return []
+        hits = np.concatenate([self.postings[self.trigram_offsets[p]:self.trigram_offsets[p + 1]]
+                               for p in positions])
+        # Share of the query's trigrams found in the name (pg_trgm word_similarity
+        # style, so short queries still match long names); shorter names break ties
+        shared = np.bincount(hits, minlength=len(self.foods))
+        similarity = shared / len(grams)
+        candidates = np.nonzero(similarity >= MIN_SIMILARITY)[0]
+        order = candidates[np.lexsort((self.foods['trigrams'][candidates], -similarity[candidates]))]
+        return [int(food_id) for food_id in order[:limit]]
+
+    def search(self, query, limit=8):
+        """Prefix matches first, topped up with fuzzy matches"""
+        ids = self.prefix(query, limit)
+        if len(ids) < limit:
+            ids += [food_id for food_id in self.fuzzy(query, limit) if food_id not in ids]
+        return [self.food(food_id) for food_id in ids[:limit]]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_food_index():
+    """Process-wide index, (re)built first if foods.csv is newer than the index file"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                if not os.path.exists(INDEX_FILE) or os.path.getmtime(INDEX_FILE) < os.path.getmtime(FOODS_FILE):
+                    build_index()
+                _index = FoodIndex()
+    return _index
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'build':
+        build_index()
+    elif len(sys.argv) > 2 and sys.argv[1] == 'search':
+        for item in get_food_index().search(' '.join(sys.argv[2:])):
+            print(f"{item['name']:<40} {item['serving']:<16} {item['calories']:>6} kcal "
+                  f"P{item['protein']} C{item['carbs']} F{item['fats']}")
+    else:
+        print('usage: python food_index.py build | search <text>')
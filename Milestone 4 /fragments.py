@@ -0,0 +1,244 @@
+"""
+Rendered-fragment cache for the dashboard widgets
+
+The stats and recent-activity widgets (get_user_stats_for_analytics,
+get_recent_activity) cost several aggregate queries and a Jinja render per
+view. Their HTML is cached under (user, widget, data version, deploy id),
+the deploy id being http_cache.BUILD_ID - a content hash that every worker
+computes alike, so the shared backend's keys match across processes:
+
+- the data version is one row per user in cache_versions, bumped in the
+  same flush as any insert, update or delete of that user's workout or
+  meal logs, so a cached fragment can never outlive the data it shows;
+- reading the version is one primary-key lookup, and it is read before the
+  widget data, so a concurrent write can only make a cached copy fresher;
+- FRAGMENT_CACHE=memory keeps fragments in a per-process LRU;
+  FRAGMENT_CACHE=sqlite adds a shared SQLite file (WAL) behind it so all
+  gunicorn workers on the host reuse each other's renders; off disables it.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from flask import render_template_string
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, object_session
+from metrics import record_cache
+
+FRAGMENT_CACHE = os.getenv('FRAGMENT_CACHE', 'memory').lower()  # memory / sqlite / off
+FRAGMENT_CACHE_PATH = os.getenv('FRAGMENT_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'fitplan-fragments.sqlite'))
+FRAGMENT_CACHE_SIZE = int(os.getenv('FRAGMENT_CACHE_SIZE', 2000))
+FRAGMENT_TTL = int(os.getenv('FRAGMENT_TTL', 3600))
+
+STATS_TEMPLATE = """<div class="stats-grid">
+  <div class="stat-card"><span class="stat-value">{{ stats.workouts }}</span><span class="stat-label">Workouts</span></div>
+  <div class="stat-card"><span class="stat-value">{{ stats.minutes }}</span><span class="stat-label">Minutes</span></div>
+  <div class="stat-card"><span class="stat-value">{{ stats.calories_burned }}</span><span class="stat-label">Calories burned</span></div>
+  <div class="stat-card"><span class="stat-value">{{ stats.meals }}</span><span class="stat-label">Meals logged</span></div>
+</div>"""
+
+ACTIVITY_TEMPLATE = """<ul class="activity-list">
+{% for item in activity %}  <li class="activity-item activity-{{ item.type }}">
+    <span class="activity-title">{{ item.title }}</span>
+    <span class="activity-details">{{ item.details }}</span>
+    <span class="activity-date">{{ item.date }}</span>
+  </li>
+{% else %}  <li class="activity-empty">No activity yet - log your first workout!</li>
+{% endfor %}</ul>"""
+
+
+# ======================================================
+# BACKENDS
+# ======================================================
+
+class LRUBackend:
+    """Per-process bounded map of key -> (html, expires at)"""
+
+    def __init__(self, max_size=FRAGMENT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, html, ttl):
+        with self._lock:
+            self._entries[key] = (html, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class SQLiteBackend:
+    """Fragments in a SQLite file shared by every worker on the host"""
+
+    PRUNE_EVERY = 500
+
+    def __init__(self, path=FRAGMENT_CACHE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._connection()
+        conn.execute('CREATE TABLE IF NOT EXISTS fragments (key TEXT PRIMARY KEY, html TEXT NOT NULL, expires REAL NOT NULL)')
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT html FROM fragments WHERE key = ? AND expires > ?', (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, html, ttl):
+        conn = self._connection()
+        now = time.time()
+        conn.execute('INSERT OR REPLACE INTO fragments (key, html, expires) VALUES (?, ?, ?)', (key, html, now + ttl))
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            conn.execute('DELETE FROM fragments WHERE expires <= ?', (now,))
+        conn.commit()
+
+
+class FragmentCache:
+    """Two-tier (local LRU, optional shared backend) cache of rendered widget HTML"""
+
+    def __init__(self, mode=FRAGMENT_CACHE, ttl=FRAGMENT_TTL):
+        self.mode = mode
+        self.ttl = ttl
+        self.local = LRUBackend() if mode in ('memory', 'sqlite') else None
+        self._shared = None
+        self._listening = False
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        if self.mode == 'sqlite' and self._shared is None:
+            with self._lock:
+                if self._shared is None:
+                    self._shared = SQLiteBackend()
+        return self._shared
+
+    def fetch(self, key, render):
+        """Cached HTML for key, rendering (and storing) it on a miss"""
+        if self.local is None:
+            return render()
+        html = self.local.get(key)
+        if html is None and self.shared is not None:
+            try:
+                html = self.shared.get(key)
+            except sqlite3.Error as e:
+                print(f"Fragment cache read failed: {str(e)}")
+            if html is not None:
+                self.local.set(key, html, self.ttl)
+        record_cache('fragment', html is not None)
+        if html is not None:
+            return html
+
+        html = render()
+        self.local.set(key, html, self.ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, html, self.ttl)
+            except sqlite3.Error as e:
+                print(f"Fragment cache write failed: {str(e)}")
+        return html
+
+    # ---------- data versions ----------
+
+    def listen(self):
+        """Bump cache_versions whenever workout or meal logs are written"""
+        if self._listening:
+            return
+        from models import MealLog, WorkoutLog
+        with self._lock:
+            if self._listening:
+                return
+            for model in (WorkoutLog, MealLog):
+                for name in ('after_insert', 'after_update', 'after_delete'):
+                    event.listen(model, name, self._on_write)
+            event.listen(Session, 'after_flush', self._on_flush)
+            self._listening = True
+
+    def _on_write(self, mapper, connection, target):
+        session = object_session(target)
+        if session is not None and target.user_id is not None:
+            session.info.setdefault('fragment_dirty', set()).add(target.user_id)
+
+    def _on_flush(self, session, flush_context):
+        user_ids = session.info.pop('fragment_dirty', None)
+        if user_ids:
+            bump_versions(session.connection(), user_ids)
+
+
+def bump_versions(connection, user_ids):
+    """Increment (or create) the users' data versions on the given connection"""
+    from models import CacheVersion
+    table = CacheVersion.__table__
+    rows = [{'user_id': user_id, 'version': 1} for user_id in sorted(user_ids)]
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        connection.execute(insert(table).on_conflict_do_update(
+            index_elements=[table.c.user_id], set_={'version': table.c.version + 1}), rows)
+        return
+    for row in rows:
+        updated = connection.execute(table.update()
+                                     .where(table.c.user_id == row['user_id'])
+                                     .values(version=table.c.version + 1))
+        if not updated.rowcount:
+            connection.execute(table.insert(), row)
+
+
+def data_version(user_id):
+    from models import CacheVersion
+    return CacheVersion.query.with_entities(CacheVersion.version).filter_by(user_id=user_id).scalar() or 0
+
+
+fragment_cache = FragmentCache()
+
+
+# ======================================================
+# DASHBOARD WIDGETS
+# ======================================================
+
+def dashboard_fragments(user_id):
+    """{'stats_html', 'activity_html'} for dashboard.html, rendered at most once per data version"""
+    from http_cache import BUILD_ID
+    from models import get_recent_activity, get_user_stats_for_analytics
+    version = data_version(user_id) if fragment_cache.local is not None else 0
+    widgets = {
+        'stats_html': lambda: render_template_string(STATS_TEMPLATE, stats=get_user_stats_for_analytics(user_id)),
+        'activity_html': lambda: render_template_string(ACTIVITY_TEMPLATE, activity=get_recent_activity(user_id)),
+    }
+    return {name: Markup(fragment_cache.fetch(f"{user_id}:{name}:{version}:{BUILD_ID}", render))
+            for name, render in widgets.items()}
+
+
+def init_fragments(app):
+    """Start tracking log writes before the first request of each worker (versions are
+    kept even with FRAGMENT_CACHE=off, since page ETags include them)"""
+
+    @app.before_request
+    def _listen_for_log_writes():
+        fragment_cache.listen()
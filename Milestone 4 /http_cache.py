@@ -0,0 +1,188 @@
+"""
+Response-level HTTP caching and compression
+
+- Conditional pages: views wrapped with @conditional get a weak ETag built
+  from the user's last-modified state (profile snapshot, latest schedule id
+  and content hash, latest workout log id, workout/meal log data version
+  from fragments.py) plus the deploy id. A matching
+  If-None-Match is answered 304 before the view renders anything.
+- Compression: text, HTML and JSON bodies of at least GZIP_MIN_BYTES are
+  gzip- (or deflate-) encoded when the client accepts it; streamed responses
+  (exports) are compressed chunk by chunk.
+- Static assets: url_for('static', ...) appends a content hash (?v=...), and
+  fingerprinted requests are served with a one-year immutable Cache-Control.
+"""
+
+import gzip
+import hashlib
+import os
+import zlib
+from functools import lru_cache, wraps
+from flask import current_app, make_response, request, session
+from sqlalchemy import func, select
+from metrics import Counter
+
+GZIP_MIN_BYTES = int(os.getenv('GZIP_MIN_BYTES', 1024))
+GZIP_LEVEL = 6
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+COMPRESSIBLE = {
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/calendar', 'text/javascript',
+    'application/json', 'application/javascript', 'application/x-ndjson', 'image/svg+xml',
+}
+
+RESPONSE_BYTES = Counter(
+    'fitplan_response_bytes_total', 'Compressed response bytes before and after encoding', ('stage',))
+CONDITIONAL_RESPONSES = Counter(
+    'fitplan_conditional_responses_total', 'Conditional page requests by outcome', ('outcome',))
+
+
+# ======================================================
+# CONDITIONAL PAGES (weak ETags from the user's state)
+# ======================================================
+
+def user_state(user_id):
+    """(latest schedule id, its blob hash, latest log id, log data version) in one indexed query"""
+    from models import CacheVersion, WorkoutLog, WorkoutSchedule
+    latest = select(WorkoutSchedule.id, WorkoutSchedule.blob_hash)\
+        .where(WorkoutSchedule.user_id == user_id)\
+        .order_by(WorkoutSchedule.id.desc()).limit(1).subquery()
+    query = select(
+        select(latest.c.id).scalar_subquery(),
+        select(latest.c.blob_hash).scalar_subquery(),
+        select(func.max(WorkoutLog.id)).where(WorkoutLog.user_id == user_id).scalar_subquery(),
+        select(CacheVersion.version).where(CacheVersion.user_id == user_id).scalar_subquery(),
+    )
+    return tuple(current_app.extensions['sqlalchemy'].session.execute(query).one())
+
+
+def page_etag(user_id):
+    from user_cache import user_cache
+    user = user_cache.get(user_id)
+    profile = tuple(getattr(user, field) for field in user.__slots__) if user else None
+    fingerprint = repr((BUILD_ID, request.path, request.query_string, profile, user_state(user_id)))
+    return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:20]
+
+
+def conditional(view):
+    """Answer 304 for logged-in users whose state has not changed since their cached copy"""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if 'user_id' not in session:
+            return view(*args, **kwargs)
+        etag = page_etag(session['user_id'])
+        if request.if_none_match.contains_weak(etag):
+            CONDITIONAL_RESPONSES.inc('not_modified')
+            response = current_app.response_class(status=304)
+        else:
+            CONDITIONAL_RESPONSES.inc('rendered')
+            response = make_response(view(*args, **kwargs))
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+        return response
+
+    return wrapper
+
+
+# ======================================================
+# COMPRESSION AND STATIC ASSETS
+# ======================================================
+
+def _encoding():
+    accepted = request.accept_encodings
+    if accepted['gzip']:
+        return 'gzip'
+    if accepted['deflate']:
+        return 'deflate'
+    return None
+
+
+def _compress_stream(chunks, encoding):
+    # wbits 31 writes a gzip container, 15 a zlib (HTTP "deflate") one
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31 if encoding == 'gzip' else 15)
+    raw = sent = 0
+    try:
+        for chunk in chunks:
+            data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+            raw += len(data)
+            body = compressor.compress(data)
+            if body:
+                sent += len(body)
+                yield body
+        tail = compressor.flush()
+        sent += len(tail)
+        yield tail
+    finally:
+        RESPONSE_BYTES.inc('raw', amount=raw)
+        RESPONSE_BYTES.inc('sent', amount=sent)
+
+
+@lru_cache(maxsize=512)
+def _static_hash(path, mtime):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+
+def source_fingerprint(root=os.path.dirname(os.path.abspath(__file__))):
+    """Content hash of the modules, templates and static assets that render pages:
+    identical in every worker and across restarts until a deploy changes a file"""
+    paths = [os.path.join(root, name) for name in os.listdir(root) if name.endswith('.py')]
+    for folder in ('templates', 'static'):
+        for dirpath, _, filenames in os.walk(os.path.join(root, folder)):
+            paths.extend(os.path.join(dirpath, name) for name in filenames)
+    digest = hashlib.sha1()
+    for path in sorted(paths):
+        digest.update(f"{os.path.relpath(path, root)}:{_static_hash(path, os.path.getmtime(path))}\n".encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+# Deploy id in page ETags and fragment keys (see fragments.py)
+BUILD_ID = os.getenv('BUILD_ID') or os.getenv('RENDER_GIT_COMMIT') or source_fingerprint()
+
+
+def init_http_cache(app):
+    """Register response compression and static asset fingerprinting"""
+
+    @app.url_defaults
+    def _fingerprint_static(endpoint, values):
+        if endpoint != 'static' or 'v' in values or not app.static_folder:
+            return
+        path = os.path.join(app.static_folder, values.get('filename', ''))
+        if os.path.isfile(path):
+            values['v'] = _static_hash(path, os.path.getmtime(path))
+
+    @app.after_request
+    def _cache_and_compress(response):
+        if request.endpoint == 'static' and request.args.get('v'):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+        if (response.status_code != 200 or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE or response.direct_passthrough):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = _encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < GZIP_MIN_BYTES:
+                return response
+            body = gzip.compress(data, GZIP_LEVEL, mtime=0) if encoding == 'gzip' else zlib.compress(data, GZIP_LEVEL)
+            response.set_data(body)
+            RESPONSE_BYTES.inc('raw', amount=len(data))
+            RESPONSE_BYTES.inc('sent', amount=len(body))
+        response.headers['Content-Encoding'] = encoding
+
+        # The encoded body is a different representation: a strong validator must not match both
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,293 @@
+"""
+Weekly leaderboards (training minutes, calories burned) and streak rankings
+
+Logs are rolled up as they are saved (exercise_sets.record_logs, behind
+POST /log-workout): each log adds its duration and calories to the owner's
+leaderboard_totals row for its week, so reads never aggregate workout_logs:
+
+- the top K of a week comes from a per-process min-heap, seeded with one
+  indexed ORDER BY value DESC LIMIT K query and updated in place as this
+  worker records logs (re-seeded every LEADERBOARD_REFRESH_SECONDS to pick
+  up other workers' writes);
+- a user's rank is one indexed count of higher totals.
+
+A finished week is closed once, by whichever process gets there first: the
+week's streak (consecutive weeks trained) is written for everyone who
+trained, as their previous streak + 1. Closing runs lazily on the first
+leaderboard read of a new week, or from a cron job. Logs backdated into a
+closed week still count towards its totals, but its streaks are only
+recomputed by a rebuild:
+
+    python leaderboard.py close      # close every finished week
+    python leaderboard.py rebuild    # recompute totals from workout_logs
+"""
+
+import heapq
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import exists
+from sqlalchemy.exc import IntegrityError
+from metrics import record_cache
+
+LEADERBOARD_SIZE = int(os.getenv('LEADERBOARD_SIZE', 10))
+LEADERBOARD_REFRESH_SECONDS = float(os.getenv('LEADERBOARD_REFRESH_SECONDS', 30))
+
+METRICS = {'minutes': 'duration', 'calories': 'calories_burned'}  # metric -> WorkoutLog column
+STREAK = 'streak'
+
+
+def period_start(day=None):
+    """Monday of the week containing day (UTC today by default)"""
+    day = day or datetime.utcnow().date()
+    return day - timedelta(days=day.weekday())
+
+
+class TopK:
+    """The K highest (value, user) totals; ties rank the lower user id first
+
+    Totals only grow, so a user outside the top K can only get back in by
+    beating the current minimum, which is always at the top of the heap.
+    Raised totals push a new heap entry; outdated entries are skipped when
+    they surface.
+    """
+
+    def __init__(self, k, rows=()):
+        self.k = k
+        self.members = {}  # user_id -> value
+        self._heap = []  # (value, -user_id), min first
+        self.loaded_at = time.monotonic()
+        for user_id, value in rows:
+            self.offer(user_id, value)
+
+    def _push(self, user_id, value):
+        self.members[user_id] = value
+        heapq.heappush(self._heap, (value, -user_id))
+        if len(self._heap) > 4 * self.k:
+            self._heap = [(v, -u) for u, v in self.members.items()]
+            heapq.heapify(self._heap)
+
+    def _minimum(self):
+        while self.members.get(-self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0]
+
+    def offer(self, user_id, value):
+        if user_id in self.members:
+            if value > self.members[user_id]:
+                self._push(user_id, value)
+        elif len(self.members) < self.k:
+            self._push(user_id, value)
+        elif (value, -user_id) > self._minimum():
+            del self.members[-heapq.heappop(self._heap)[1]]
+            self._push(user_id, value)
+
+    def ranked(self):
+        """[(rank, user_id, value)], best first; equal totals share a rank"""
+        ordered = sorted(self.members.items(), key=lambda item: (-item[1], item[0]))
+        ranked, rank = [], 0
+        for position, (user_id, value) in enumerate(ordered, start=1):
+            if not ranked or value != ranked[-1][2]:
+                rank = position
+            ranked.append((rank, user_id, value))
+        return ranked
+
+
+class Leaderboards:
+    """Per-process top-K boards keyed by (week, metric), backed by leaderboard_totals"""
+
+    def __init__(self, size=LEADERBOARD_SIZE, refresh_seconds=LEADERBOARD_REFRESH_SECONDS):
+        self.size = size
+        self.refresh_seconds = refresh_seconds
+        self._boards = {}
+        self._lock = threading.Lock()
+        self._closed_through = None  # latest week this process has seen closed
+
+    # ---------- writes ----------
+
+    def add_logs(self, db, logs):
+        """Add flushed WorkoutLogs to their weeks' running totals; the caller commits,
+        then passes the returned updates to publish()"""
+        from models import LeaderboardTotal
+        amounts = {}
+        for log in logs:
+            for metric, column in METRICS.items():
+                amount = int(getattr(log, column) or 0)
+                if amount > 0:
+                    key = (period_start(log.date), metric, log.user_id)
+                    amounts[key] = amounts.get(key, 0) + amount
+
+        updates = []
+        for (period, metric, user_id), amount in amounts.items():
+            query = LeaderboardTotal.query.filter_by(period_start=period, metric=metric, user_id=user_id)
+            if not query.update({LeaderboardTotal.value: LeaderboardTotal.value + amount},
+                                synchronize_session=False):
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(LeaderboardTotal(period_start=period, metric=metric,
+                                                        user_id=user_id, value=amount))
+                except IntegrityError:
+                    # Another worker created the row first
+                    query.update({LeaderboardTotal.value: LeaderboardTotal.value + amount},
+                                 synchronize_session=False)
+            total = query.with_entities(LeaderboardTotal.value).scalar()
+            updates.append((period, metric, user_id, total))
+        return updates
+
+    def publish(self, updates):
+        """Apply committed totals to the cached boards"""
+        with self._lock:
+            for period, metric, user_id, total in updates:
+                board = self._boards.get((period, metric))
+                if board is not None:
+                    board.offer(user_id, total)
+
+    # ---------- reads ----------
+
+    def _board(self, period, metric):
+        from models import LeaderboardTotal
+        key = (period, metric)
+        with self._lock:
+            board = self._boards.get(key)
+            if board is not None and time.monotonic() - board.loaded_at < self.refresh_seconds:
+                record_cache('leaderboard', True)
+                return board
+        record_cache('leaderboard', False)
+
+        rows = LeaderboardTotal.query\
+            .filter_by(period_start=period, metric=metric)\
+            .order_by(LeaderboardTotal.value.desc(), LeaderboardTotal.user_id)\
+            .with_entities(LeaderboardTotal.user_id, LeaderboardTotal.value)\
+            .limit(self.size).all()
+        board = TopK(self.size, rows)
+        with self._lock:
+            oldest = period_start() - timedelta(weeks=2)
+            for stale in [k for k in self._boards if k[0] < oldest]:
+                del self._boards[stale]
+            self._boards[key] = board
+        return board
+
+    def standings(self, db, metric, user_id, previous=False):
+        """Top K of the current (or previous) week plus the user's own rank and total
+
+        Streaks only exist for closed weeks, so they always read the previous week.
+        """
+        from models import LeaderboardTotal, User
+        if metric not in METRICS and metric != STREAK:
+            raise ValueError(f"metric must be one of {', '.join(list(METRICS) + [STREAK])}")
+        self.close_due(db)
+        period = period_start()
+        if previous or metric == STREAK:
+            period -= timedelta(weeks=1)
+
+        ranked = self._board(period, metric).ranked()
+        names = dict(User.query.filter(User.id.in_([u for _, u, _ in ranked]))
+                     .with_entities(User.id, User.name).all()) if ranked else {}
+
+        value = LeaderboardTotal.query\
+            .filter_by(period_start=period, metric=metric, user_id=user_id)\
+            .with_entities(LeaderboardTotal.value).scalar() or 0
+        rank = None
+        if value:
+            rank = 1 + LeaderboardTotal.query\
+                .filter(LeaderboardTotal.period_start == period, LeaderboardTotal.metric == metric,
+                        LeaderboardTotal.value > value)\
+                .count()
+
+        return {
+            'metric': metric,
+            'period_start': period.isoformat(),
+            'top': [{'rank': r, 'name': (names.get(u) or 'Athlete').split()[0], 'value': v, 'you': u == user_id}
+                    for r, u, v in ranked],
+            'you': {'rank': rank, 'value': value},
+        }
+
+    # ---------- closing weeks ----------
+
+    def close_due(self, db):
+        """Close every finished week not closed yet (checked once per week per process)"""
+        current = period_start()
+        if self._closed_through == current:
+            return 0
+        from models import LeaderboardPeriod, LeaderboardTotal
+        due = LeaderboardTotal.query\
+            .filter(LeaderboardTotal.period_start < current,
+                    ~exists().where(LeaderboardPeriod.period_start == LeaderboardTotal.period_start))\
+            .with_entities(LeaderboardTotal.period_start).distinct()\
+            .order_by(LeaderboardTotal.period_start).all()
+        closed = sum(1 for (period,) in due if self.close_period(db, period))
+        self._closed_through = current
+        return closed
+
+    def close_period(self, db, period):
+        """Write streaks for a finished week; False if another process already closed it"""
+        from models import LeaderboardPeriod, LeaderboardTotal
+        try:
+            with db.session.begin_nested():
+                db.session.add(LeaderboardPeriod(period_start=period))
+        except IntegrityError:
+            return False
+
+        previous = dict(LeaderboardTotal.query
+                        .filter_by(period_start=period - timedelta(weeks=1), metric=STREAK)
+                        .with_entities(LeaderboardTotal.user_id, LeaderboardTotal.value).all())
+        active = [user_id for (user_id,) in LeaderboardTotal.query
+                  .filter(LeaderboardTotal.period_start == period, LeaderboardTotal.metric.in_(list(METRICS)),
+                          LeaderboardTotal.value > 0)
+                  .with_entities(LeaderboardTotal.user_id).distinct().all()]
+        if active:
+            db.session.execute(LeaderboardTotal.__table__.insert(), [
+                {'period_start': period, 'metric': STREAK, 'user_id': user_id,
+                 'value': previous.get(user_id, 0) + 1}
+                for user_id in active
+            ])
+        LeaderboardPeriod.query.filter_by(period_start=period).update({'participants': len(active)})
+        db.session.commit()
+        print(f"Leaderboard week {period} closed: {len(active)} participants")
+        return True
+
+    def rebuild(self, db, batch_size=2000):
+        """Recompute every weekly total (and streak) from workout_logs"""
+        from models import LeaderboardPeriod, LeaderboardTotal, WorkoutLog
+        amounts = {}
+        rows = WorkoutLog.query\
+            .with_entities(WorkoutLog.user_id, WorkoutLog.date, WorkoutLog.duration, WorkoutLog.calories_burned)\
+            .yield_per(batch_size)
+        for user_id, day, duration, calories in rows:
+            for metric, amount in (('minutes', duration), ('calories', calories)):
+                if amount and amount > 0 and day:
+                    key = (period_start(day), metric, user_id)
+                    amounts[key] = amounts.get(key, 0) + int(amount)
+
+        LeaderboardTotal.query.delete(synchronize_session=False)
+        LeaderboardPeriod.query.delete(synchronize_session=False)
+        if amounts:
+            db.session.execute(LeaderboardTotal.__table__.insert(), [
+                {'period_start': period, 'metric': metric, 'user_id': user_id, 'value': value}
+                for (period, metric, user_id), value in amounts.items()
+            ])
+        db.session.commit()
+        with self._lock:
+            self._boards.clear()
+        self._closed_through = None
+        print(f"Leaderboard rebuilt: {len(amounts)} weekly totals")
+        return self.close_due(db)
+
+
+leaderboards = Leaderboards()
+
+
+if __name__ == '__main__':
+    import sys
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command in ('close', 'rebuild'):
+        from app import app, db
+        with app.app_context():
+            db.create_all()
+            if command == 'rebuild':
+                leaderboards.rebuild(db)
+            else:
+                print(f"Closed {leaderboards.close_due(db)} week(s)")
+    else:
+        print('usage: python leaderboard.py close | rebuild')
@@ -0,0 +1,214 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition
+"""
+
+import threading
+import time
+from flask import g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Default latency buckets in seconds (request timing and LLM calls)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """Monotonic counter keyed by a fixed tuple of label values"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in items:
+            yield self.name, labelvalues, value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for name, labelvalues, value in self.samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a fixed tuple of label values"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labelvalues -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = [0] * (len(self.buckets) + 2)
+                self._series[labelvalues] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        names = self.labelnames + ('le',)
+        for labelvalues, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(names, labelvalues + (_format_value(float(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(names, labelvalues + ("+Inf",))
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            plain = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{plain} {_format_value(float(series[-2]))}")
+            lines.append(f"{self.name}_count{plain} {series[-1]}")
+        return lines
+
+
+# ======================================================
+# APPLICATION METRICS
+# ======================================================
+
+REQUEST_LATENCY = Histogram(
+    'fitplan_http_request_duration_seconds', 'HTTP request latency by route',
+    ('method', 'route', 'status'))
+
+LLM_LATENCY = Histogram(
+    'fitplan_llm_request_duration_seconds', 'LLM completion latency per model',
+    ('model', 'outcome'))
+
+TEMPLATE_FALLBACKS = Counter(
+    'fitplan_template_fallbacks_total', 'Plans served from the fallback template')
+
+LOCAL_PLANS = Counter(
+    'fitplan_local_plans_total', 'Plans served by the local engine before any LLM call')
+
+OTP_EVENTS = Counter(
+    'fitplan_otp_events_total', 'OTP send/verify outcomes', ('action', 'outcome'))
+
+DB_QUERIES = Histogram(
+    'fitplan_db_queries_per_request', 'Database queries issued per request', ('route',),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50))
+
+DB_TIME = Histogram(
+    'fitplan_db_time_per_request_seconds', 'Time spent in the database per request', ('route',))
+
+CACHE_LOOKUPS = Counter(
+    'fitplan_cache_lookups_total', 'Cache lookups by cache and result', ('cache', 'result'))
+
+
+def record_cache(cache, hit):
+    """Record a cache hit or miss for hit-ratio reporting"""
+    CACHE_LOOKUPS.inc(cache, 'hit' if hit else 'miss')
+
+
+def _render_cache_ratios():
+    totals = {}
+    for _, (cache, result), value in CACHE_LOOKUPS.samples():
+        hits, lookups = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (value if result == 'hit' else 0), lookups + value)
+    lines = ["# HELP fitplan_cache_hit_ratio Cache hit ratio since process start",
+             "# TYPE fitplan_cache_hit_ratio gauge"]
+    for cache, (hits, lookups) in sorted(totals.items()):
+        ratio = hits / lookups if lookups else 0.0
+        lines.append(f'fitplan_cache_hit_ratio{_format_labels(("cache",), (cache,))} {ratio:.4f}')
+    return lines
+
+
+def render_metrics():
+    """Render every registered metric in Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    lines.extend(_render_cache_ratios())
+    return "\n".join(lines) + "\n"
+
+
+# ======================================================
+# FLASK AND SQLALCHEMY HOOKS
+# ======================================================
+
+def _route_label():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Per-statement, so a query that raises leaves nothing behind on the pooled connection
+    if context is not None:
+        context._fitplan_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_fitplan_start', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    if has_app_context() and 'metrics_start' in g:
+        g.db_queries += 1
+        g.db_time += elapsed
+
+
+def init_metrics(app):
+    """Register request timing hooks on the Flask app"""
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+        g.db_queries = 0
+        g.db_time = 0.0
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = _route_label()
+            REQUEST_LATENCY.observe(time.perf_counter() - start,
+                                    request.method, route, str(response.status_code))
+            DB_QUERIES.observe(g.db_queries, route)
+            DB_TIME.observe(g.db_time, route)
+        return response
@@ -0,0 +1,96 @@
+"""
+One-off migration: move inline workout_schedules.schedule_data into schedule_blobs
+
+    python migrate_schedule_blobs.py --batch-size 1000
+
+Adds the schedule_blobs table and workout_schedules.blob_hash column if they
+are missing, then walks legacy rows in primary-key batches. Each batch is
+deduplicated in memory, new blobs are bulk-inserted, reference counts are
+bumped once per distinct hash, and rows are bulk-updated to point at their
+blob with schedule_data cleared. Safe to re-run; migrated rows are skipped.
+"""
+
+import argparse
+from collections import Counter
+from sqlalchemy import inspect, text, update
+
+
+def ensure_schema(db):
+    """Create schedule_blobs and add workout_schedules.blob_hash on existing databases"""
+    db.create_all()
+    columns = {c['name'] for c in inspect(db.engine).get_columns('workout_schedules')}
+    if 'blob_hash' not in columns:
+        with db.engine.begin() as conn:
+            conn.execute(text('ALTER TABLE workout_schedules ADD COLUMN blob_hash VARCHAR(64) '
+                              'REFERENCES schedule_blobs(hash)'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_workout_schedules_blob_hash '
+                              'ON workout_schedules (blob_hash)'))
+        print("Added workout_schedules.blob_hash")
+
+
+def migrate(db, batch_size):
+    from models import ScheduleBlob, User, WorkoutSchedule
+    from blob_store import compress, content_hash, normalize
+
+    last_id = 0
+    rows_done = 0
+    raw_bytes = 0
+    while True:
+        batch = db.session.query(WorkoutSchedule.id, WorkoutSchedule.schedule_data, User.name)\
+            .join(User, WorkoutSchedule.user_id == User.id)\
+            .filter(WorkoutSchedule.id > last_id,
+                    WorkoutSchedule.blob_hash.is_(None),
+                    WorkoutSchedule.schedule_data.isnot(None))\
+            .order_by(WorkoutSchedule.id)\
+            .limit(batch_size).all()
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        bodies = {}
+        refs = Counter()
+        assignments = []
+        for schedule_id, schedule_data, name in batch:
+            normalized = normalize(schedule_data, name)
+            digest = content_hash(normalized)
+            bodies.setdefault(digest, normalized)
+            refs[digest] += 1
+            assignments.append({'id': schedule_id, 'blob_hash': digest, 'schedule_data': None})
+            raw_bytes += len(schedule_data.encode('utf-8'))
+
+        existing = {h for (h,) in db.session.query(ScheduleBlob.hash)
+                    .filter(ScheduleBlob.hash.in_(list(bodies)))}
+        new_blobs = []
+        for digest, normalized in bodies.items():
+            if digest in existing:
+                continue
+            raw = normalized.encode('utf-8')
+            codec, data = compress(raw)
+            new_blobs.append({'hash': digest, 'codec': codec, 'data': data,
+                              'size': len(raw), 'ref_count': refs[digest]})
+        if new_blobs:
+            db.session.execute(ScheduleBlob.__table__.insert(), new_blobs)
+        for digest in existing:
+            ScheduleBlob.query.filter_by(hash=digest)\
+                .update({ScheduleBlob.ref_count: ScheduleBlob.ref_count + refs[digest]},
+                        synchronize_session=False)
+        db.session.execute(update(WorkoutSchedule), assignments)
+        db.session.commit()
+
+        rows_done += len(batch)
+        print(f"  migrated {rows_done} rows ({len(new_blobs)} new blobs in this batch)")
+
+    blobs, stored = db.session.query(db.func.count(ScheduleBlob.hash),
+                                     db.func.coalesce(db.func.sum(db.func.length(ScheduleBlob.data)), 0)).one()
+    print(f"Done: {rows_done} rows, {raw_bytes} inline bytes -> {blobs} blobs totalling {stored} bytes")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Deduplicate workout schedule text into schedule_blobs')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    from app import app, db
+    with app.app_context():
+        ensure_schema(db)
+        migrate(db, args.batch_size)
@@ -2,90 +2,285 @@
 AI model integration with fallback mechanisms
 """
 
+import asyncio
 import requests
 import os
 import time
+import json
+from metrics import LLM_LATENCY, TEMPLATE_FALLBACKS, LOCAL_PLANS
+from workout_engine import build_local_plan, is_local_profile
+from plan_validator import PlanValidator
+from plan_json import JSONPlanReader
+from traffic import RECORDING, record_llm
+from usage import estimate_usage, parse_usage, usage_ledger
 
-def generate_workout_with_ai(prompt, user, goal, level, equipment):
-    """Generate workout with multiple model fallbacks"""
+GROQ_API_URL = os.getenv('GROQ_API_URL', "https://api.groq.com/openai/v1/chat/completions")
+
+# Minimum validator score for an AI plan to be accepted
+MIN_PLAN_SCORE = int(os.getenv('MIN_PLAN_SCORE', 70))
+
+# Serve fully-covered profiles from the local engine before calling any LLM
+LOCAL_PLAN_FIRST = os.getenv('LOCAL_PLAN_FIRST', 'false').lower() == 'true'
+
+# 'json' asks the model for a compact JSON plan (plan_json.py) instead of text
+PLAN_FORMAT = os.getenv('PLAN_FORMAT', 'text').lower()
+
+MODELS = ["llama-3.3-70b-versatile", "llama-3.1-8b-instant", "gemma2-9b-it"]
+SYSTEM_PROMPT = "You are a professional fitness trainer."
+
+def _headers(groq_key):
+    return {
+        "Authorization": f"Bearer {groq_key}",
+        "Content-Type": "application/json"
+    }
+
+def _completion_body(model, prompt, max_tokens, stream=False):
+    body = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.7,
+        "max_tokens": max_tokens
+    }
+    if stream:
+        body["stream"] = True
+    return body
+
+def request_completion(model, prompt, groq_key, max_tokens=1500, timeout=15):
+    """Single non-streaming chat completion; returns the message text"""
+    started = time.perf_counter()
+    response = requests.post(
+        GROQ_API_URL,
+        headers=_headers(groq_key),
+        json=_completion_body(model, prompt, max_tokens),
+        timeout=timeout
+    )
+    latency = time.perf_counter() - started
+    body = response.json() if response.status_code == 200 else {}
+    text = body['choices'][0]['message']['content'] if body else ''
+    if RECORDING:
+        record_llm(model, prompt, max_tokens, response.status_code, [(latency, text)], latency)
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}")
+    usage_ledger.record(model, *(parse_usage(body) or estimate_usage(prompt, text)), latency)
+    return text
+
+class _StreamReader:
+    """Server-sent event lines of one streamed completion -> text, usage and the validator's verdict"""
+    
+    def __init__(self, model, prompt, validator, max_tokens):
+        self.model = model
+        self.prompt = prompt
+        self.validator = validator
+        self.max_tokens = max_tokens
+        self.started = time.perf_counter()
+        self.chunks = []  # (offset, text) for traffic recording
+        self.parts = []
+        self.usage = None
+        self.aborted = False
+    
+    def feed(self, line):
+        """False once the stream is done or the validator rejected the partial plan"""
+        if not line or not line.startswith('data:'):
+            return True
+        payload = line[5:].strip()
+        if payload == '[DONE]':
+            return False
+        event = json.loads(payload)
+        self.usage = parse_usage(event) or self.usage
+        choices = event.get('choices') or [{}]
+        delta = choices[0].get('delta', {}).get('content') or ''
+        if not delta:
+            return True
+        self.parts.append(delta)
+        if RECORDING:
+            self.chunks.append((time.perf_counter() - self.started, delta))
+        if not self.validator.feed(delta):
+            self.aborted = True
+            return False
+        return True
     
+    def result(self):
+        """(text, aborted)"""
+        return ''.join(self.parts), self.aborted
+    
+    def close(self, status_code):
+        latency = time.perf_counter() - self.started
+        if RECORDING:
+            record_llm(self.model, self.prompt, self.max_tokens, status_code, self.chunks, latency)
+        if status_code == 200:
+            # Aborted streams never reach the usage event; estimate what was generated
+            usage_ledger.record(self.model, *(self.usage or estimate_usage(self.prompt, ''.join(self.parts))), latency)
+
+def stream_completion(model, prompt, validator, groq_key, max_tokens=1500):
+    """
+    Stream one chat completion, feeding text to the validator as it arrives.
+    Returns (text, aborted) - the connection is dropped as soon as the
+    validator rejects the partial plan.
+    """
+    reader = _StreamReader(model, prompt, validator, max_tokens)
+    response = requests.post(
+        GROQ_API_URL,
+        headers=_headers(groq_key),
+        json=_completion_body(model, prompt, max_tokens, stream=True),
+        timeout=15,
+        stream=True
+    )
+    
+    try:
+        with response:
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}")
+            
+            for line in response.iter_lines(decode_unicode=True):
+                if not reader.feed(line):
+                    break
+            return reader.result()
+    finally:
+        reader.close(response.status_code)
+
+async def stream_completion_async(model, prompt, validator, groq_key, max_tokens=1500):
+    """stream_completion for the ASGI mode (asgi.py), on the pooled async client"""
+    from async_http import async_client
+    client = async_client()
+    reader = _StreamReader(model, prompt, validator, max_tokens)
+    request = client.build_request(
+        "POST",
+        GROQ_API_URL,
+        headers=_headers(groq_key),
+        json=_completion_body(model, prompt, max_tokens, stream=True),
+        timeout=15
+    )
+    response = await client.send(request, stream=True)
+    
+    try:
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        
+        async for line in response.aiter_lines():
+            if not reader.feed(line):
+                break
+        return reader.result()
+    finally:
+        await response.aclose()
+        reader.close(response.status_code)
+
+def _validator(equipment, render):
+    return JSONPlanReader(equipment) if render else PlanValidator(equipment)
+
+def gate_plan(model, validator, schedule, render=None):
+    """The finished plan if it is valid and scores at least MIN_PLAN_SCORE, else None"""
+    if render:
+        schedule, verdict = validator.finish(*render)
+    else:
+        verdict = validator.finish()
+    if verdict['valid'] and verdict['score'] >= MIN_PLAN_SCORE:
+        return schedule
+    
+    print(f"Model {model} plan rejected (score {verdict['score']}): {verdict['issues']}")
+    return None
+
+def accept_plan(model, validator, schedule, aborted, started, render):
+    """gate_plan for one completion, recording its latency and outcome"""
+    if aborted:
+        LLM_LATENCY.observe(time.perf_counter() - started, model, 'aborted')
+        print(f"Model {model} aborted early: {validator.abort_reason}")
+        return None
+    
+    schedule = gate_plan(model, validator, schedule, render)
+    LLM_LATENCY.observe(time.perf_counter() - started, model, 'ok' if schedule is not None else 'invalid')
+    return schedule
+
+def try_models(prompt, equipment, render=None):
+    """
+    Try each model in turn; returns the first validated plan or None.
+    render=(user name, goal, level) marks a JSON-mode prompt whose output is
+    parsed by plan_json and rendered back to plan text.
+    """
     groq_key = os.getenv('GROQ_API_KEY')
-    models = ["llama-3.3-70b-versatile", "llama-3.1-8b-instant", "gemma2-9b-it"]
     
-    for model in models:
+    for model in MODELS:
+        started = time.perf_counter()
         try:
-            headers = {
-                "Authorization": f"Bearer {groq_key}",
-                "Content-Type": "application/json"
-            }
-            
-            response = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers=headers,
-                json={
-                    "model": model,
-                    "messages": [
-                        {"role": "system", "content": "You are a professional fitness trainer."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 1500
-                },
-                timeout=15
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                schedule = result['choices'][0]['message']['content']
-                if "DAY 5" in schedule and len(schedule) > 300:
-                    return schedule
+            validator = _validator(equipment, render)
+            schedule, aborted = stream_completion(model, prompt, validator, groq_key)
+            schedule = accept_plan(model, validator, schedule, aborted, started, render)
+            if schedule is not None:
+                return schedule
                     
         except Exception as e:
+            LLM_LATENCY.observe(time.perf_counter() - started, model, 'error')
             print(f"Model {model} failed: {str(e)}")
             time.sleep(1)
             continue
     
+    return None
+
+async def try_models_async(prompt, equipment, render=None):
+    """try_models for the ASGI mode; waits on the providers without holding a thread"""
+    groq_key = os.getenv('GROQ_API_KEY')
+    
+    for model in MODELS:
+        started = time.perf_counter()
+        try:
+            validator = _validator(equipment, render)
+            schedule, aborted = await stream_completion_async(model, prompt, validator, groq_key)
+            schedule = accept_plan(model, validator, schedule, aborted, started, render)
+            if schedule is not None:
+                return schedule
+                    
+        except Exception as e:
+            LLM_LATENCY.observe(time.perf_counter() - started, model, 'error')
+            print(f"Model {model} failed: {str(e)}")
+            await asyncio.sleep(1)
+            continue
+    
+    return None
+
+def _model_prompt(prompt, user, goal, level, equipment):
+    """(prompt, render) for the configured PLAN_FORMAT, see try_models"""
+    if PLAN_FORMAT == 'json':
+        from prompt_builder import build_json_workout_prompt
+        return build_json_workout_prompt(user, goal, level, equipment), (user.name, goal, level)
+    return prompt, None
+
+def _with_fallback(schedule, user, goal, level, equipment):
+    if schedule is not None:
+        return schedule, 'ai'
+    
     # Fallback to template
-    return generate_fallback_template(user, goal, level, equipment)
+    TEMPLATE_FALLBACKS.inc()
+    return generate_fallback_template(user, goal, level, equipment), 'template'
+
+def generate_workout_with_source(prompt, user, goal, level, equipment):
+    """Generate workout with multiple model fallbacks; returns (plan, 'local' | 'ai' | 'template')"""
+    
+    if LOCAL_PLAN_FIRST and is_local_profile(goal, level, equipment):
+        LOCAL_PLANS.inc()
+        return build_local_plan(user, goal, level, equipment), 'local'
+    
+    prompt, render = _model_prompt(prompt, user, goal, level, equipment)
+    schedule = try_models(prompt, equipment, render=render)
+    return _with_fallback(schedule, user, goal, level, equipment)
+
+async def generate_workout_with_source_async(prompt, user, goal, level, equipment):
+    """generate_workout_with_source for the ASGI mode (asgi.py)"""
+    
+    if LOCAL_PLAN_FIRST and is_local_profile(goal, level, equipment):
+        LOCAL_PLANS.inc()
+        return build_local_plan(user, goal, level, equipment), 'local'
+    
+    prompt, render = _model_prompt(prompt, user, goal, level, equipment)
+    schedule = await try_models_async(prompt, equipment, render=render)
+    return _with_fallback(schedule, user, goal, level, equipment)
+
+def generate_workout_with_ai(prompt, user, goal, level, equipment):
+    """Generate workout with multiple model fallbacks"""
+    schedule, _ = generate_workout_with_source(prompt, user, goal, level, equipment)
+    return schedule
 
 def generate_fallback_template(user, goal, level, equipment):
-    """Generate fallback template when AI fails"""
-    sets = 3 if level == 'beginner' else 4
-    reps = "10-12" if level == 'beginner' else "8-10" if level == 'intermediate' else "6-8"
-    
-    return f"""5-DAY WORKOUT PLAN (Template)
-For: {user.name} | Goal: {goal} | Level: {level}
-
-DAY 1: Upper Body
-1. Push-ups - {sets} x {reps}
-2. Rows - {sets} x {reps}
-3. Shoulder Press - {sets} x {reps}
-4. Bicep Curls - {sets} x {reps}
-5. Tricep Dips - {sets} x {reps}
-
-DAY 2: Lower Body
-1. Squats - {sets} x {reps}
-2. Lunges - {sets} x {reps}
-3. Glute Bridges - {sets} x {reps}
-4. Calf Raises - {sets} x 15
-5. Step-ups - {sets} x {reps}
-
-DAY 3: Core & Cardio
-1. Planks - 3 x 45 sec
-2. Mountain Climbers - 3 x 30 sec
-3. Crunches - 3 x 15
-4. Leg Raises - 3 x 12
-5. Jumping Jacks - 3 x 30 sec
-
-DAY 4: Full Body
-1. Burpees - 3 x 8
-2. Squat to Press - {sets} x {reps}
-3. Lunges - {sets} x {reps}
-4. Push-ups - {sets} x {reps}
-5. Plank - 3 x 45 sec
-
-DAY 5: Active Recovery
-1. Light walking - 20 min
-2. Full body stretching - 15 min
-3. Deep breathing - 5 min
-"""
+    """Generate fallback plan from the local rule-based engine when AI fails"""
+    return build_local_plan(user, goal, level, equipment)
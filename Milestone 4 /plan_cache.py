@@ -0,0 +1,111 @@
+"""
+Generation cache keyed by profile bucket
+
+Profiles are bucketed by goal, level, equipment and rounded body stats. A
+validated plan for the bucket is kept in a bounded in-process LRU in front
+of the shared plan_cache_entries table, so every gunicorn worker (and the
+offline warm-up job in warm_cache.py) sees the same entries.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from blob_store import replace_name
+from exercise_catalog import parse_equipment
+from metrics import record_cache
+
+PLAN_CACHE_SIZE = int(os.getenv('PLAN_CACHE_SIZE', 512))
+PLAN_CACHE_TTL = int(os.getenv('PLAN_CACHE_TTL', 3600))
+
+AGE_BUCKET = 10
+WEIGHT_BUCKET = 10
+HEIGHT_BUCKET = 10
+
+
+def _bucket(value, width):
+    return int((value or 0) // width * width)
+
+
+def bucket_key(age, weight, height, goal, level, equipment):
+    """Cache key for a profile, or None when the equipment is not canonical"""
+    mask, unknown = parse_equipment(equipment)
+    if unknown:
+        return None
+    return (f"{goal}|{level}|e{mask}|a{_bucket(age, AGE_BUCKET)}"
+            f"|w{_bucket(weight, WEIGHT_BUCKET)}|h{_bucket(height, HEIGHT_BUCKET)}")
+
+
+def bucket_midpoint(key):
+    """(age, weight, height) at the centre of a bucket, for warm-up generation"""
+    parts = dict((p[0], p[1:]) for p in key.split('|')[3:])
+    return (int(parts['a']) + AGE_BUCKET // 2,
+            float(parts['w']) + WEIGHT_BUCKET / 2,
+            float(parts['h']) + HEIGHT_BUCKET / 2)
+
+
+def personalize(text, owner_name, name):
+    """The cached plan with the owner's name in its header swapped for the reader's"""
+    if owner_name and name:
+        return replace_name(text, owner_name, name)
+    return text
+
+
+class PlanCache:
+    """Bounded LRU with TTL in front of the PlanCacheEntry table"""
+
+    def __init__(self, size=PLAN_CACHE_SIZE, ttl=PLAN_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires, text, owner name)
+        self._lock = threading.Lock()
+
+    def _remember(self, key, text, owner_name):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, text, owner_name)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def get(self, user, goal, level, equipment):
+        """Personalized cached plan for the user's bucket, or None"""
+        key = bucket_key(user.age, user.weight, user.height, goal, level, equipment)
+        if key is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                record_cache('plan', True)
+                return personalize(entry[1], entry[2], user.name)
+
+        from models import PlanCacheEntry
+        row = PlanCacheEntry.query.filter_by(bucket_key=key).first()
+        record_cache('plan', row is not None)
+        if row is None:
+            return None
+        self._remember(key, row.schedule_data, row.owner_name)
+        return personalize(row.schedule_data, row.owner_name, user.name)
+
+    def put(self, db, key, text, owner_name, score=None):
+        """Store a validated plan for a bucket (insert or replace)"""
+        if key is None:
+            return
+        from models import PlanCacheEntry
+        row = PlanCacheEntry.query.filter_by(bucket_key=key).first()
+        if row is None:
+            row = PlanCacheEntry(bucket_key=key)
+            db.session.add(row)
+        row.schedule_data = text
+        row.owner_name = owner_name
+        row.score = score
+        db.session.commit()
+        self._remember(key, text, owner_name)
+
+    def contains(self, key):
+        from models import PlanCacheEntry
+        return PlanCacheEntry.query.filter_by(bucket_key=key).first() is not None
+
+
+plan_cache = PlanCache()
@@ -0,0 +1,310 @@
+"""
+Structured JSON plan generation: schema, streaming parser and rendering
+
+In JSON mode (PLAN_FORMAT=json) the model is asked for a compact document
+
+    {"days":[{"focus":"Upper Body","exercises":[["Push-up",3,"10-12"], ...]}, ...]}
+
+which is parsed incrementally as it streams. Each completed exercise is
+handed to the PlanValidator as a canonical text line, so early abort works
+exactly as in text mode. If the output stops being valid JSON the generation
+carries on through the regular text parser instead.
+"""
+
+import json
+from plan_validator import PlanValidator
+
+JSON_WHITESPACE = ' \t\r\n'
+BARE_CHARS = set('0123456789+-.eEtrufalsn')
+MAX_PREFIX_CHARS = 40  # tolerate "```json" style preambles before the root object
+
+
+class JSONStreamError(ValueError):
+    """Raised as soon as the streamed text can no longer be valid JSON"""
+
+
+class StreamingJSONParser:
+    """
+    Incremental JSON parser building Python values as characters arrive.
+    on_value(path, value) is called for every completed value, where path is
+    the tuple of object keys / array indexes leading to it.
+    """
+
+    def __init__(self, on_value=None):
+        self.on_value = on_value
+        self.root = None
+        self.done = False
+        self._stack = []  # [container, path, state, pending key]
+        self._string = None  # list of chars while inside a string
+        self._escape = None  # None, '' after backslash, or partial \\u digits
+        self._bare = None  # chars of a number / true / false / null
+        self._prefix = 0
+
+    def feed(self, chunk):
+        for char in chunk:
+            self._char(char)
+
+    def finish(self):
+        """Return the root value, or raise if the document is incomplete"""
+        if self._bare is not None:
+            self._end_bare()
+        if not self.done:
+            raise JSONStreamError('Incomplete JSON document')
+        return self.root
+
+    def open_container(self, depth):
+        """The partially built container at nesting depth (0 = root), if still open"""
+        return self._stack[depth][0] if depth < len(self._stack) else None
+
+    # --------------------------------------------------
+    # Lexing
+    # --------------------------------------------------
+
+    def _char(self, char):
+        if self._string is not None:
+            self._string_char(char)
+            return
+        if self._bare is not None:
+            if char in BARE_CHARS:
+                self._bare.append(char)
+                return
+            self._end_bare()
+        if self.done or char in JSON_WHITESPACE:
+            return  # trailing text after the root (e.g. closing ```) is ignored
+        if not self._stack and char != '{' and char != '[':
+            self._prefix += 1
+            if self._prefix > MAX_PREFIX_CHARS:
+                raise JSONStreamError('No JSON document found')
+            return
+
+        if char == '"':
+            self._string = []
+        elif char in '{[':
+            self._open(char)
+        elif char in '}]':
+            self._close(char)
+        elif char == ':':
+            self._colon()
+        elif char == ',':
+            self._comma()
+        elif char in BARE_CHARS:
+            self._bare = [char]
+        else:
+            raise JSONStreamError(f'Unexpected character {char!r}')
+
+    def _string_char(self, char):
+        if self._escape is not None:
+            if self._escape == '' and char != 'u':
+                mapping = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f',
+                           'n': '\n', 'r': '\r', 't': '\t'}
+                if char not in mapping:
+                    raise JSONStreamError(f'Bad escape \\{char}')
+                self._string.append(mapping[char])
+                self._escape = None
+            elif self._escape == '':
+                self._escape = 'u'
+            else:
+                self._escape += char
+                if len(self._escape) == 5:
+                    try:
+                        self._string.append(chr(int(self._escape[1:], 16)))
+                    except ValueError:
+                        raise JSONStreamError('Bad \\u escape')
+                    self._escape = None
+        elif char == '\\':
+            self._escape = ''
+        elif char == '"':
+            text = ''.join(self._string)
+            if any('\ud800' <= c <= '\udfff' for c in text):
+                text = text.encode('utf-16', 'surrogatepass').decode('utf-16', 'replace')
+            self._string = None
+            self._token(text, is_string=True)
+        else:
+            self._string.append(char)
+
+    def _end_bare(self):
+        text = ''.join(self._bare)
+        self._bare = None
+        try:
+            value = json.loads(text)
+        except ValueError:
+            raise JSONStreamError(f'Bad literal {text!r}')
+        self._token(value)
+
+    # --------------------------------------------------
+    # Structure
+    # --------------------------------------------------
+
+    def _frame(self):
+        if not self._stack:
+            raise JSONStreamError('Value outside of the document')
+        return self._stack[-1]
+
+    def _child_path(self, frame):
+        container, path, _, key = frame
+        return path + ((key if isinstance(container, dict) else len(container)),)
+
+    def _token(self, value, is_string=False):
+        frame = self._frame()
+        container, _, state, _ = frame
+        if isinstance(container, dict) and state in ('key_or_end', 'key'):
+            if not is_string:
+                raise JSONStreamError('Object keys must be strings')
+            frame[3] = value
+            frame[2] = 'colon'
+            return
+        self._value(value)
+
+    def _value(self, value, path=None):
+        frame = self._stack[-1]
+        container, _, state, key = frame
+        if state not in ('value', 'value_or_end'):
+            raise JSONStreamError('Unexpected value')
+        path = path or self._child_path(frame)
+        if isinstance(container, dict):
+            container[key] = value
+        else:
+            container.append(value)
+        frame[2] = 'comma_or_end'
+        if self.on_value:
+            self.on_value(path, value)
+
+    def _open(self, char):
+        container = {} if char == '{' else []
+        if self._stack:
+            frame = self._stack[-1]
+            if frame[2] not in ('value', 'value_or_end'):
+                raise JSONStreamError('Unexpected container')
+            path = self._child_path(frame)
+        else:
+            path = ()
+        self._stack.append([container, path, 'key_or_end' if char == '{' else 'value_or_end', None])
+
+    def _close(self, char):
+        container, path, state, _ = self._frame()
+        if (char == '}') != isinstance(container, dict):
+            raise JSONStreamError('Mismatched bracket')
+        if state not in ('comma_or_end', 'key_or_end', 'value_or_end'):
+            raise JSONStreamError('Unexpected end of container')
+        self._stack.pop()
+        if self._stack:
+            self._value(container, path)
+        else:
+            self.root = container
+            self.done = True
+            if self.on_value:
+                self.on_value((), container)
+
+    def _colon(self):
+        frame = self._frame()
+        if frame[2] != 'colon':
+            raise JSONStreamError("Unexpected ':'")
+        frame[2] = 'value'
+
+    def _comma(self):
+        frame = self._frame()
+        if frame[2] != 'comma_or_end':
+            raise JSONStreamError("Unexpected ','")
+        frame[2] = 'key' if isinstance(frame[0], dict) else 'value'
+
+
+# ======================================================
+# PLAN SCHEMA
+# ======================================================
+
+def normalize_exercise(value):
+    """(name, sets, reps) from ["Name", 3, "10-12"] or {"name":..., "sets":..., "reps":...}"""
+    if isinstance(value, list) and len(value) >= 3:
+        name, sets, reps = value[:3]
+    elif isinstance(value, dict):
+        name, sets, reps = value.get('name'), value.get('sets'), value.get('reps')
+    else:
+        return None
+    if not isinstance(name, str) or not name.strip():
+        return None
+    return name.strip(), sets, str(reps).strip() if reps is not None else ''
+
+
+def exercise_line(number, name, sets, reps):
+    if sets in (None, '', 1, '1') and reps and not str(reps)[0].isdigit():
+        return f"{number}. {name} - {reps}"
+    return f"{number}. {name} - {sets} x {reps}"
+
+
+def render_plan(plan, user_name, goal, level):
+    """Canonical plan text (same layout as the local engine) from a parsed plan"""
+    lines = [
+        "5-DAY WORKOUT PLAN",
+        f"For: {user_name} | Goal: {goal} | Level: {level}",
+        ""
+    ]
+    for index, day in enumerate(plan.get('days') or [], start=1):
+        if not isinstance(day, dict):
+            continue
+        lines.append(f"DAY {day.get('day') or index}: {day.get('focus') or 'Training'}")
+        exercises = [e for e in map(normalize_exercise, day.get('exercises') or []) if e]
+        for number, (name, sets, reps) in enumerate(exercises, start=1):
+            lines.append(exercise_line(number, name, sets, reps))
+        lines.append("")
+    return "\n".join(lines)
+
+
+class JSONPlanReader:
+    """
+    Streams a JSON-mode completion into a PlanValidator.
+    Switches to plain text validation of the raw output if the JSON breaks.
+    """
+
+    def __init__(self, equipment):
+        self.equipment = equipment
+        self.validator = PlanValidator(equipment)
+        self.parser = StreamingJSONParser(self._on_value)
+        self.raw = []
+        self.json_ok = True
+        self._announced = set()
+
+    def feed(self, chunk):
+        """Same contract as PlanValidator.feed: False once the plan should be aborted"""
+        self.raw.append(chunk)
+        if self.json_ok:
+            try:
+                self.parser.feed(chunk)
+                return self.validator.abort_reason is None
+            except JSONStreamError as e:
+                print(f"JSON plan output malformed ({str(e)}), falling back to text parser")
+                self.json_ok = False
+                self.validator = PlanValidator(self.equipment)
+                return self.validator.feed(''.join(self.raw))
+        return self.validator.feed(chunk)
+
+    @property
+    def abort_reason(self):
+        return self.validator.abort_reason
+
+    def _on_value(self, path, value):
+        # Only ("days", i, "exercises", j) completions drive validation
+        if len(path) != 4 or path[0] != 'days' or path[2] != 'exercises':
+            return
+        day_index = path[1]
+        if day_index not in self._announced:
+            self._announced.add(day_index)
+            # The enclosing day object is still open: root > days > day > exercises
+            day = self.parser.open_container(2)
+            day = day if isinstance(day, dict) else {}
+            self.validator.feed(f"DAY {day.get('day') or day_index + 1}: {day.get('focus') or ''}\n")
+        exercise = normalize_exercise(value)
+        if exercise:
+            self.validator.feed(exercise_line(path[3] + 1, *exercise) + "\n")
+
+    def finish(self, user_name, goal, level):
+        """Return (plan text, verdict); JSON output is rendered to canonical text"""
+        if self.json_ok:
+            try:
+                plan = self.parser.finish()
+                if isinstance(plan, dict):
+                    return render_plan(plan, user_name, goal, level), self.validator.finish()
+            except JSONStreamError as e:
+                print(f"JSON plan output incomplete ({str(e)}), falling back to text parser")
+            self.validator = PlanValidator(self.equipment)
+            self.validator.feed(''.join(self.raw))
+        return ''.join(self.raw), self.validator.finish()
@@ -0,0 +1,211 @@
+"""
+Incremental validation and scoring of generated workout plans
+
+Text can be fed as it streams in from the model. Complete lines are checked
+as they arrive so an obviously broken generation can be aborted early.
+"""
+
+import re
+from exercise_catalog import BY_NAME, EQUIPMENT_BITS, ALL_EQUIPMENT, parse_equipment
+
+REQUIRED_DAYS = 5
+EXERCISES_PER_DAY = 5
+
+# Abort thresholds for streaming generations
+MAX_CHARS_BEFORE_DAY_1 = 800
+MIN_EXERCISES_WHEN_DAY_CLOSES = 3
+MAX_EQUIPMENT_VIOLATIONS = 3
+
+DAY_PATTERN = re.compile(r'^[\s#*_>-]*day\s*(\d+)\b', re.IGNORECASE)
+EXERCISE_PATTERN = re.compile(r'^[\s*_>-]*(\d+)[.)]\s*(.+)$')
+SETS_REPS_PATTERN = re.compile(
+    r'(\d+)\s*(?:sets?\s*)?(?:x|×|of)\s*(\d+(?:\s*[-–]\s*\d+)?)\s*(reps?|sec(?:onds?)?|s\b|min(?:utes?)?)?',
+    re.IGNORECASE)
+DURATION_PATTERN = re.compile(r'\b\d+\s*(?:min(?:utes?)?|sec(?:onds?)?)\b', re.IGNORECASE)
+
+# Keywords that imply equipment when an exercise is not in the catalog
+EQUIPMENT_KEYWORDS = {
+    'dumbbell': 'dumbbells',
+    'barbell': 'barbell',
+    'kettlebell': 'kettlebells',
+    'band': 'resistance_band',
+    'treadmill': 'treadmill',
+    'bike': 'exercise_bike',
+    'cycling': 'exercise_bike',
+}
+# Gym equipment outside the catalog vocabulary that users never list
+GYM_ONLY_KEYWORDS = ('cable', 'machine', 'smith', 'leg press', 'lat pulldown')
+
+
+def parse_sets_reps(text):
+    """Return (sets, reps) from an exercise line, or None if not parseable"""
+    match = SETS_REPS_PATTERN.search(text)
+    if match:
+        return int(match.group(1)), match.group(2).replace(' ', '')
+    match = DURATION_PATTERN.search(text)
+    if match:
+        return 1, match.group(0)
+    return None
+
+
+def required_equipment(exercise_name):
+    """Equipment mask an exercise needs (catalog lookup, then keywords)"""
+    name = re.sub(r'[*_`]', '', exercise_name).strip().lower()
+    exercise = BY_NAME.get(name)
+    if exercise is not None:
+        return exercise.equipment_mask, False
+    mask = 0
+    for keyword, item in EQUIPMENT_KEYWORDS.items():
+        if keyword in name:
+            mask |= EQUIPMENT_BITS[item]
+    gym_only = any(keyword in name for keyword in GYM_ONLY_KEYWORDS)
+    return mask, gym_only
+
+
+class PlanValidator:
+    """Streaming structure, equipment and quality checks for a 5-day plan"""
+
+    def __init__(self, equipment=None):
+        if equipment is None:
+            self.available, self.full_gym = ALL_EQUIPMENT, True
+        else:
+            self.available, _ = parse_equipment(equipment)
+            self.full_gym = self.available == ALL_EQUIPMENT
+        self.days = {}  # day number -> list of (exercise name, sets/reps or None)
+        self.day_order = []
+        self.current_day = None
+        self.equipment_violations = []
+        self.issues = []
+        self.chars = 0
+        self._buffer = ''
+        self._abort_reason = None
+
+    # --------------------------------------------------
+    # Incremental feeding
+    # --------------------------------------------------
+
+    def feed(self, chunk):
+        """Consume a chunk of streamed text; returns False once the plan should be aborted"""
+        self.chars += len(chunk)
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split('\n')
+        for line in lines:
+            self._consume_line(line)
+        if not self.day_order and self._abort_reason is None and self.chars > MAX_CHARS_BEFORE_DAY_1:
+            self._abort_reason = f"No DAY 1 heading within {MAX_CHARS_BEFORE_DAY_1} characters"
+        return self._abort_reason is None
+
+    @property
+    def abort_reason(self):
+        return self._abort_reason
+
+    def _consume_line(self, line):
+        day_match = DAY_PATTERN.match(line)
+        if day_match:
+            self._close_day()
+            day = int(day_match.group(1))
+            problem = None
+            if day in self.days:
+                problem = f"DAY {day} appears more than once"
+            elif self.day_order and day < self.day_order[-1]:
+                problem = f"DAY {day} follows DAY {self.day_order[-1]}"
+            if problem:
+                self.issues.append(problem)
+                if self._abort_reason is None:
+                    self._abort_reason = problem
+            self.day_order.append(day)
+            if day in self.days:
+                # Never merge a repeated day's exercises into the first one
+                self.current_day = None
+                return
+            self.days[day] = []
+            self.current_day = day
+            return
+
+        exercise_match = EXERCISE_PATTERN.match(line)
+        if exercise_match and self.current_day is not None:
+            body = exercise_match.group(2)
+            name = re.split(r'\s+[-–:]\s+|\s*\(', body, maxsplit=1)[0]
+            name = re.sub(r'[*_`]', '', name).strip()
+            self.days[self.current_day].append((name, parse_sets_reps(body)))
+            self._check_equipment(name)
+
+    def _close_day(self):
+        if self.current_day is None:
+            return
+        count = len(self.days[self.current_day])
+        if count < MIN_EXERCISES_WHEN_DAY_CLOSES and self._abort_reason is None:
+            self._abort_reason = f"DAY {self.current_day} closed with only {count} exercises"
+
+    def _check_equipment(self, name):
+        if self.full_gym:
+            return
+        needed, gym_only = required_equipment(name)
+        if gym_only or needed & ~self.available:
+            self.equipment_violations.append(name)
+            if len(self.equipment_violations) >= MAX_EQUIPMENT_VIOLATIONS and self._abort_reason is None:
+                self._abort_reason = "Plan repeatedly uses equipment the user does not have"
+
+    # --------------------------------------------------
+    # Final verdict
+    # --------------------------------------------------
+
+    def finish(self):
+        """Flush remaining text and return the validation result"""
+        if self._buffer:
+            self._consume_line(self._buffer)
+            self._buffer = ''
+
+        issues = list(self.issues)
+        expected = set(range(1, REQUIRED_DAYS + 1))
+        missing = sorted(expected - set(self.days))
+        if missing:
+            issues.append(f"Missing days: {', '.join(str(d) for d in missing)}")
+
+        total = parsed = short_days = 0
+        for day in expected & set(self.days):
+            exercises = self.days[day]
+            total += len(exercises)
+            parsed += sum(1 for _, prescription in exercises if prescription)
+            if len(exercises) < EXERCISES_PER_DAY:
+                short_days += 1
+                issues.append(f"DAY {day} has {len(exercises)} exercises (expected {EXERCISES_PER_DAY})")
+
+        parse_rate = parsed / total if total else 0.0
+        if total and parse_rate < 0.8:
+            issues.append(f"Only {parsed}/{total} exercises have parseable sets x reps")
+        if self.equipment_violations:
+            issues.append(f"Unavailable equipment: {', '.join(self.equipment_violations[:5])}")
+
+        names = [name.lower() for day in self.days.values() for name, _ in day]
+        variety = len(set(names)) / len(names) if names else 0.0
+
+        score = 100.0
+        score -= 20 * len(missing)
+        score -= 8 * short_days
+        score -= 30 * (1 - parse_rate) if total else 30
+        score -= 10 * len(self.equipment_violations)
+        score -= 10 * max(0.0, 0.6 - variety)
+        score -= 5 * len(self.issues)
+        score = max(0, min(100, round(score)))
+
+        valid = (not missing and short_days == 0 and parse_rate >= 0.8
+                 and len(self.equipment_violations) < MAX_EQUIPMENT_VIOLATIONS
+                 and self._abort_reason is None)
+
+        return {
+            'valid': valid,
+            'score': score,
+            'days': len(expected & set(self.days)),
+            'exercises': total,
+            'parse_rate': round(parse_rate, 2),
+            'equipment_violations': self.equipment_violations,
+            'issues': issues if self._abort_reason in (None, *self.issues) else [self._abort_reason] + issues,
+        }
+
+
+def validate_plan(text, equipment=None):
+    """Validate a complete plan in one call"""
+    validator = PlanValidator(equipment)
+    validator.feed(text)
+    return validator.finish()
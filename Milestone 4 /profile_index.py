@@ -0,0 +1,197 @@
+"""
+Nearest-neighbour plan reuse across similar user profiles
+
+Existing users' latest validated plans are indexed by (goal, level). Within a
+partition each profile is a normalized (age, weight, height) row plus an
+equipment bitmask; a new request is matched with one vectorized NumPy
+distance computation (or a grid lookup for large partitions). A match within
+PLAN_REUSE_DISTANCE gets a personalized copy of the neighbour's plan.
+"""
+
+import os
+import threading
+import time
+import numpy as np
+from blob_store import replace_name
+from exercise_catalog import parse_equipment
+from metrics import Histogram, record_cache
+from plan_validator import validate_plan
+
+PLAN_REUSE_DISTANCE = float(os.getenv('PLAN_REUSE_DISTANCE', 0.05))
+INDEX_TTL = int(os.getenv('PLAN_REUSE_INDEX_TTL', 600))
+GRID_MIN_ROWS = int(os.getenv('PLAN_REUSE_GRID_MIN_ROWS', 5000))
+
+# Validation ranges from app.py, used to scale features into [0, 1]
+FEATURE_RANGES = np.array([(15, 100), (20, 300), (100, 250)], dtype=np.float64)
+
+NEIGHBOUR_DISTANCE = Histogram(
+    'fitplan_profile_neighbour_distance', 'Distance to the nearest indexed profile',
+    buckets=(0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0))
+
+
+def profile_vector(age, weight, height):
+    """Normalized feature row for one profile"""
+    raw = np.array([age or 0, weight or 0, height or 0], dtype=np.float64)
+    return (raw - FEATURE_RANGES[:, 0]) / (FEATURE_RANGES[:, 1] - FEATURE_RANGES[:, 0])
+
+
+class _Partition:
+    """Profiles sharing a (goal, level) key
+
+    Writers append under the index lock and drop the snapshot; readers search
+    an immutable (matrix, masks, grid, entries) snapshot, rebuilt under the
+    same lock, so a concurrent add never shows them half-updated rows.
+    """
+
+    def __init__(self, lock):
+        self.rows = []
+        self.masks = []
+        self.entries = []  # (schedule id, owner name)
+        self._lock = lock
+        self._snapshot = None
+
+    def add(self, vector, mask, entry):
+        """Caller holds the index lock"""
+        self.rows.append(vector)
+        self.masks.append(mask)
+        self.entries.append(entry)
+        self._snapshot = None
+
+    def _build(self):
+        matrix = np.vstack(self.rows)
+        grid = None
+        if len(self.rows) >= GRID_MIN_ROWS:
+            grid = {}
+            cells = np.floor(matrix / PLAN_REUSE_DISTANCE).astype(np.int64)
+            for i, cell in enumerate(map(tuple, cells)):
+                grid.setdefault(cell, []).append(i)
+        return matrix, np.array(self.masks, dtype=np.int64), grid, tuple(self.entries)
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None and self.rows:
+                    self._snapshot = self._build()
+                snapshot = self._snapshot
+        return snapshot
+
+    @staticmethod
+    def _candidates(grid, vector):
+        if grid is None:
+            return None
+        cx, cy, cz = np.floor(vector / PLAN_REUSE_DISTANCE).astype(np.int64)
+        found = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    found.extend(grid.get((cx + dx, cy + dy, cz + dz), ()))
+        return np.array(found, dtype=np.int64)
+
+    def nearest(self, vector, mask):
+        """Return (distance, entry) of the closest profile whose equipment the user has"""
+        snapshot = self.snapshot()
+        if snapshot is None:
+            return None
+        matrix, masks, grid, entries = snapshot
+        idx = self._candidates(grid, vector)
+        if idx is not None:
+            if not len(idx):
+                return None
+            matrix, masks = matrix[idx], masks[idx]
+        usable = (masks & ~mask) == 0
+        if not usable.any():
+            return None
+        distances = np.sqrt(((matrix - vector) ** 2).sum(axis=1))
+        distances[~usable] = np.inf
+        best = int(np.argmin(distances))
+        row = int(idx[best]) if idx is not None else best
+        return float(distances[best]), entries[row]
+
+
+class ProfileIndex:
+    """Process-wide index of (profile -> validated plan), rebuilt every INDEX_TTL seconds"""
+
+    def __init__(self):
+        self._partitions = {}
+        self._built_at = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.matches = 0
+
+    def _rebuild(self):
+        from models import User, WorkoutSchedule
+        partitions = {}
+        seen_users = set()
+        rows = WorkoutSchedule.query.join(User, WorkoutSchedule.user_id == User.id)\
+            .filter(WorkoutSchedule.goal.isnot(None), WorkoutSchedule.level.isnot(None))\
+            .order_by(WorkoutSchedule.created_at.desc())\
+            .with_entities(WorkoutSchedule.id, WorkoutSchedule.user_id, WorkoutSchedule.goal,
+                           WorkoutSchedule.level, WorkoutSchedule.equipment,
+                           User.name, User.age, User.weight, User.height)\
+            .yield_per(1000)
+        for schedule_id, user_id, goal, level, equipment, name, age, weight, height in rows:
+            if user_id in seen_users:
+                continue
+            seen_users.add(user_id)
+            mask, unknown = parse_equipment(equipment or '')
+            if unknown:
+                continue
+            partitions.setdefault((goal, level), _Partition(self._lock)).add(
+                profile_vector(age, weight, height), mask, (schedule_id, name))
+        self._partitions = partitions
+        self._built_at = time.time()
+
+    def _ensure_fresh(self):
+        if time.time() - self._built_at > INDEX_TTL:
+            with self._lock:
+                if time.time() - self._built_at > INDEX_TTL:
+                    self._rebuild()
+
+    def add(self, user, goal, level, equipment, schedule_id):
+        """Index a freshly generated, validated plan"""
+        mask, unknown = parse_equipment(equipment)
+        if unknown:
+            return
+        with self._lock:
+            self._partitions.setdefault((goal, level), _Partition(self._lock)).add(
+                profile_vector(user.age, user.weight, user.height), mask, (schedule_id, user.name))
+
+    def find(self, user, goal, level, equipment, max_distance=PLAN_REUSE_DISTANCE):
+        """Personalized copy of the nearest neighbour's plan, or None"""
+        self._ensure_fresh()
+        mask, unknown = parse_equipment(equipment)
+        partition = self._partitions.get((goal, level))
+        result = None
+        if not unknown and partition is not None:
+            result = partition.nearest(profile_vector(user.age, user.weight, user.height), mask)
+
+        plan = None
+        if result is not None:
+            distance, (schedule_id, owner_name) = result
+            NEIGHBOUR_DISTANCE.observe(distance)
+            if distance <= max_distance:
+                plan = self._personalize(schedule_id, owner_name, user, equipment)
+
+        self.lookups += 1
+        self.matches += plan is not None
+        record_cache('profile_neighbour', plan is not None)
+        print(f"Plan reuse: {'match' if plan else 'miss'} "
+              f"(distance={result[0] if result else 'n/a'}, "
+              f"rate={self.matches}/{self.lookups})")
+        return plan
+
+    def _personalize(self, schedule_id, owner_name, user, equipment):
+        from models import WorkoutSchedule
+        schedule = WorkoutSchedule.query.get(schedule_id)
+        text = schedule.plan_text if schedule is not None else None
+        if not text:
+            return None
+        # Header only, so exercise names containing the owner's name stay intact
+        text = replace_name(text, owner_name, user.name)
+        if not validate_plan(text, equipment)['valid']:
+            return None
+        return text
+
+
+profile_index = ProfileIndex()
@@ -0,0 +1,202 @@
+"""
+Opt-in request profiling for production diagnosis
+
+Disabled unless PROFILE_TOKEN or PROFILE_SAMPLE_RATE is set, in which case
+no hooks are registered and requests run untouched.
+
+- Admin trigger: send `X-Profile: <PROFILE_TOKEN>` (or `?profile=<token>`)
+  to run one request under cProfile; add `X-Profile-Mode: sample` to use
+  the stack sampler instead.
+- Background mode: PROFILE_SAMPLE_RATE=0.01 samples 1% of requests with the
+  stack sampler.
+- Output goes to PROFILE_DIR, keeping the newest PROFILE_MAX_FILES files.
+"""
+
+import cProfile
+import hmac
+import io
+import itertools
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from flask import g, request, jsonify, abort
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 200))
+SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005))
+
+_sequence = itertools.count()  # per-process uniquifier for profile file names
+
+
+class StackSampler:
+    """Sample one thread's Python stack on a timer into collapsed-stack counts"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def collapsed(self):
+        """Return samples in Brendan Gregg's collapsed-stack text format"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# ======================================================
+# ROTATING ON-DISK STORE
+# ======================================================
+
+def _save(route, suffix, writer):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = route.strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'index'
+    # pid + counter: gunicorn workers and threads can finish profiles in the same millisecond
+    name = (f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}"
+            f"-{os.getpid()}-{next(_sequence):06d}-{slug}.{suffix}")
+    writer(os.path.join(PROFILE_DIR, name))
+    _rotate()
+    return name
+
+
+def _rotate():
+    files = list_profiles()
+    for name in files[PROFILE_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass
+
+
+def list_profiles():
+    """Stored profile file names, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = [n for n in os.listdir(PROFILE_DIR) if n.endswith(('.prof', '.collapsed'))]
+    return sorted(names, reverse=True)
+
+
+def top_functions(name, limit=25):
+    """Top functions by cumulative time (cProfile) or inclusive samples (sampler)"""
+    path = os.path.join(PROFILE_DIR, os.path.basename(name))
+    if name.endswith('.prof'):
+        stats = pstats.Stats(path, stream=io.StringIO())
+        rows = []
+        for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+            rows.append({
+                'function': f"{os.path.basename(filename)}:{line}:{func}",
+                'calls': nc,
+                'total_time': round(tt, 6),
+                'cumulative_time': round(ct, 6)
+            })
+        rows.sort(key=lambda r: r['cumulative_time'], reverse=True)
+        return rows[:limit]
+
+    inclusive = Counter()
+    total = 0
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            count = int(count)
+            total += count
+            for frame in set(stack.split(';')):
+                inclusive[frame] += count
+    return [
+        {'function': frame, 'samples': count, 'percent': round(100.0 * count / total, 2)}
+        for frame, count in inclusive.most_common(limit)
+    ]
+
+
+# ======================================================
+# FLASK INTEGRATION
+# ======================================================
+
+def _is_admin(token):
+    supplied = request.headers.get('X-Profile') or request.args.get('profile')
+    return bool(token) and bool(supplied) and hmac.compare_digest(supplied.encode(), token.encode())
+
+
+def _requested_mode(token):
+    if _is_admin(token):
+        return request.headers.get('X-Profile-Mode', 'cprofile')
+    return None
+
+
+def init_profiler(app):
+    """Register profiling hooks and viewer routes when profiling is configured"""
+    token = os.getenv('PROFILE_TOKEN')
+    sample_rate = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+    if not token and sample_rate <= 0:
+        return
+
+    @app.before_request
+    def _start_profile():
+        mode = _requested_mode(token)
+        if mode is None and sample_rate > 0 and random.random() < sample_rate:
+            mode = 'sample'
+        if mode == 'sample':
+            g.profiler = StackSampler(threading.get_ident())
+            g.profiler.start()
+        elif mode is not None:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.teardown_request
+    def _stop_profile(exc):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        try:
+            if isinstance(profiler, StackSampler):
+                profiler.stop()
+                text = profiler.collapsed()
+
+                def write(path):
+                    with open(path, 'w') as f:
+                        f.write(text)
+                _save(route, 'collapsed', write)
+            else:
+                profiler.disable()
+                _save(route, 'prof', profiler.dump_stats)
+        except Exception as e:
+            print(f"Profile save failed: {str(e)}")
+
+    @app.route('/admin/profiles')
+    def profile_list():
+        """List stored profiles (admin only)"""
+        if not _is_admin(token):
+            abort(404)
+        return jsonify({'profiles': list_profiles()})
+
+    @app.route('/admin/profiles/<name>')
+    def profile_view(name):
+        """Top cumulative functions for one stored profile (admin only)"""
+        if not _is_admin(token):
+            abort(404)
+        if os.path.basename(name) not in list_profiles():
+            abort(404)
+        limit = request.args.get('limit', 25, type=int)
+        return jsonify({'profile': name, 'top': top_functions(name, limit)})
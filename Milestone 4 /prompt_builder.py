@@ -2,18 +2,18 @@
 Build structured prompts for AI workout generation
 """
 
+GOAL_FOCUS = {
+    'weight_loss': 'HIIT, cardio, and circuits',
+    'muscle_gain': 'progressive overload, hypertrophy',
+    'strength': 'compound lifts, power movements',
+    'endurance': 'higher reps, shorter rest',
+    'general': 'balanced approach'
+}
+
 def build_workout_prompt(user, goal, level, equipment):
     """Build a structured prompt for workout generation"""
     
-    goal_focus = {
-        'weight_loss': 'HIIT, cardio, and circuits',
-        'muscle_gain': 'progressive overload, hypertrophy',
-        'strength': 'compound lifts, power movements',
-        'endurance': 'higher reps, shorter rest',
-        'general': 'balanced approach'
-    }
-    
-    focus = goal_focus.get(goal, goal_focus['general'])
+    focus = GOAL_FOCUS.get(goal, GOAL_FOCUS['general'])
     
     return f"""Create a 5-day workout schedule for {user.name}.
 
@@ -34,3 +34,63 @@ DAY 1: [Focus]
 5. [Exercise] - [sets]x[reps]
 
 Repeat for DAYS 2-5. Make each day different."""
+
+
+def build_json_workout_prompt(user, goal, level, equipment):
+    """Build a prompt asking for the plan as compact JSON (see plan_json.py)"""
+    
+    focus = GOAL_FOCUS.get(goal, GOAL_FOCUS['general'])
+    
+    return f"""Create a 5-day workout schedule.
+Age {user.age}, {user.weight}kg, {user.height}cm | Level: {level} | Goal: {goal} - {focus} | Equipment: {equipment}
+
+Reply with minified JSON only, no markdown or commentary, in exactly this shape:
+{{"days":[{{"focus":"Upper Body","exercises":[["Push-up",3,"10-12"],["Plank",3,"30 sec"]]}}]}}
+5 days, 5 exercises per day as [name, sets, reps], each day different."""
+
+
+def build_day_prompt(user, goal, level, equipment, day_number, current_day, previous_day=None, next_day=None, exercise_number=None):
+    """Build a small targeted prompt to rewrite one day (or one exercise) of a plan"""
+    
+    focus = GOAL_FOCUS.get(goal, GOAL_FOCUS['general'])
+    context = "\n\n".join(day for day in (previous_day, next_day) if day)
+    
+    if exercise_number is not None:
+        task = f"""Replace ONLY exercise {exercise_number} of DAY {day_number} with a different exercise for the same muscle group.
+Reply with a single line in the form:
+{exercise_number}. [Exercise] - [sets]x[reps]"""
+    else:
+        task = f"""Rewrite DAY {day_number} with different exercises that keep the same focus and do not repeat the neighbouring days.
+Reply with only the day, in the form:
+DAY {day_number}: [Focus]
+1. [Exercise] - [sets]x[reps]
+2. [Exercise] - [sets]x[reps]
+3. [Exercise] - [sets]x[reps]
+4. [Exercise] - [sets]x[reps]
+5. [Exercise] - [sets]x[reps]"""
+    
+    return f"""Age: {user.age} | Level: {level} | Goal: {goal} - {focus} | Equipment: {equipment}
+
+CURRENT DAY {day_number}:
+{current_day}
+
+NEIGHBOURING DAYS (for context, do not change):
+{context or 'None'}
+
+{task}"""
+
+
+PLAN_DELIMITER = "=== PLAN {index} ==="
+
+def build_batch_prompt(prompts):
+    """Pack several single-user prompts into one multi-plan request"""
+    sections = []
+    for index, prompt in enumerate(prompts, start=1):
+        sections.append(f"{PLAN_DELIMITER.format(index=index)}\n{prompt}")
+    
+    return f"""You will write {len(prompts)} separate workout plans, one per request below.
+
+Start each plan with its header line exactly as given (for example "{PLAN_DELIMITER.format(index=1)}"),
+then the plan in the requested format. Do not add any text between plans.
+
+""" + "\n\n".join(sections)
\ No newline at end of file
@@ -0,0 +1,153 @@
+"""
+Incremental regeneration of a single day or exercise in a stored plan
+"""
+
+import os
+import random
+from exercise_catalog import BY_NAME, parse_equipment, substitutes
+from plan_validator import DAY_PATTERN, EXERCISE_PATTERN, EXERCISES_PER_DAY, PlanValidator
+from prompt_builder import build_day_prompt
+from workout_engine import build_local_plan, plan_seed
+
+DAY_MAX_TOKENS = 350
+EXERCISE_MAX_TOKENS = 60
+
+
+def split_days(text):
+    """
+    Split plan text into (preamble, {day number: day block}, order).
+    Each day block runs from its DAY heading up to the next heading.
+    """
+    lines = text.split('\n')
+    preamble, days, order = [], {}, []
+    current = None
+    for line in lines:
+        match = DAY_PATTERN.match(line)
+        if match and int(match.group(1)) not in days:
+            current = int(match.group(1))
+            days[current] = [line]
+            order.append(current)
+        elif current is None:
+            preamble.append(line)
+        else:
+            days[current].append(line)
+    return '\n'.join(preamble), {d: '\n'.join(block).rstrip('\n') for d, block in days.items()}, order
+
+
+def join_days(preamble, days, order):
+    """Inverse of split_days"""
+    blocks = [preamble.rstrip('\n')] if preamble.strip() else []
+    blocks.extend(days[d] for d in order)
+    return '\n\n'.join(blocks) + '\n'
+
+
+def _ask_model(prompt, max_tokens):
+    from model_api import MODELS, request_completion
+    groq_key = os.getenv('GROQ_API_KEY')
+    for model in MODELS:
+        try:
+            return request_completion(model, prompt, groq_key, max_tokens=max_tokens, timeout=10)
+        except Exception as e:
+            print(f"Model {model} failed (day regeneration): {str(e)}")
+    return None
+
+
+def _valid_day(text, day_number, equipment):
+    """Extract and check a single regenerated day block"""
+    if not text:
+        return None
+    _, days, _ = split_days(text.strip())
+    block = days.get(day_number)
+    if block is None:
+        return None
+    validator = PlanValidator(equipment)
+    validator.feed(block)
+    validator.finish()
+    exercises = validator.days.get(day_number, [])
+    if (len(exercises) < EXERCISES_PER_DAY or validator.equipment_violations
+            or sum(1 for _, p in exercises if p) < len(exercises) - 1):
+        return None
+    return block
+
+
+def _local_day(user, goal, level, equipment, day_number, avoid):
+    """Pick a fresh version of the day from the local engine"""
+    base = plan_seed(user, goal, level, equipment)
+    for attempt in range(1, 6):
+        _, days, _ = split_days(build_local_plan(user, goal, level, equipment, seed=base + attempt))
+        block = days.get(day_number)
+        if block and block != avoid:
+            return block
+    return avoid
+
+
+def _exercise_lines(block):
+    return [i for i, line in enumerate(block.split('\n')) if EXERCISE_PATTERN.match(line)]
+
+
+def _local_exercise(line, number, equipment, level, used):
+    """Swap an exercise for a catalog substitute with the same prescription"""
+    body = EXERCISE_PATTERN.match(line).group(2)
+    name, sep, rest = body.partition(' - ')
+    exercise = BY_NAME.get(name.strip().lower())
+    if exercise is None:
+        return None
+    available, _ = parse_equipment(equipment)
+    options = [e for e in substitutes(exercise.name, available, level) if e.name.lower() not in used]
+    if not options:
+        return None
+    choice = random.choice(options)
+    return f"{number}. {choice.name}{sep}{rest}"
+
+
+def regenerate_day(schedule_text, day_number, user, goal, level, equipment, exercise_number=None,
+                   use_model=True):
+    """
+    Regenerate one day (or one exercise within it) and splice it back.
+    With use_model=False (e.g. token quota spent) only the local engine is used.
+    Returns the updated plan text, or raises ValueError if the day or exercise is
+    missing or no substitute exercise is available.
+    """
+    preamble, days, order = split_days(schedule_text)
+    if day_number not in days:
+        raise ValueError(f"DAY {day_number} not found in plan")
+
+    current = days[day_number]
+    index = order.index(day_number)
+    previous_day = days[order[index - 1]] if index > 0 else None
+    next_day = days[order[index + 1]] if index + 1 < len(order) else None
+
+    prompt = build_day_prompt(user, goal, level, equipment, day_number, current,
+                              previous_day, next_day, exercise_number)
+
+    if exercise_number is None:
+        reply = _ask_model(prompt, DAY_MAX_TOKENS) if use_model else None
+        block = _valid_day(reply, day_number, equipment)
+        days[day_number] = block or _local_day(user, goal, level, equipment, day_number, current)
+        return join_days(preamble, days, order)
+
+    lines = current.split('\n')
+    positions = _exercise_lines(current)
+    if not 1 <= exercise_number <= len(positions):
+        raise ValueError(f"DAY {day_number} has no exercise {exercise_number}")
+    position = positions[exercise_number - 1]
+
+    used = {EXERCISE_PATTERN.match(lines[i]).group(2).partition(' - ')[0].strip().lower() for i in positions}
+    replacement = None
+    reply = _ask_model(prompt, EXERCISE_MAX_TOKENS) if use_model else None
+    for line in (reply or '').strip().split('\n'):
+        match = EXERCISE_PATTERN.match(line)
+        if match:
+            validator = PlanValidator(equipment)
+            validator.feed(f"DAY {day_number}\n{exercise_number}. {match.group(2)}\n")
+            validator.finish()
+            if not validator.equipment_violations:
+                replacement = f"{exercise_number}. {match.group(2).strip()}"
+            break
+    if replacement is None:
+        replacement = _local_exercise(lines[position], exercise_number, equipment, level, used)
+    if replacement is None:
+        raise ValueError(f"No substitute available for exercise {exercise_number} of DAY {day_number}")
+    lines[position] = replacement
+    days[day_number] = '\n'.join(lines)
+    return join_days(preamble, days, order)
@@ -0,0 +1,327 @@
+"""
+Training-day reminder emails driven by an in-process hierarchical timing wheel
+
+Saving a plan (REMINDERS_ENABLED=true) creates one reminder per plan day at
+REMINDER_HOUR UTC on the following days. Instead of polling users, one
+worker holds a lease row in scheduler_leases and runs the wheel:
+
+- reminders due within REMINDER_HORIZON_HOURS are loaded into the wheel
+  with one indexed range query (status, due_at), and the range is
+  re-checked every RELOAD_SECONDS for reminders saved by other workers;
+- adding a reminder and firing a tick are O(1); each coarser level holds
+  64x the span of the one below and cascades a single bucket downwards
+  when the finer level wraps;
+- fired reminders are claimed in batches (UPDATE ... status = 'sent' WHERE
+  status = 'pending', committed before any email goes out), sent through
+  email_utils, and the lease's cursor is advanced to the batch's latest
+  due time, so a restarted or new leader neither re-sends nor re-scans
+  what was already dispatched.
+
+Other workers retry the lease every LEASE_SECONDS / 3 and take over when it
+expires. Reminders more than REMINDER_MAX_LATE_MINUTES overdue (e.g. after
+downtime) are marked skipped instead of sent.
+"""
+
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from metrics import Counter
+
+REMINDERS_ENABLED = os.getenv('REMINDERS_ENABLED', 'false').lower() == 'true'
+REMINDER_HOUR = int(os.getenv('REMINDER_HOUR', 7))  # UTC
+REMINDER_BATCH = int(os.getenv('REMINDER_BATCH', 50))
+REMINDER_HORIZON_HOURS = int(os.getenv('REMINDER_HORIZON_HOURS', 24))
+REMINDER_MAX_LATE_MINUTES = int(os.getenv('REMINDER_MAX_LATE_MINUTES', 120))
+
+LEASE_NAME = 'reminders'
+LEASE_SECONDS = 30
+RELOAD_SECONDS = 60
+PLAN_DAYS = 5
+
+REMINDERS_SENT = Counter(
+    'fitplan_reminders_total', 'Reminder dispatch outcomes', ('outcome',))
+
+
+# ======================================================
+# TIMING WHEEL
+# ======================================================
+
+class TimingWheel:
+    """Hierarchical timing wheel: O(1) add, O(1) amortized per tick
+
+    Level L buckets span slots**L ticks. An entry is placed on the lowest
+    level whose range covers its delay; when a level's position reaches a
+    bucket boundary, the bucket is re-placed onto the finer levels.
+    """
+
+    def __init__(self, tick_seconds=1.0, slots=64, levels=4, now=None):
+        self.tick_seconds = tick_seconds
+        self.slots = slots
+        self.levels = levels
+        self.current = int((time.time() if now is None else now) // tick_seconds)
+        self._buckets = [[[] for _ in range(slots)] for _ in range(levels)]
+        self._overdue = []
+        self._count = 0
+
+    @property
+    def span_seconds(self):
+        return self.slots ** self.levels * self.tick_seconds
+
+    def __len__(self):
+        return self._count
+
+    def add(self, when, item):
+        """Schedule item for epoch time `when` (fires on the next advance if already due)"""
+        expiry = int(when // self.tick_seconds)
+        if expiry - self.current >= self.slots ** self.levels:
+            raise ValueError('Deadline is beyond the wheel span')
+        self._count += 1
+        self._place(expiry, item)
+
+    def _place(self, expiry, item):
+        delay = expiry - self.current
+        if delay <= 0:
+            self._overdue.append(item)
+            return
+        for level in range(self.levels):
+            if delay < self.slots ** (level + 1):
+                size = self.slots ** level
+                self._buckets[level][(expiry // size) % self.slots].append((expiry, item))
+                return
+
+    def advance(self, now=None):
+        """Move the wheel to `now` and return the items that came due, in tick order"""
+        target = int((time.time() if now is None else now) // self.tick_seconds)
+        fired, self._overdue = self._overdue, []
+        while self.current < target:
+            self.current += 1
+            for level in range(self.levels - 1, 0, -1):
+                size = self.slots ** level
+                if self.current % size == 0:
+                    index = (self.current // size) % self.slots
+                    bucket, self._buckets[level][index] = self._buckets[level][index], []
+                    for expiry, item in bucket:
+                        self._place(expiry, item)
+                    fired.extend(self._overdue)
+                    self._overdue = []
+            index = self.current % self.slots
+            bucket, self._buckets[0][index] = self._buckets[0][index], []
+            fired.extend(item for _, item in bucket)
+        self._count -= len(fired)
+        return fired
+
+
+# ======================================================
+# CREATING REMINDERS
+# ======================================================
+
+def plan_day_times(saved_at):
+    """UTC reminder time of each plan day (1..PLAN_DAYS): REMINDER_HOUR on the following days"""
+    first = saved_at.replace(hour=REMINDER_HOUR, minute=0, second=0, microsecond=0)
+    if first <= saved_at:
+        first += timedelta(days=1)
+    return [first + timedelta(days=day) for day in range(PLAN_DAYS)]
+
+
+def schedule_reminders(db, workout_schedule, now=None):
+    """Replace the user's pending reminders with one per day of this plan; the caller commits"""
+    from models import Reminder
+    now = now or datetime.utcnow()
+    Reminder.query.filter_by(user_id=workout_schedule.user_id, status='pending')\
+        .update({'status': 'cancelled'}, synchronize_session=False)
+
+    reminders = [Reminder(user_id=workout_schedule.user_id, schedule_id=workout_schedule.id,
+                          day=day, due_at=due_at)
+                 for day, due_at in enumerate(plan_day_times(now), start=1)]
+    db.session.add_all(reminders)
+    return reminders
+
+
+# ======================================================
+# SCHEDULER
+# ======================================================
+
+def _epoch(moment):
+    return (moment - datetime(1970, 1, 1)).total_seconds()
+
+
+class ReminderScheduler:
+    """Lease-holding reminder dispatcher; one instance per process, one active leader overall"""
+
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.leader = False
+        self.wheel = None
+        self._scheduled = set()  # reminder ids in the wheel
+        self._cursor = None
+        self._lock = threading.Lock()  # wheel access from request threads (publish)
+        self._lease_checked = self._reloaded = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='reminder-scheduler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    self.step()
+                except Exception as e:
+                    self.db.session.rollback()
+                    print(f"Reminder scheduler error: {str(e)}")
+                finally:
+                    self.db.session.remove()
+            self._stop.wait(1.0)
+
+    def step(self, now=None):
+        """One scheduler iteration: keep the lease, refill the wheel, dispatch what is due"""
+        now = now or datetime.utcnow()
+        clock = time.monotonic()
+        if clock - self._lease_checked >= LEASE_SECONDS / 3:
+            self._lease_checked = clock
+            was_leader = self.leader
+            self.leader = self._renew_lease(now)
+            with self._lock:
+                if self.leader and not was_leader:
+                    print(f"Reminder scheduler: {self.owner} took the lease")
+                    self.wheel = TimingWheel(now=_epoch(now))
+                    self._scheduled.clear()
+                    self._reloaded = 0.0
+                elif not self.leader:
+                    self.wheel = None
+        if not self.leader:
+            return 0
+
+        if clock - self._reloaded >= RELOAD_SECONDS:
+            self._reloaded = clock
+            self._load(now)
+        with self._lock:
+            due = self.wheel.advance(_epoch(now))
+            self._scheduled.difference_update(due)
+        sent = 0
+        for start in range(0, len(due), REMINDER_BATCH):
+            sent += self._dispatch(due[start:start + REMINDER_BATCH], now)
+        return sent
+
+    def _renew_lease(self, now):
+        from models import SchedulerLease
+        lease = {SchedulerLease.owner: self.owner, SchedulerLease.expires_at: now + timedelta(seconds=LEASE_SECONDS)}
+        updated = SchedulerLease.query\
+            .filter(SchedulerLease.name == LEASE_NAME,
+                    (SchedulerLease.owner == self.owner) | (SchedulerLease.expires_at < now))\
+            .update(lease, synchronize_session=False)
+        if not updated:
+            if SchedulerLease.query.get(LEASE_NAME) is not None:
+                self.db.session.rollback()
+                return False
+            try:
+                with self.db.session.begin_nested():
+                    self.db.session.add(SchedulerLease(name=LEASE_NAME, owner=self.owner,
+                                                       expires_at=lease[SchedulerLease.expires_at]))
+            except IntegrityError:
+                self.db.session.rollback()
+                return False
+        self.db.session.commit()
+        self._cursor = SchedulerLease.query.get(LEASE_NAME).cursor
+        return True
+
+    def _load(self, now):
+        """Add pending reminders due before the horizon (and after the cursor) to the wheel"""
+        from models import Reminder
+        query = Reminder.query\
+            .filter(Reminder.status == 'pending',
+                    Reminder.due_at <= now + timedelta(hours=REMINDER_HORIZON_HOURS))
+        if self._cursor is not None:
+            query = query.filter(Reminder.due_at > self._cursor - timedelta(minutes=REMINDER_MAX_LATE_MINUTES))
+        rows = query.with_entities(Reminder.id, Reminder.due_at).order_by(Reminder.due_at).all()
+        self.db.session.commit()
+        added = 0
+        with self._lock:
+            for reminder_id, due_at in rows:
+                if reminder_id not in self._scheduled:
+                    self._scheduled.add(reminder_id)
+                    self.wheel.add(_epoch(due_at), reminder_id)
+                    added += 1
+        if added:
+            print(f"Reminder scheduler: {added} reminder(s) loaded, {len(self.wheel)} pending")
+        return added
+
+    def _dispatch(self, reminder_ids, now):
+        """Claim a batch (committed before sending, so it is never sent twice), then email it"""
+        from models import Reminder, SchedulerLease, User, WorkoutSchedule
+        from email_utils import send_reminder_email
+
+        # Claim first and read back only what this claim (sent_at = now) won, so a
+        # leader that lost its lease mid-batch cannot send the same reminders
+        late = now - timedelta(minutes=REMINDER_MAX_LATE_MINUTES)
+        pending = Reminder.query.filter(Reminder.id.in_(reminder_ids), Reminder.status == 'pending')
+        skipped = pending.filter(Reminder.due_at < late)\
+            .update({'status': 'skipped'}, synchronize_session=False)
+        pending.update({'status': 'sent', 'sent_at': now}, synchronize_session=False)
+        rows = Reminder.query\
+            .join(User, User.id == Reminder.user_id)\
+            .join(WorkoutSchedule, WorkoutSchedule.id == Reminder.schedule_id)\
+            .filter(Reminder.id.in_(reminder_ids), Reminder.status == 'sent', Reminder.sent_at == now)\
+            .with_entities(Reminder.id, Reminder.day, Reminder.due_at, User.email, User.name, WorkoutSchedule.goal)\
+            .all()
+        latest = max([row.due_at for row in rows], default=None)
+        if latest and (self._cursor is None or latest > self._cursor):
+            self._cursor = latest
+            SchedulerLease.query.filter_by(name=LEASE_NAME, owner=self.owner)\
+                .update({'cursor': latest}, synchronize_session=False)
+        self.db.session.commit()
+        if skipped:
+            REMINDERS_SENT.inc('skipped', amount=skipped)
+
+        failed = []
+        for row in rows:
+            goal = (row.goal or 'training').replace('_', ' ')
+            if send_reminder_email(row.email, row.name, row.day, goal):
+                REMINDERS_SENT.inc('sent')
+            else:
+                REMINDERS_SENT.inc('failed')
+                failed.append(row.id)
+        if failed:
+            Reminder.query.filter(Reminder.id.in_(failed))\
+                .update({'status': 'failed'}, synchronize_session=False)
+            self.db.session.commit()
+        return len(rows) - len(failed)
+
+    def publish(self, reminders):
+        """Add reminders committed by this process straight to the wheel when it is the leader"""
+        horizon = datetime.utcnow() + timedelta(hours=REMINDER_HORIZON_HOURS)
+        with self._lock:
+            if not self.leader or self.wheel is None:
+                return
+            for reminder in reminders:
+                if reminder.due_at <= horizon and reminder.id not in self._scheduled:
+                    self._scheduled.add(reminder.id)
+                    self.wheel.add(_epoch(reminder.due_at), reminder.id)
+
+
+reminder_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def init_reminders(app, db):
+    """Start the scheduler thread lazily in each worker (after gunicorn forks)"""
+    if not REMINDERS_ENABLED:
+        return
+
+    @app.before_request
+    def _start_reminder_scheduler():
+        global reminder_scheduler
+        if reminder_scheduler is None:
+            with _scheduler_lock:
+                if reminder_scheduler is None:
+                    reminder_scheduler = ReminderScheduler(app, db)
+                    reminder_scheduler.start()
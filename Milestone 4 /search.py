@@ -0,0 +1,192 @@
+"""
+Full-text search over a user's saved schedules and workout logs
+
+Each schedule and log gets one search_documents row holding its title and
+the exercise names parsed from its text. The row is written in the same
+transaction as the schedule / log (logs by exercise_sets.record_logs, the
+write path of POST /log-workout), so the index is always current. The
+inverted index lives in the database (created with the table, see
+database.py):
+
+- PostgreSQL: GIN index on to_tsvector('english', body), queried with
+  websearch_to_tsquery and ranked by ts_rank_cd;
+- SQLite: FTS5 external-content table (porter stemming) kept in sync by
+  triggers, ranked by bm25.
+
+Other databases fall back to a LIKE scan.
+
+    python search.py reindex    # index schedules and logs saved before this existed
+"""
+
+import re
+from datetime import datetime
+from sqlalchemy import and_, exists, func, literal_column, text
+
+MAX_PER_PAGE = 50
+SNIPPET_WORDS = 12
+TS_CONFIG = literal_column("'english'")  # must match the GIN index expression
+
+
+def exercise_names(exercise_text):
+    """Distinct exercise names, in order of appearance, from plan or log text"""
+    from exercise_sets import parse_exercises
+    names = []
+    for name, _ in parse_exercises(exercise_text):
+        if name.lower() not in (n.lower() for n in names):
+            names.append(name)
+    return names
+
+
+def document_body(title, exercise_text):
+    """Searchable text: title line plus one exercise name per line (raw text if none parse)"""
+    names = exercise_names(exercise_text)
+    lines = [title or ''] + (names or [exercise_text or ''])
+    return '\n'.join(line for line in lines if line.strip())
+
+
+def _upsert(db, kind, ref_id, user_id, title, body, created_at=None):
+    from models import SearchDocument
+    document = SearchDocument.query.filter_by(kind=kind, ref_id=ref_id).first()
+    if document is None:
+        document = SearchDocument(kind=kind, ref_id=ref_id, user_id=user_id, created_at=created_at)
+        db.session.add(document)
+    document.title = (title or '')[:200]
+    document.body = body
+    return document
+
+
+def schedule_title(workout_schedule):
+    parts = [workout_schedule.goal, workout_schedule.level, workout_schedule.equipment]
+    return ' · '.join(str(part).replace('_', ' ').title() for part in parts if part) + ' plan'
+
+
+def index_schedule(db, workout_schedule, plan_text):
+    """Index (or re-index) a flushed WorkoutSchedule; the caller commits"""
+    title = schedule_title(workout_schedule)
+    return _upsert(db, 'schedule', workout_schedule.id, workout_schedule.user_id, title,
+                   document_body(title, plan_text), workout_schedule.created_at)
+
+
+def index_log(db, log):
+    """Index a flushed WorkoutLog; the caller (exercise_sets.record_logs) commits"""
+    title = log.workout_name or 'Workout'
+    created_at = datetime.combine(log.date, datetime.min.time()) if log.date else None
+    return _upsert(db, 'log', log.id, log.user_id, title, document_body(title, log.exercises), created_at)
+
+
+# ======================================================
+# QUERY
+# ======================================================
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())[:16]
+
+
+def _result(row, rank, snippet):
+    created_at = row.created_at
+    if isinstance(created_at, str):  # raw SQL on SQLite returns the stored text
+        created_at = datetime.fromisoformat(created_at)
+    return {
+        'kind': row.kind,
+        'id': row.ref_id,
+        'title': row.title,
+        'snippet': snippet,
+        'date': created_at.strftime('%Y-%m-%d') if created_at else None,
+        'rank': round(float(rank or 0), 4),
+    }
+
+
+def _search_postgres(db, user_id, query, offset, limit):
+    from models import SearchDocument
+    tsquery = func.websearch_to_tsquery(TS_CONFIG, query)
+    vector = func.to_tsvector(TS_CONFIG, SearchDocument.body)
+    rank = func.ts_rank_cd(vector, tsquery)
+    snippet = func.ts_headline(TS_CONFIG, SearchDocument.body, tsquery,
+                               f'MaxWords={SNIPPET_WORDS}, MinWords=3, StartSel=[, StopSel=]')
+    matches = SearchDocument.query.filter(SearchDocument.user_id == user_id, vector.op('@@')(tsquery))
+    total = matches.count()
+    rows = matches.with_entities(SearchDocument, rank, snippet)\
+        .order_by(rank.desc(), SearchDocument.created_at.desc())\
+        .offset(offset).limit(limit).all()
+    return total, [_result(doc, r, s) for doc, r, s in rows]
+
+
+def _search_sqlite(db, user_id, query, offset, limit):
+    match = ' '.join(f'"{term}"' for term in _terms(query))
+    if not match:
+        return 0, []
+    params = {'match': match, 'user_id': user_id, 'limit': limit, 'offset': offset}
+    total = db.session.execute(text(
+        "SELECT count(*) FROM search_fts JOIN search_documents d ON d.id = search_fts.rowid "
+        "WHERE search_fts MATCH :match AND d.user_id = :user_id"), params).scalar()
+    rows = db.session.execute(text(
+        f"SELECT d.kind, d.ref_id, d.title, d.created_at, -bm25(search_fts) AS rank, "
+        f"snippet(search_fts, 0, '[', ']', '…', {SNIPPET_WORDS}) AS snippet "
+        "FROM search_fts JOIN search_documents d ON d.id = search_fts.rowid "
+        "WHERE search_fts MATCH :match AND d.user_id = :user_id "
+        "ORDER BY bm25(search_fts), d.created_at DESC LIMIT :limit OFFSET :offset"), params).all()
+    return total, [_result(row, row.rank, row.snippet) for row in rows]
+
+
+def _search_like(db, user_id, query, offset, limit):
+    from models import SearchDocument
+    matches = SearchDocument.query.filter_by(user_id=user_id)
+    for term in _terms(query):
+        matches = matches.filter(SearchDocument.body.ilike(f'%{term}%'))
+    total = matches.count()
+    rows = matches.order_by(SearchDocument.created_at.desc()).offset(offset).limit(limit).all()
+    return total, [_result(doc, 0, doc.body.split('\n', 1)[-1][:120]) for doc in rows]
+
+
+def search(db, user_id, query, page=1, per_page=20):
+    """One page of a user's schedules and logs matching the query, best match first"""
+    page = max(int(page), 1)
+    per_page = min(max(int(per_page), 1), MAX_PER_PAGE)
+    offset = (page - 1) * per_page
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        total, results = _search_postgres(db, user_id, query, offset, per_page)
+    elif dialect == 'sqlite':
+        total, results = _search_sqlite(db, user_id, query, offset, per_page)
+    else:
+        total, results = _search_like(db, user_id, query, offset, per_page)
+    return {'results': results, 'total': total, 'page': page, 'per_page': per_page}
+
+
+# ======================================================
+# REINDEX (rows saved before search existed)
+# ======================================================
+
+def reindex(db, batch_size=500):
+    """Index every schedule and log that has no search document yet, in primary-key batches"""
+    from models import SearchDocument, WorkoutLog, WorkoutSchedule
+
+    for kind, model in (('schedule', WorkoutSchedule), ('log', WorkoutLog)):
+        last_id = done = 0
+        while True:
+            batch = model.query\
+                .filter(model.id > last_id,
+                        ~exists().where(and_(SearchDocument.kind == kind, SearchDocument.ref_id == model.id)))\
+                .order_by(model.id).limit(batch_size).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for row in batch:
+                if kind == 'schedule':
+                    index_schedule(db, row, row.plan_text)
+                else:
+                    index_log(db, row)
+            db.session.commit()
+            done += len(batch)
+            print(f"  {kind}: {done} indexed")
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == 'reindex':
+        from app import app, db
+        with app.app_context():
+            db.create_all()
+            reindex(db)
+    else:
+        print('usage: python search.py reindex')
@@ -0,0 +1,111 @@
+"""
+Local stand-in for the Groq chat completions API
+
+Answers OpenAI-style /chat/completions requests (streaming or not) with plans
+from the local engine, including multi-plan batch prompts. Point the app at
+it for load tests and batching experiments:
+
+    python stub_model_server.py --port 8001 --latency 1.5
+    GROQ_API_URL=http://127.0.0.1:8001/v1/chat/completions python app.py
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from prompt_builder import PLAN_DELIMITER
+from workout_engine import build_local_plan
+
+PLAN_SPLIT_PATTERN = re.compile(r'^=== PLAN (\d+) ===$', re.MULTILINE)
+
+
+class _StubUser:
+    def __init__(self, name):
+        self.id = name
+        self.name = name
+
+
+def _field(prompt, label, default):
+    match = re.search(rf'^- {label}: ([^\n]+)$', prompt, re.MULTILINE)
+    return match.group(1).split(' - ')[0].strip() if match else default
+
+
+def plan_for_prompt(prompt):
+    """Answer one single-user prompt using the local engine"""
+    name = re.search(r'schedule for (.+?)\.', prompt)
+    user = _StubUser(name.group(1) if name else 'User')
+    return build_local_plan(
+        user,
+        _field(prompt, 'Goal', 'general'),
+        _field(prompt, 'Level', 'beginner'),
+        _field(prompt, 'Equipment', 'bodyweight')
+    )
+
+
+def answer(prompt):
+    """Answer a single or multi-plan prompt"""
+    parts = PLAN_SPLIT_PATTERN.split(prompt)
+    if len(parts) == 1:
+        return plan_for_prompt(prompt)
+    sections = []
+    for index, section in zip(parts[1::2], parts[2::2]):
+        sections.append(f"{PLAN_DELIMITER.format(index=index)}\n{plan_for_prompt(section)}")
+    return "\n\n".join(sections)
+
+
+def make_handler(latency, fail_rate):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            if random.random() < fail_rate:
+                self.send_error(503, 'Stub failure')
+                return
+
+            text = answer(body['messages'][-1]['content'])
+            usage = {'prompt_tokens': len(str(body['messages'])) // 4,
+                     'completion_tokens': len(text) // 4}
+            usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+
+            if not body.get('stream'):
+                time.sleep(latency)
+                payload = json.dumps({
+                    'model': body.get('model'),
+                    'choices': [{'message': {'role': 'assistant', 'content': text}}],
+                    'usage': usage
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            chunks = [text[i:i + 24] for i in range(0, len(text), 24)]
+            for chunk in chunks:
+                time.sleep(latency / max(len(chunks), 1))
+                event = {'choices': [{'delta': {'content': chunk}}]}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.write(f"data: {json.dumps({'choices': [], 'x_groq': {'usage': usage}})}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stub Groq chat completions server')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds per completion')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.latency, args.fail_rate))
+    print(f"Stub model server on http://127.0.0.1:{args.port}/v1/chat/completions")
+    server.serve_forever()
@@ -0,0 +1,174 @@
+"""
+Wearable time series (heart rate, steps) attached to workout logs
+
+Each series is one compact binary blob instead of one row per sample:
+
+    header | time deltas (omitted for a fixed sampling interval) | value deltas
+
+Deltas are stored in the narrowest integer type that holds them (1 Hz heart
+rate nearly always fits in int8), so an hour at 1 Hz is ~3.6 KB. Decoding
+wraps the blob with np.frombuffer over a memoryview (no copy) and restores
+absolute values with one cumulative sum. Summaries (average/max heart rate,
+seconds per heart-rate zone, total steps) are computed vectorized at ingest
+and stored on the WorkoutLog next to calories_burned.
+"""
+
+import struct
+import numpy as np
+from sqlalchemy import inspect, text
+
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<BBBxIqqq')  # version, time code, value code, count, t0 (ms), interval (ms, 0 = irregular), v0
+
+# Narrowest-first integer types, by one-byte code
+DTYPES = {1: np.dtype('<i1'), 2: np.dtype('<i2'), 4: np.dtype('<i4'), 8: np.dtype('<i8')}
+
+KINDS = ('heart_rate', 'steps')
+
+# Heart-rate zones as fractions of max HR (220 - age); zone 1 starts at 50%
+ZONE_BOUNDS = (0.5, 0.6, 0.7, 0.8, 0.9)
+DEFAULT_AGE = 30
+MAX_SAMPLE_GAP_S = 10  # longer gaps (watch off the wrist) do not count towards zones
+
+
+def _narrowest(deltas):
+    if not len(deltas):
+        return 1
+    low, high = int(deltas.min()), int(deltas.max())
+    for code, dtype in DTYPES.items():
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return code
+    return 8
+
+
+def encode_series(timestamps_ms, values):
+    """Delta-encode parallel arrays of epoch milliseconds and integer values into bytes"""
+    times = np.asarray(timestamps_ms, dtype=np.int64)
+    vals = np.rint(np.asarray(values, dtype=np.float64)).astype(np.int64)
+    if times.shape != vals.shape or times.ndim != 1 or not len(times):
+        raise ValueError('timestamps and values must be non-empty 1-D arrays of the same length')
+    if len(times) > 1 and np.any(np.diff(times) < 0):
+        order = np.argsort(times, kind='stable')
+        times, vals = times[order], vals[order]
+
+    time_deltas = np.diff(times)
+    value_deltas = np.diff(vals)
+    regular = len(time_deltas) > 0 and np.all(time_deltas == time_deltas[0])
+    interval = int(time_deltas[0]) if regular else 0
+    time_code = 0 if regular or not len(time_deltas) else _narrowest(time_deltas)
+    value_code = _narrowest(value_deltas)
+
+    parts = [HEADER.pack(FORMAT_VERSION, time_code, value_code, len(times),
+                         int(times[0]), interval, int(vals[0]))]
+    if time_code:
+        parts.append(time_deltas.astype(DTYPES[time_code]).tobytes())
+    parts.append(value_deltas.astype(DTYPES[value_code]).tobytes())
+    return b''.join(parts)
+
+
+def decode_series(blob):
+    """(timestamps ms, values) as int64 arrays; delta arrays are read without copying"""
+    view = memoryview(blob)
+    version, time_code, value_code, count, t0, interval, v0 = HEADER.unpack_from(view, 0)
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported series format {version}')
+    offset = HEADER.size
+
+    if time_code:
+        time_deltas = np.frombuffer(view, dtype=DTYPES[time_code], count=count - 1, offset=offset)
+        offset += time_deltas.nbytes
+        times = np.empty(count, dtype=np.int64)
+        times[0] = t0
+        np.cumsum(time_deltas, dtype=np.int64, out=times[1:])
+        times[1:] += t0
+    else:
+        times = t0 + interval * np.arange(count, dtype=np.int64)
+
+    value_deltas = np.frombuffer(view, dtype=DTYPES[value_code], count=count - 1, offset=offset)
+    values = np.empty(count, dtype=np.int64)
+    values[0] = v0
+    np.cumsum(value_deltas, dtype=np.int64, out=values[1:])
+    values[1:] += v0
+    return times, values
+
+
+# ======================================================
+# SUMMARIES (vectorized, computed once at ingest)
+# ======================================================
+
+def _sample_seconds(times):
+    """Seconds each sample covers (gap to the next one, capped)"""
+    if len(times) < 2:
+        return np.ones(len(times))
+    gaps = np.diff(times) / 1000.0
+    gaps = np.append(gaps, np.median(gaps))
+    gaps[gaps > MAX_SAMPLE_GAP_S] = 0
+    return gaps
+
+
+def heart_rate_summary(times, values, age=None):
+    """Average/max HR and seconds spent in zones 1-5"""
+    max_hr = 220 - (age or DEFAULT_AGE)
+    seconds = _sample_seconds(times)
+    zones = np.searchsorted(np.array(ZONE_BOUNDS) * max_hr, values, side='right')  # 0 = below zone 1
+    per_zone = np.bincount(zones, weights=seconds, minlength=len(ZONE_BOUNDS) + 1)[1:]
+    total = seconds.sum()
+    return {
+        'avg_heart_rate': int(round(float(np.average(values, weights=seconds) if total else values.mean()))),
+        'max_heart_rate': int(values.max()),
+        'hr_zones': ','.join(str(int(round(s))) for s in per_zone),
+    }
+
+
+def steps_summary(times, values):
+    return {'total_steps': int(values.sum())}
+
+
+def attach_series(db, log, kind, timestamps_ms, values, age=None):
+    """Store a series for a workout log and refresh the log's summary columns; the caller commits"""
+    from models import WorkoutSeries
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+
+    blob = encode_series(timestamps_ms, values)
+    times, vals = decode_series(blob)  # summarise exactly what was stored
+    summary = heart_rate_summary(times, vals, age) if kind == 'heart_rate' else steps_summary(times, vals)
+    for field, value in summary.items():
+        setattr(log, field, value)
+
+    WorkoutSeries.query.filter_by(log_id=log.id, kind=kind).delete(synchronize_session=False)
+    series = WorkoutSeries(log_id=log.id, kind=kind, samples=len(times),
+                           started_ms=int(times[0]), ended_ms=int(times[-1]), data=blob)
+    db.session.add(series)
+    return summary
+
+
+def ensure_schema(db):
+    """Add the summary columns to workout_logs on databases created before they existed
+
+    WorkoutLog maps these columns, so every query loading a log fails until
+    this has run; init_db() calls it, or run `python timeseries.py migrate`.
+    """
+    db.create_all()
+    columns = {c['name'] for c in inspect(db.engine).get_columns('workout_logs')}
+    added = {
+        'avg_heart_rate': 'INTEGER', 'max_heart_rate': 'INTEGER',
+        'hr_zones': 'VARCHAR(64)', 'total_steps': 'INTEGER',
+    }
+    with db.engine.begin() as conn:
+        for name, column_type in added.items():
+            if name not in columns:
+                conn.execute(text(f'ALTER TABLE workout_logs ADD COLUMN {name} {column_type}'))
+                print(f"Added workout_logs.{name}")
+
+
+if __name__ == '__main__':
+    import sys
+    if sys.argv[1:] == ['migrate']:
+        from app import app, db
+        with app.app_context():
+            ensure_schema(db)
+        print("workout_logs summary columns verified")
+    else:
+        print('usage: python timeseries.py migrate')
@@ -0,0 +1,216 @@
+"""
+Record/replay of outbound LLM and email traffic for reproducible benchmarks
+
+Record real provider traffic while exercising the app:
+
+    TRAFFIC_MODE=record TRAFFIC_FIXTURE=fixtures/traffic.jsonl.gz python app.py
+
+Every chat completion (model, prompt hash, status, streamed chunks with their
+arrival offsets) and every OTP email send (outcome, latency) is appended to a
+gzip-compressed JSON-lines fixture. Replay it later without any provider:
+
+    python traffic.py serve --fixture fixtures/traffic.jsonl.gz --scale 1.0
+    TRAFFIC_MODE=replay TRAFFIC_FIXTURE=fixtures/traffic.jsonl.gz \\
+        GROQ_API_URL=http://127.0.0.1:8002/v1/chat/completions python app.py
+
+The replay server answers completions with the recorded chunks at the recorded
+offsets (multiplied by --scale, 0 for no delay); in replay mode send_otp_email
+returns the recorded outcomes after the recorded (scaled) latency. Prompts not
+in the fixture get the next recording for the same model unless --strict.
+"""
+
+import argparse
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRAFFIC_MODE = os.getenv('TRAFFIC_MODE', '').lower()
+TRAFFIC_FIXTURE = os.getenv('TRAFFIC_FIXTURE', 'fixtures/traffic.jsonl.gz')
+REPLAY_LATENCY_SCALE = float(os.getenv('REPLAY_LATENCY_SCALE', 1.0))
+
+RECORDING = TRAFFIC_MODE == 'record'
+REPLAYING = TRAFFIC_MODE == 'replay'
+
+_write_lock = threading.Lock()
+
+
+def prompt_key(model, prompt):
+    """Stable lookup key for a completion request"""
+    return hashlib.sha256(f"{model}\n{prompt}".encode('utf-8')).hexdigest()[:32]
+
+
+def _append(record, path=None):
+    path = path or TRAFFIC_FIXTURE
+    line = json.dumps(record, separators=(',', ':')) + '\n'
+    with _write_lock:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Appending a new gzip member per line keeps the file valid across processes
+        with gzip.open(path, 'at', encoding='utf-8') as f:
+            f.write(line)
+
+
+def record_llm(model, prompt, max_tokens, status, chunks, latency):
+    """Record one completion; chunks is a list of (offset seconds, text)"""
+    _append({
+        'kind': 'llm',
+        'model': model,
+        'key': prompt_key(model, prompt),
+        'max_tokens': max_tokens,
+        'status': status,
+        'latency': round(latency, 4),
+        'chunks': [[round(offset, 4), text] for offset, text in chunks]
+    })
+
+
+def record_mail(success, latency):
+    """Record one outbound email (outcome only; no addresses or codes)"""
+    _append({'kind': 'mail', 'success': bool(success), 'latency': round(latency, 4)})
+
+
+def load_fixture(path=None):
+    """Read a fixture into {'llm': [...], 'mail': [...]}"""
+    recordings = {'llm': [], 'mail': []}
+    with gzip.open(path or TRAFFIC_FIXTURE, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                recordings.setdefault(record['kind'], []).append(record)
+    return recordings
+
+
+class _MailReplay:
+    """Cycles through recorded email outcomes"""
+
+    def __init__(self):
+        self._outcomes = None
+        self._lock = threading.Lock()
+
+    def send(self):
+        with self._lock:
+            if self._outcomes is None:
+                mail = load_fixture()['mail'] or [{'success': True, 'latency': 0}]
+                self._outcomes = itertools.cycle(mail)
+            record = next(self._outcomes)
+        time.sleep(record['latency'] * REPLAY_LATENCY_SCALE)
+        return record['success']
+
+
+mail_replay = _MailReplay()
+
+
+# ======================================================
+# REPLAY SERVER (Groq-compatible)
+# ======================================================
+
+class ReplayIndex:
+    """Recordings by prompt key, with a per-model rotation for unmatched prompts"""
+
+    def __init__(self, records, strict=False):
+        self.strict = strict
+        self.by_key = {}
+        by_model = {}
+        for record in records:
+            self.by_key.setdefault(record['key'], []).append(record)
+            by_model.setdefault(record['model'], []).append(record)
+        self._rotation = {model: itertools.cycle(items) for model, items in by_model.items()}
+        self._served = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, model, prompt):
+        key = prompt_key(model, prompt)
+        with self._lock:
+            matches = self.by_key.get(key)
+            if matches:
+                # Repeated identical prompts replay their recordings in order
+                n = self._served.get(key, 0)
+                self._served[key] = n + 1
+                return matches[n % len(matches)]
+            if self.strict or model not in self._rotation:
+                return None
+            return next(self._rotation[model])
+
+
+def make_handler(index, scale):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            record = index.lookup(body.get('model'), body['messages'][-1]['content'])
+            if record is None:
+                self.send_error(404, 'No recording for this prompt')
+                return
+            if record['status'] != 200:
+                time.sleep(record['latency'] * scale)
+                self.send_error(record['status'], 'Recorded failure')
+                return
+
+            if not body.get('stream'):
+                time.sleep(record['latency'] * scale)
+                text = ''.join(chunk for _, chunk in record['chunks'])
+                payload = json.dumps({
+                    'model': record['model'],
+                    'choices': [{'message': {'role': 'assistant', 'content': text}}]
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            started = time.perf_counter()
+            try:
+                for offset, chunk in record['chunks']:
+                    delay = offset * scale - (time.perf_counter() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+                    event = {'choices': [{'delta': {'content': chunk}}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client aborted the stream, as it did while recording
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def summarize(path):
+    recordings = load_fixture(path)
+    llm, mail = recordings['llm'], recordings['mail']
+    print(f"{path}: {len(llm)} completions, {len(mail)} emails")
+    for model in sorted({r['model'] for r in llm}):
+        latencies = sorted(r['latency'] for r in llm if r['model'] == model)
+        errors = sum(1 for r in llm if r['model'] == model and r['status'] != 200)
+        print(f"  {model}: {len(latencies)} calls, {errors} errors, "
+              f"p50 {latencies[len(latencies) // 2]:.2f}s, max {latencies[-1]:.2f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay recorded LLM traffic')
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help='Serve recorded completions on a Groq-compatible endpoint')
+    serve.add_argument('--fixture', default=TRAFFIC_FIXTURE)
+    serve.add_argument('--port', type=int, default=8002)
+    serve.add_argument('--scale', type=float, default=1.0, help='Latency multiplier (0 = no delay)')
+    serve.add_argument('--strict', action='store_true', help='404 on prompts not in the fixture')
+    summary = sub.add_parser('summary', help='Print per-model counts and latencies')
+    summary.add_argument('--fixture', default=TRAFFIC_FIXTURE)
+    args = parser.parse_args()
+
+    if args.command == 'summary':
+        summarize(args.fixture)
+    else:
+        index = ReplayIndex(load_fixture(args.fixture)['llm'], strict=args.strict)
+        server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(index, args.scale))
+        print(f"Replay server on http://127.0.0.1:{args.port}/v1/chat/completions "
+              f"({len(index.by_key)} prompts, latency x{args.scale})")
+        server.serve_forever()
@@ -0,0 +1,227 @@
+"""
+Per-user LLM token/cost accounting and daily quota enforcement
+
+Every completion's `usage` block (estimated from text length when a stream is
+aborted before it arrives) is attributed to the user(s) set with
+attribute_to() and accumulated in memory. Aggregates are upserted into the
+token_usage table (one row per user, day and model) at most every
+USAGE_FLUSH_SECONDS. allow() checks the daily quota against the in-memory
+counter, re-seeded from the table at most once per user per flush, so the
+check normally costs no query.
+"""
+
+import atexit
+import contextvars
+import hmac
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from flask import abort, jsonify, request
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from metrics import Counter
+
+DAILY_TOKEN_QUOTA = int(os.getenv('DAILY_TOKEN_QUOTA', 60000))  # 0 disables the quota
+USAGE_FLUSH_SECONDS = float(os.getenv('USAGE_FLUSH_SECONDS', 10))
+
+# USD per million (prompt, completion) tokens
+MODEL_PRICES = {
+    'llama-3.3-70b-versatile': (0.59, 0.79),
+    'llama-3.1-8b-instant': (0.05, 0.08),
+    'gemma2-9b-it': (0.20, 0.20),
+}
+
+TOKENS = Counter(
+    'fitplan_llm_tokens_total', 'LLM tokens consumed', ('model', 'kind'))
+QUOTA_REJECTIONS = Counter(
+    'fitplan_quota_rejections_total', 'Generations served locally because the daily token quota was spent')
+
+_attributed_users = contextvars.ContextVar('usage_users', default=())
+
+
+@contextmanager
+def attribute_to(*user_ids):
+    """Charge completions made inside the block to these users (split evenly)"""
+    token = _attributed_users.set(user_ids)
+    try:
+        yield
+    finally:
+        _attributed_users.reset(token)
+
+
+def parse_usage(payload):
+    """(prompt tokens, completion tokens) from a response or stream event, or None"""
+    usage = payload.get('usage') or (payload.get('x_groq') or {}).get('usage')
+    if not usage:
+        return None
+    return int(usage.get('prompt_tokens') or 0), int(usage.get('completion_tokens') or 0)
+
+
+def estimate_usage(prompt, text):
+    """Rough token counts (~4 characters per token) when no usage block arrived"""
+    return len(prompt) // 4, len(text) // 4
+
+
+def token_cost(model, prompt_tokens, completion_tokens):
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+class UsageLedger:
+    """In-memory usage aggregation with periodic batched writes"""
+
+    def __init__(self, quota=DAILY_TOKEN_QUOTA, flush_seconds=USAGE_FLUSH_SECONDS):
+        self.quota = quota
+        self.flush_seconds = flush_seconds
+        self._pending = {}  # (user_id, day, model) -> [requests, prompt, completion, latency_ms, cost]
+        self._local = {}    # (user_id, day) -> tokens recorded by this process
+        self._flushed = {}  # (user_id, day) -> tokens this process has written
+        self._base = {}     # (user_id, day) -> tokens written by other processes
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record(self, model, prompt_tokens, completion_tokens, latency):
+        """Account one completion to the currently attributed users"""
+        TOKENS.inc(model, 'prompt', amount=prompt_tokens)
+        TOKENS.inc(model, 'completion', amount=completion_tokens)
+        users = _attributed_users.get() or (None,)
+        share = 1.0 / len(users)
+        day = datetime.utcnow().date()
+        cost = token_cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            for user_id in users:
+                row = self._pending.setdefault((user_id, day, model), [0, 0, 0, 0, 0.0])
+                row[0] += 1
+                row[1] += round(prompt_tokens * share)
+                row[2] += round(completion_tokens * share)
+                row[3] += round(latency * 1000 * share)
+                row[4] += cost * share
+                key = (user_id, day)
+                self._local[key] = self._local.get(key, 0) + round((prompt_tokens + completion_tokens) * share)
+
+    def spent_today(self, user_id):
+        """Tokens the user has used today across all workers (as of the last seed)"""
+        key = (user_id, datetime.utcnow().date())
+        if key not in self._base:
+            from models import TokenUsage
+            total = TokenUsage.query\
+                .with_entities(func.coalesce(func.sum(TokenUsage.prompt_tokens + TokenUsage.completion_tokens), 0))\
+                .filter(TokenUsage.user_id == user_id, TokenUsage.day == key[1]).scalar()
+            with self._lock:
+                self._base[key] = int(total) - self._flushed.get(key, 0)
+        with self._lock:
+            return self._base[key] + self._local.get(key, 0)
+
+    def allow(self, user_id):
+        """True if the user may make another upstream LLM call today"""
+        if not self.quota or user_id is None:
+            return True
+        if self.spent_today(user_id) < self.quota:
+            return True
+        QUOTA_REJECTIONS.inc()
+        print(f"Token quota reached for user {user_id}")
+        return False
+
+    def maybe_flush(self, db):
+        if time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush(db)
+
+    def flush(self, db):
+        """Upsert pending aggregates in one transaction of their own"""
+        from models import TokenUsage
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+            today = datetime.utcnow().date()
+            for state in (self._local, self._flushed, self._base):
+                for key in [k for k in state if k[1] < today]:
+                    del state[key]
+        if not pending:
+            return
+
+        table = TokenUsage.__table__
+        try:
+            # Own connection and transaction: never commits or discards the request's session
+            with db.engine.begin() as conn:
+                for (user_id, day, model), (requests, prompt, completion, latency_ms, cost) in pending.items():
+                    match = (table.c.user_id == user_id) & (table.c.day == day) & (table.c.model == model)
+                    update = table.update().where(match).values(
+                        requests=table.c.requests + requests,
+                        prompt_tokens=table.c.prompt_tokens + prompt,
+                        completion_tokens=table.c.completion_tokens + completion,
+                        latency_ms=table.c.latency_ms + latency_ms,
+                        cost=table.c.cost + cost,
+                    )
+                    if conn.execute(update).rowcount:
+                        continue
+                    try:
+                        with conn.begin_nested():
+                            conn.execute(table.insert().values(
+                                user_id=user_id, day=day, model=model, requests=requests,
+                                prompt_tokens=prompt, completion_tokens=completion,
+                                latency_ms=latency_ms, cost=cost))
+                    except IntegrityError:
+                        # Another worker created the row first
+                        conn.execute(update)
+        except Exception as e:
+            print(f"Usage flush failed, will retry: {str(e)}")
+            with self._lock:
+                for key, row in pending.items():
+                    merged = self._pending.setdefault(key, [0, 0, 0, 0, 0.0])
+                    for i, value in enumerate(row):
+                        merged[i] += value
+            return
+
+        with self._lock:
+            for (user_id, day, _), row in pending.items():
+                key = (user_id, day)
+                self._flushed[key] = self._flushed.get(key, 0) + row[1] + row[2]
+            # Re-read other workers' totals on the next quota check
+            self._base.clear()
+
+
+usage_ledger = UsageLedger()
+
+
+def init_usage(app, db):
+    """Flush usage after requests and at exit; expose today's heaviest users"""
+
+    @app.teardown_request
+    def _flush_usage(exc):
+        try:
+            usage_ledger.maybe_flush(db)
+        except Exception as e:
+            print(f"Usage flush error: {str(e)}")
+
+    def _flush_at_exit():
+        with app.app_context():
+            usage_ledger.flush(db)
+
+    atexit.register(_flush_at_exit)
+
+    @app.route('/admin/usage')
+    def usage_report():
+        """Today's token usage and cost per user (same bearer token as /metrics; 404 without one)"""
+        token = os.getenv('METRICS_TOKEN')
+        if not token:
+            abort(404)
+        supplied = request.headers.get('Authorization') or ''
+        if not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+            return jsonify({'error': 'Unauthorized'}), 401
+
+        from models import TokenUsage
+        usage_ledger.flush(db)
+        tokens = func.sum(TokenUsage.prompt_tokens + TokenUsage.completion_tokens)
+        rows = db.session.query(TokenUsage.user_id, tokens, func.sum(TokenUsage.cost),
+                                func.sum(TokenUsage.requests))\
+            .filter(TokenUsage.day == datetime.utcnow().date())\
+            .group_by(TokenUsage.user_id)\
+            .order_by(tokens.desc())\
+            .limit(request.args.get('limit', 20, type=int)).all()
+        return jsonify({
+            'quota': usage_ledger.quota,
+            'users': [{'user_id': user_id, 'tokens': int(total or 0), 'cost': round(cost or 0, 6),
+                       'requests': int(count or 0)} for user_id, total, cost, count in rows]
+        })
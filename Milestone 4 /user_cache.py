@@ -0,0 +1,119 @@
+"""
+Per-process identity map for the logged-in user
+
+dashboard, schedule and generate_schedule only need a handful of profile
+fields, so instead of a User.query.get() per request the profile is cached as
+an immutable, slots-based UserSnapshot (never an ORM instance bound to a
+session). Entries expire after USER_CACHE_TTL seconds, the map is bounded to
+USER_CACHE_SIZE users (least recently used evicted first), and any UPDATE or
+DELETE of a User row drops its entry via SQLAlchemy mapper events.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from metrics import record_cache
+
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 300))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+
+
+class UserSnapshot:
+    """Read-only copy of the User columns the pages and generators use"""
+
+    __slots__ = ('id', 'email', 'name', 'age', 'weight', 'height', 'fitness_level', 'created_at')
+
+    def __init__(self, user):
+        for field in self.__slots__:
+            object.__setattr__(self, field, getattr(user, field))
+
+    def __setattr__(self, field, value):
+        raise AttributeError('UserSnapshot is read-only')
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.email}>'
+
+
+class UserCache:
+    """TTL + LRU bounded map of user id -> (snapshot, loaded at)"""
+
+    def __init__(self, ttl=USER_CACHE_TTL, max_size=USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._listening = False
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Snapshot of the user, loading it from the database on a miss; None if absent"""
+        if user_id is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                record_cache('user', True)
+                return entry[0]
+
+        self._listen()
+        from models import User
+        user = User.query.get(user_id)
+        snapshot = UserSnapshot(user) if user is not None else None
+        with self._lock:
+            self.misses += 1
+            if snapshot is not None:
+                self._entries[user_id] = (snapshot, now)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.pop(user_id, None)
+        record_cache('user', False)
+        return snapshot
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _listen(self):
+        """Hook User writes once, the first time the cache loads a row"""
+        if self._listening:
+            return
+        from models import User
+        with self._lock:
+            if self._listening:
+                return
+            event.listen(User, 'after_update', self._on_write)
+            event.listen(User, 'after_delete', self._on_write)
+            event.listen(Session, 'after_commit', self._on_commit)
+            self._listening = True
+
+    def _on_write(self, mapper, connection, target):
+        # Drop now, and again after commit so a concurrent reload of the
+        # still-committed old row cannot outlive the transaction
+        self.invalidate(target.id)
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault('user_cache_dirty', set()).add(target.id)
+
+    def _on_commit(self, session):
+        for user_id in session.info.pop('user_cache_dirty', ()):
+            self.invalidate(user_id)
+
+
+user_cache = UserCache()
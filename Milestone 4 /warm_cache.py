@@ -0,0 +1,147 @@
+"""
+Offline cache warm-up: pre-generate plans for the most common profile buckets
+
+Run before routing traffic to a fresh deploy:
+
+    python warm_cache.py --top 50 --concurrency 3 --rpm 25
+
+Mines users and workout_schedules for the most frequent (goal, level,
+equipment, bucketed body stats) combinations, generates and validates plans
+for the top K buckets that are not cached yet, and stores them in the
+plan_cache_entries table read by every worker. Prints how much of recent
+traffic the cache now covers.
+"""
+
+import argparse
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+
+class RateLimiter:
+    """Spaces out request starts to stay under a requests-per-minute budget"""
+
+    def __init__(self, rpm):
+        self.interval = 60.0 / rpm if rpm > 0 else 0
+        self.base_interval = self.interval
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+    def backoff(self):
+        """Slow down after the provider stops answering (likely rate limited)"""
+        with self._lock:
+            self.interval = min(max(self.interval * 2, 1.0), 60.0)
+
+    def recover(self):
+        with self._lock:
+            self.interval = max(self.base_interval, self.interval * 0.75)
+
+
+BUCKET_USER_NAME = 'Athlete'
+
+
+class _BucketUser:
+    """Synthetic user at the centre of a bucket, used only for generation"""
+
+    def __init__(self, age, weight, height):
+        self.id = None
+        self.name = BUCKET_USER_NAME
+        self.age = age
+        self.weight = weight
+        self.height = height
+
+
+def mine_buckets(days=None):
+    """Count schedule requests per profile bucket (optionally only the last N days)"""
+    from models import User, WorkoutSchedule
+    from plan_cache import bucket_key
+
+    query = WorkoutSchedule.query.join(User, WorkoutSchedule.user_id == User.id)\
+        .filter(WorkoutSchedule.goal.isnot(None), WorkoutSchedule.level.isnot(None))
+    if days:
+        query = query.filter(WorkoutSchedule.created_at >= datetime.utcnow() - timedelta(days=days))
+    rows = query.with_entities(User.age, User.weight, User.height, WorkoutSchedule.goal,
+                               WorkoutSchedule.level, WorkoutSchedule.equipment).yield_per(1000)
+
+    counts = Counter()
+    for age, weight, height, goal, level, equipment in rows:
+        key = bucket_key(age, weight, height, goal, level, equipment or 'bodyweight')
+        if key is not None:
+            counts[key] += 1
+    return counts
+
+
+def _equipment_for(key):
+    from exercise_catalog import equipment_names
+    mask = int(key.split('|')[2][1:])
+    return ', '.join(equipment_names(mask)) or 'bodyweight'
+
+
+def warm(db, top, concurrency, rpm, days):
+    from model_api import try_models
+    from plan_cache import plan_cache, bucket_midpoint
+    from plan_validator import validate_plan
+    from prompt_builder import build_workout_prompt
+
+    counts = mine_buckets()
+    wanted = [key for key, _ in counts.most_common(top)]
+    missing = [key for key in wanted if not plan_cache.contains(key)]
+    print(f"Buckets: {len(counts)} total, top {len(wanted)} selected, {len(missing)} to generate")
+
+    limiter = RateLimiter(rpm)
+
+    def generate(key):
+        goal, level = key.split('|')[:2]
+        equipment = _equipment_for(key)
+        user = _BucketUser(*bucket_midpoint(key))
+        limiter.wait()
+        plan = try_models(build_workout_prompt(user, goal, level, equipment), equipment)
+        if plan is None:
+            limiter.backoff()
+            return key, None, None
+        limiter.recover()
+        verdict = validate_plan(plan, equipment)
+        return key, plan if verdict['valid'] else None, verdict['score']
+
+    generated = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(generate, key) for key in missing]
+        for future in as_completed(futures):
+            key, plan, score = future.result()
+            if plan is None:
+                print(f"  ✗ {key}")
+                continue
+            plan_cache.put(db, key, plan, BUCKET_USER_NAME, score)
+            generated += 1
+            print(f"  ✓ {key} (score {score})")
+
+    recent = mine_buckets(days)
+    total = sum(recent.values())
+    covered = sum(count for key, count in recent.items() if plan_cache.contains(key))
+    coverage = 100.0 * covered / total if total else 0.0
+    print(f"Generated {generated}/{len(missing)} plans")
+    print(f"Coverage of last {days} days: {covered}/{total} requests ({coverage:.1f}%)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-generate plans for common profile buckets')
+    parser.add_argument('--top', type=int, default=50, help='Number of buckets to warm')
+    parser.add_argument('--concurrency', type=int, default=3, help='Parallel generations')
+    parser.add_argument('--rpm', type=float, default=25, help='Max LLM requests per minute')
+    parser.add_argument('--days', type=int, default=7, help='Window for the coverage report')
+    args = parser.parse_args()
+
+    from app import app, db
+    with app.app_context():
+        db.create_all()
+        warm(db, args.top, args.concurrency, args.rpm, args.days)
@@ -0,0 +1,140 @@
+"""
+Rule-based local workout generator built on the exercise catalog
+"""
+
+import random
+import zlib
+from exercise_catalog import find_exercises, parse_equipment
+
+# Goal-specific 5-day splits: (day focus, muscle slots for 5 exercises)
+SPLITS = {
+    'strength': [
+        ('Lower Body - Squat Focus', ['quads', 'hamstrings', 'glutes', 'quads', 'core']),
+        ('Upper Body - Push', ['chest', 'shoulders', 'triceps', 'chest', 'core']),
+        ('Upper Body - Pull', ['back', 'back', 'biceps', 'shoulders', 'core']),
+        ('Lower Body - Hinge Focus', ['hamstrings', 'glutes', 'quads', 'calves', 'core']),
+        ('Full Body Power', ['quads', 'chest', 'back', 'shoulders', 'cardio']),
+    ],
+    'muscle_gain': [
+        ('Push (Chest, Shoulders, Triceps)', ['chest', 'chest', 'shoulders', 'shoulders', 'triceps']),
+        ('Pull (Back, Biceps)', ['back', 'back', 'back', 'biceps', 'biceps']),
+        ('Legs', ['quads', 'quads', 'hamstrings', 'glutes', 'calves']),
+        ('Upper Body Hypertrophy', ['chest', 'back', 'shoulders', 'biceps', 'triceps']),
+        ('Lower Body & Core', ['quads', 'hamstrings', 'glutes', 'core', 'core']),
+    ],
+    'weight_loss': [
+        ('Full Body HIIT Circuit', ['cardio', 'quads', 'chest', 'cardio', 'core']),
+        ('Lower Body & Cardio', ['quads', 'glutes', 'cardio', 'hamstrings', 'cardio']),
+        ('Steady Cardio & Core', ['cardio', 'core', 'core', 'cardio', 'mobility']),
+        ('Upper Body Circuit', ['chest', 'back', 'cardio', 'shoulders', 'cardio']),
+        ('Metabolic Conditioning', ['cardio', 'quads', 'back', 'cardio', 'core']),
+    ],
+    'endurance': [
+        ('Cardio Base', ['cardio', 'cardio', 'core', 'calves', 'mobility']),
+        ('Muscular Endurance - Lower', ['quads', 'glutes', 'hamstrings', 'calves', 'cardio']),
+        ('Intervals & Core', ['cardio', 'cardio', 'core', 'core', 'mobility']),
+        ('Muscular Endurance - Upper', ['chest', 'back', 'shoulders', 'triceps', 'cardio']),
+        ('Long Conditioning', ['cardio', 'quads', 'back', 'core', 'mobility']),
+    ],
+    'toning': [
+        ('Upper Body Sculpt', ['chest', 'back', 'shoulders', 'triceps', 'biceps']),
+        ('Lower Body Sculpt', ['quads', 'glutes', 'hamstrings', 'glutes', 'calves']),
+        ('Core & Cardio', ['core', 'cardio', 'core', 'cardio', 'core']),
+        ('Full Body Tone', ['quads', 'chest', 'back', 'glutes', 'core']),
+        ('Active Recovery', ['cardio', 'mobility', 'mobility', 'core', 'mobility']),
+    ],
+    'general': [
+        ('Upper Body', ['chest', 'back', 'shoulders', 'biceps', 'triceps']),
+        ('Lower Body', ['quads', 'hamstrings', 'glutes', 'calves', 'quads']),
+        ('Core & Cardio', ['core', 'cardio', 'core', 'cardio', 'core']),
+        ('Full Body', ['cardio', 'quads', 'chest', 'back', 'core']),
+        ('Active Recovery', ['cardio', 'mobility', 'mobility', 'core', 'mobility']),
+    ],
+}
+
+# (sets, reps) for strength work by goal and level
+PRESCRIPTIONS = {
+    'strength': {'beginner': (3, '8-10'), 'intermediate': (4, '5-6'), 'advanced': (5, '3-5')},
+    'muscle_gain': {'beginner': (3, '10-12'), 'intermediate': (4, '8-12'), 'advanced': (4, '6-10')},
+    'weight_loss': {'beginner': (3, '12-15'), 'intermediate': (3, '15'), 'advanced': (4, '15-20')},
+    'endurance': {'beginner': (2, '15'), 'intermediate': (3, '15-20'), 'advanced': (3, '20-25')},
+    'toning': {'beginner': (3, '12'), 'intermediate': (3, '12-15'), 'advanced': (4, '12-15')},
+    'general': {'beginner': (3, '10-12'), 'intermediate': (4, '8-10'), 'advanced': (4, '6-8')},
+}
+
+# Work interval for timed moves and duration for cardio/mobility blocks
+TIMED_SECONDS = {'beginner': 30, 'intermediate': 40, 'advanced': 45}
+DURATION_MINUTES = {'beginner': 15, 'intermediate': 20, 'advanced': 25}
+
+# Slot to try when a muscle group has nothing for the user's equipment/level
+SLOT_FALLBACK = {'biceps': 'back', 'triceps': 'chest', 'calves': 'quads'}
+
+
+def plan_seed(user, goal, level, equipment):
+    """Stable seed so the same profile always gets the same plan"""
+    key = f"{getattr(user, 'id', '')}|{goal}|{level}|{equipment}"
+    return zlib.crc32(key.encode())
+
+
+def is_local_profile(goal, level, equipment):
+    """True when the engine fully covers the profile (known goal, level and equipment)"""
+    _, unknown = parse_equipment(equipment)
+    return goal in SPLITS and level in TIMED_SECONDS and not unknown
+
+
+def _prescribe(exercise, goal, level):
+    if exercise.kind == 'duration':
+        minutes = DURATION_MINUTES[level]
+        if exercise.muscle == 'mobility':
+            minutes = max(5, minutes // 2)
+        return f"{minutes} min"
+    sets, reps = PRESCRIPTIONS[goal][level]
+    if exercise.kind == 'timed':
+        return f"{sets} x {TIMED_SECONDS[level]} sec"
+    return f"{sets} x {reps}"
+
+
+def _pick(rng, muscle, available, level, goal, used_today, used_week):
+    candidates = (find_exercises(muscle, available, level, goal)
+                  or find_exercises(muscle, available, level))
+    if not candidates and muscle in SLOT_FALLBACK:
+        candidates = find_exercises(SLOT_FALLBACK[muscle], available, level)
+    fresh = [e for e in candidates if e.name not in used_today]
+    if not fresh:
+        return None
+    unused = [e for e in fresh if e.name not in used_week]
+    # Prefer equipment-based moves when the user has equipment
+    pool = unused or fresh
+    weighted = [e for e in pool if e.equipment] * 2 + pool
+    return rng.choice(weighted)
+
+
+def build_local_plan(user, goal, level, equipment, seed=None):
+    """Compose a goal-specific 5-day plan from the catalog"""
+    goal = goal if goal in SPLITS else 'general'
+    level = level if level in TIMED_SECONDS else 'beginner'
+    available, _ = parse_equipment(equipment)
+    rng = random.Random(plan_seed(user, goal, level, equipment) if seed is None else seed)
+
+    used_week = set()
+    lines = [
+        "5-DAY WORKOUT PLAN",
+        f"For: {user.name} | Goal: {goal} | Level: {level}",
+        ""
+    ]
+    for day_number, (focus, slots) in enumerate(SPLITS[goal], start=1):
+        lines.append(f"DAY {day_number}: {focus}")
+        used_today = set()
+        number = 1
+        for muscle in slots:
+            exercise = _pick(rng, muscle, available, level, goal, used_today, used_week)
+            if exercise is None:
+                exercise = _pick(rng, 'core', available, level, goal, used_today, used_week)
+            if exercise is None:
+                continue
+            used_today.add(exercise.name)
+            used_week.add(exercise.name)
+            lines.append(f"{number}. {exercise.name} - {_prescribe(exercise, goal, level)}")
+            number += 1
+        lines.append("")
+    return "\n".join(lines)